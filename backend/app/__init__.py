@@ -3,9 +3,11 @@ from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from .models import db
+from .database import configure_database, init_database
+from .storage import init_storage
 import os
 
-def create_app():
+def create_app(migrate=True):
     app = Flask(__name__)
     
     # Load configuration
@@ -14,18 +16,27 @@ def create_app():
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # Tokens don't expire for demo
     
+    # Record storage: STORAGE_BACKEND=local|azure|memory (see app/storage)
+    app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'local')
+    
+    # Engine profile, optional read engine and shards: DB_PROFILE, SQLALCHEMY_READ_DATABASE_URI,
+    # SQLALCHEMY_SHARD_URIS (see app/database.py)
+    configure_database(app)
+    
     # Initialize extensions
     db.init_app(app)
+    init_database(app, db)
+    init_storage(app)
     jwt = JWTManager(app)
     bcrypt = Bcrypt(app)
-    CORS(app, origins=['http://localhost:3000'], supports_credentials=True, methods=['GET', 'POST', 'PUT', 'OPTIONS'], allow_headers=['*'])
+    CORS(app, origins=['http://localhost:3000'], supports_credentials=True, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'], allow_headers=['*'])
     
     # Store bcrypt in app context for use in routes
     app.bcrypt = bcrypt
     
     # Register blueprints
     from .routes.auth import auth_bp
-    from .routes.storage_routes_local import storage_bp
+    from .routes.storage_routes import storage_bp
     from .routes.blockchain_routes import blockchain_bp
     from .routes.medical_forms import medical_forms_bp
     
@@ -43,8 +54,23 @@ def create_app():
     def health():
         return {"status": "healthy", "message": "API is running"}, 200
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Create / upgrade database tables (see app/migrations), on every shard too
+    if migrate:
+        from .migrations import upgrade
+        with app.app_context():
+            for engine in db.engines.values():
+                upgrade(engine)
+    
+    # Batched AccessLog writes (ACCESS_LOG_MODE=durable|at_most_once|sync)
+    from .services import access_log_writer
+    access_log_writer.init_app(app)
+
+    # Blockchain access logging through the outbox (CHAIN_OUTBOX_WORKER=thread|off)
+    from .services import chain_outbox
+    chain_outbox.init_app(app)
+
+    # Local index of on-chain AccessLogged events (CHAIN_INDEXER=thread|off)
+    from .services import chain_index
+    chain_index.init_app(app)
     
     return app
\ No newline at end of file
@@ -1,26 +1,131 @@
 # File: backend/app/blockchain.py
 from web3 import Web3
+from web3.exceptions import TransactionNotFound, Web3RPCError
 import json
 import os
+from .nonce_manager import AccountPool, is_nonce_too_low
 
-# Connect to Ethereum node
-w3 = Web3(Web3.HTTPProvider(os.getenv('ETHEREUM_PROVIDER_URL')))
-if not w3.is_connected():
-    print("blockchain.py - Warning: Not connected to Ethereum node")
+# Access events reach the AccessLogger contract through the chain outbox
+# (app/services/chain_outbox.py): requests only insert an outbox row, and
+# the outbox worker signs, sends and confirms transactions with the client
+# below. Signing is separate from sending, so the worker can store a
+# transaction's hash before the node ever sees it. One transaction carries
+# one event (logAccess) or several (logAccessBatch, one AccessLogged event
+# per entry), or, in anchoring mode, only the Merkle root of an epoch of
+# events (anchorRoot; see app/services/anchoring.py). Nonces come from a
+# local NonceManager per account (app/nonce_manager.py) rather than from
+# the node before each transaction, and with WALLET_PRIVATE_KEYS (comma
+# separated) transactions rotate over several funded accounts.
 
 # Contract details from .env
+provider_url = os.getenv('ETHEREUM_PROVIDER_URL')
 contract_address = os.getenv('ACCESS_LOGGER_ADDRESS')
 private_key = os.getenv('WALLET_PRIVATE_KEY')
+private_keys = [key.strip() for key in os.getenv('WALLET_PRIVATE_KEYS', '').split(',') if key.strip()]
 
 # Load ABI from contracts/AccessLogger.json
 abi_path = os.path.join(os.path.dirname(__file__), '../../contracts/AccessLogger.json')
 with open(abi_path, 'r') as f:
     abi = json.load(f)['abi']
+if isinstance(abi, str):  # scripts/deploy.js saves the ABI as a JSON string
+    abi = json.loads(abi)
 
-# Contract instance
-contract = w3.eth.contract(address=contract_address, abi=abi)
+# Node errors for a transaction it already holds, across geth, Hardhat and anvil
+_ALREADY_KNOWN = ('already known', 'known transaction', 'already imported', 'already in the mempool')
 
-def log_access(user_email, record_name, action):
-    """Log access event to Ethereum blockchain (DISABLED for now)."""
-    print(f"blockchain.py - SKIPPED: Would log {user_email} on {record_name} ({action})")
-    return "xxxx_tx_hash_123"
\ No newline at end of file
+
+class NonceTooLow(Exception):
+    """The signed transaction's nonce was used by another transaction of the account."""
+
+
+class AccessLoggerClient:
+    """
+    AccessLogger transactions, signed and sent in separate steps, from one
+    account or, given a list of keys, from each account of the pool in turn.
+    The first account is the primary one, which signs anchorRoot.
+    """
+
+    def __init__(self, w3, address, key):
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+        self.pool = AccountPool(w3, [key] if isinstance(key, (str, bytes)) else list(key))
+        self.account = self.pool.primary
+        self.address = self.account.address
+
+    def next_nonce(self):
+        """The primary account's next nonce according to the node."""
+        return self.w3.eth.get_transaction_count(self.address, 'pending')
+
+    def resync(self):
+        """Re-read every account's nonce from the node, after a nonce was lost or taken."""
+        self.pool.resync()
+
+    def call(self, entries):
+        """logAccess for one (user_email, record_name, action) entry, logAccessBatch for several."""
+        if len(entries) == 1:
+            return self.contract.functions.logAccess(*entries[0])
+        user_emails, record_names, actions = (list(column) for column in zip(*entries))
+        return self.contract.functions.logAccessBatch(user_emails, record_names, actions)
+
+    def anchor_call(self, root, leaf_count):
+        """anchorRoot for the Merkle root (32 bytes) of an epoch of `leaf_count` access events."""
+        return self.contract.functions.anchorRoot(root, leaf_count)
+
+    def estimate_gas(self, entries):
+        return self.estimate_call(self.call(entries))
+
+    def estimate_call(self, call):
+        # Estimated without the nonce: nodes reject estimates for a nonce ahead of the account's.
+        return call.estimate_gas({'from': self.address})
+
+    def sign(self, entries, nonce=None, gas=None):
+        """A signed transaction logging `entries` as (tx hash, raw transaction), both 0x hex. Nothing is sent."""
+        return self.sign_call(self.call(entries), nonce, gas)
+
+    def sign_call(self, call, nonce=None, gas=None, account=None):
+        """Sign `call` with `account` (by default the pool's next one) and, by default, a locally allocated nonce."""
+        if nonce is None:
+            account, nonce = self.pool.allocate(account)
+        account = account or self.account
+        tx = call.build_transaction({
+            'from': account.address,
+            'nonce': nonce,
+            'gas': gas if gas is not None else self.estimate_call(call)
+        })
+        signed = account.sign_transaction(tx)
+        return self.w3.to_hex(signed.hash), self.w3.to_hex(signed.raw_transaction)
+
+    def broadcast(self, raw_tx):
+        """Send a signed transaction. Sending one the node already holds is not an error."""
+        try:
+            self.w3.eth.send_raw_transaction(raw_tx)
+        except (Web3RPCError, ValueError) as e:
+            message = str(e).lower()
+            if any(known in message for known in _ALREADY_KNOWN):
+                return
+            if is_nonce_too_low(message):
+                raise NonceTooLow(str(e))
+            raise
+
+    def receipt(self, tx_hash):
+        """The transaction's receipt, or None while it is not mined."""
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+
+
+def get_client():
+    """A client for the configured node, contract and wallet(s); None when any of them is not set."""
+    keys = private_keys or ([private_key] if private_key else [])
+    if not (provider_url and contract_address and keys):
+        return None
+    return AccessLoggerClient(Web3(Web3.HTTPProvider(provider_url)), contract_address, keys)
+
+
+def get_contract():
+    """The AccessLogger on the configured node, for reading its events; None when either is not set."""
+    if not (provider_url and contract_address):
+        return None
+    w3 = Web3(Web3.HTTPProvider(provider_url))
+    return w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=abi)
@@ -0,0 +1,49 @@
+# app/chain_indexer.py
+"""
+Follow the AccessLogger's AccessLogged events into the local event index
+in a process of its own, for deployments that run the web workers with
+CHAIN_INDEXER=off. Needs ETHEREUM_PROVIDER_URL and ACCESS_LOGGER_ADDRESS;
+set CHAIN_INDEXER_START_BLOCK to the contract's deployment block.
+
+    python -m backend.app.chain_indexer           # follow the chain until interrupted
+    python -m backend.app.chain_indexer --once    # index up to the head, then report
+"""
+import argparse
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m backend.app.chain_indexer', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='index up to the current head and exit')
+    args = parser.parse_args()
+
+    os.environ['CHAIN_INDEXER'] = 'off'  # no background thread: this process drives the indexer
+    from backend.app import create_app
+
+    app = create_app()
+    indexer = app.extensions.get('chain_index')
+    if indexer is None:
+        raise SystemExit("No blockchain configured (ETHEREUM_PROVIDER_URL, ACCESS_LOGGER_ADDRESS)")
+    try:
+        while True:
+            try:
+                indexer.sync()
+            except Exception as e:
+                if args.once:
+                    raise
+                print(f"sync failed, will retry: {e}")
+            if args.once:
+                break
+            time.sleep(indexer.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    with app.app_context():
+        stats = indexer.stats
+        print(f"indexed {stats['events']} events in {stats['blocks']} blocks through block {indexer.indexed_block()}; "
+              f"{stats['reorgs']} reorgs rolled back {stats['rolled_back']} events")
+
+
+if __name__ == '__main__':
+    main()
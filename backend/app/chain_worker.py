@@ -0,0 +1,45 @@
+# app/chain_worker.py
+"""
+Drain the blockchain outbox in a process of its own, for deployments that
+run the web workers with CHAIN_OUTBOX_WORKER=off (one sender per wallet
+keeps its nonces in order). Needs ETHEREUM_PROVIDER_URL,
+ACCESS_LOGGER_ADDRESS and WALLET_PRIVATE_KEY.
+
+    python -m backend.app.chain_worker           # run until interrupted
+    python -m backend.app.chain_worker --once    # one pass, then report
+"""
+import argparse
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m backend.app.chain_worker', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='drain one batch per shard and exit')
+    args = parser.parse_args()
+
+    os.environ['CHAIN_OUTBOX_WORKER'] = 'off'  # no background thread: this process drives the worker
+    from backend.app import create_app
+    from backend.app.services import chain_outbox
+
+    app = create_app()
+    worker = app.extensions.get('chain_outbox')
+    if worker is None:
+        raise SystemExit("No blockchain configured (ETHEREUM_PROVIDER_URL, ACCESS_LOGGER_ADDRESS, WALLET_PRIVATE_KEY)")
+    try:
+        while True:
+            busy = worker.drain()
+            if args.once:
+                break
+            if not busy:
+                time.sleep(worker.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    with app.app_context():
+        print(f"sent {worker.stats['sent']}, retried {worker.stats['retried']}, failed {worker.stats['failed']}; "
+              f"outbox {chain_outbox.counts()}")
+
+
+if __name__ == '__main__':
+    main()
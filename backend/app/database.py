@@ -0,0 +1,425 @@
+# app/database.py
+import functools
+import hashlib
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import (
+    BigInteger, Column, Integer, MetaData, Select, String, Table, TextClause, create_engine, event, func, insert,
+    inspect, select, update
+)
+from sqlalchemy.exc import IntegrityError
+
+# Engine profile for the SQL database.
+#
+#   DB_PROFILE=production  SQLite runs in WAL mode (readers never block the
+#                          writer and vice versa) with synchronous=NORMAL,
+#                          memory-mapped reads, a larger page cache and a
+#                          busy timeout, so concurrent gunicorn workers wait
+#                          for the write lock instead of failing with
+#                          "database is locked"; pool sizing applies to any
+#                          database
+#   DB_PROFILE=default     stock SQLAlchemy / SQLite settings
+#
+# SQLALCHEMY_READ_DATABASE_URI optionally names a second engine (a replica,
+# or a read-only pool on the same SQLite file) that serves the SELECTs of
+# endpoints marked @read_only; everything else stays on the primary.
+#
+# SQLALCHEMY_SHARD_URIS (comma separated) spreads patient data over N shard
+# databases. Models with a __shard_key__ keep each row on the shard its key
+# (a patient's email, a blob's digest, an upload's id) hashes to; the hash
+# is rendezvous hashing over the shard names, so appending a shard moves
+# only ~1/N of the keys (python -m backend.app.rebalance moves them). The
+# default database keeps users and the id allocator. Statements on sharded
+# tables go to the shard chosen for the request (use_shard) or block
+# (shard_scope); loaded rows remember their shard, so refreshes and flushes
+# go back to it. Views across patients run on every shard in parallel
+# (fan_out). New sharded rows take ids from blocks reserved in id_block, so
+# an id names one row across all shards.
+PROFILES = ('production', 'default')
+
+SETTINGS = {
+    # name: (default, type)
+    'SQLITE_JOURNAL_MODE': ('WAL', str),
+    'SQLITE_SYNCHRONOUS': ('NORMAL', str),
+    'SQLITE_MMAP_SIZE': (256 * 1024 * 1024, int),  # bytes
+    'SQLITE_CACHE_SIZE': (-64 * 1024, int),  # pages, or KiB when negative
+    'SQLITE_BUSY_TIMEOUT': (5000, int),  # milliseconds
+    'DB_POOL_SIZE': (10, int),
+    'DB_MAX_OVERFLOW': (20, int),
+    'DB_POOL_TIMEOUT': (30, int),  # seconds to wait for a pooled connection
+    'DB_POOL_RECYCLE': (1800, int),  # seconds; -1 keeps connections forever
+}
+ID_BLOCK_SIZE = int(os.getenv('ID_BLOCK_SIZE', 1000))  # ids reserved per round trip to id_block
+
+id_block = Table(
+    'id_block', MetaData(),
+    Column('name', String(64), primary_key=True),  # table name
+    Column('next_id', BigInteger, nullable=False),  # first id not yet handed out
+)
+
+
+class ShardError(RuntimeError):
+    """Raised for a statement on a sharded table when no shard was selected."""
+
+
+def configure_database(app):
+    """Fill in the engine profile from the environment; existing app.config values win."""
+    app.config.setdefault('DB_PROFILE', os.getenv('DB_PROFILE', 'production'))
+    if app.config['DB_PROFILE'] not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{app.config['DB_PROFILE']}'. Expected one of: {', '.join(PROFILES)}")
+    for name, (default, kind) in SETTINGS.items():
+        app.config.setdefault(name, kind(os.getenv(name, default)))
+    app.config.setdefault('SQLALCHEMY_READ_DATABASE_URI', os.getenv('SQLALCHEMY_READ_DATABASE_URI'))
+    shard_uris = app.config.setdefault('SQLALCHEMY_SHARD_URIS', os.getenv('SQLALCHEMY_SHARD_URIS'))
+    if isinstance(shard_uris, str):
+        shard_uris = app.config['SQLALCHEMY_SHARD_URIS'] = [u.strip() for u in shard_uris.split(',') if u.strip()]
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for index, url in enumerate(shard_uris or ()):
+        binds.setdefault(shard_name(index), {'url': url, **engine_options(app.config, url)})
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for key, value in engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI']).items():
+        options.setdefault(key, value)
+
+
+def _is_memory_sqlite(url):
+    return url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url
+
+
+def engine_options(config, url):
+    """create_engine() keyword arguments for `url` under the configured profile."""
+    if config.get('DB_PROFILE', 'production') != 'production' or _is_memory_sqlite(url):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+    }
+    if url.startswith('sqlite'):
+        # pysqlite's timeout is SQLite's busy handler; the PRAGMA below sets the same value.
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+    else:
+        options['pool_pre_ping'] = True
+    return options
+
+
+def sqlite_pragmas(config, read_only=False):
+    pragmas = [
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+    ]
+    if not read_only:
+        # Persistent in the database file; a read-only connection can neither set nor need it.
+        pragmas.insert(0, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+
+def install_pragmas(engine, config, read_only=False):
+    """Apply the profile's PRAGMAs to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite' or config.get('DB_PROFILE', 'production') != 'production':
+        return
+    pragmas = sqlite_pragmas(config, read_only)
+
+    @event.listens_for(engine, 'connect')
+    def _apply(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_read_engine(config):
+    url = config['SQLALCHEMY_READ_DATABASE_URI']
+    engine = create_engine(url, **engine_options(config, url))
+    install_pragmas(engine, config, read_only=True)
+    return engine
+
+
+def init_database(app, db):
+    """Call after db.init_app(app): installs the PRAGMAs, creates the optional read engine and the shard set."""
+    with app.app_context():
+        engines = db.engines
+        for engine in engines.values():
+            install_pragmas(engine, app.config)
+    if app.config.get('SQLALCHEMY_READ_DATABASE_URI'):
+        app.extensions['read_engine'] = create_read_engine(app.config)
+    if app.config.get('SQLALCHEMY_SHARD_URIS'):
+        shard_engines = [engines[shard_name(i)] for i in range(len(app.config['SQLALCHEMY_SHARD_URIS']))]
+        app.extensions['db_shards'] = Shards(db, engines[None], shard_engines)
+
+
+def read_only(view):
+    """Serve this endpoint's SELECTs from the read engine, when one is configured."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def shard_name(index):
+    return f"shard{index}"
+
+
+class IdAllocator:
+    """Hands out ids of sharded tables from blocks reserved in the id_block table of the default database."""
+
+    def __init__(self, primary, engines, block_size=ID_BLOCK_SIZE):
+        self.primary = primary
+        self.engines = engines  # every database that may hold rows of the table
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}  # table name -> [next, stop)
+
+    def take(self, table, count):
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                block = self._blocks.get(table.name)
+                if block is None or block[0] >= block[1]:
+                    block = self._blocks[table.name] = self._reserve(table, max(self.block_size, count - len(ids)))
+                n = min(count - len(ids), block[1] - block[0])
+                ids.extend(range(block[0], block[0] + n))
+                block[0] += n
+        return ids
+
+    def _reserve(self, table, size):
+        # Its own transaction on the default database, which requests never write
+        # patient data to, so a reservation never waits on the caller's transaction.
+        row = id_block.c.name == table.name
+        while True:
+            try:
+                with self.primary.begin() as conn:
+                    if conn.execute(update(id_block).where(row).values(next_id=id_block.c.next_id + size)).rowcount:
+                        stop = conn.execute(select(id_block.c.next_id).where(row)).scalar_one()
+                        return [stop - size, stop]
+                    # First block: start above every id issued before sharding.
+                    start = 1 + max(self._max_id(engine, table) for engine in self.engines)
+                    conn.execute(insert(id_block).values(name=table.name, next_id=start + size))
+                    return [start, start + size]
+            except IntegrityError:
+                continue  # another process created the row first
+
+    @staticmethod
+    def _max_id(engine, table):
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(table.c.id))).scalar() or 0
+
+
+class Shards:
+    """An app's shard engines, the key -> shard map and the id allocator."""
+
+    def __init__(self, db, primary, engines):
+        self.engines = engines
+        self.names = [shard_name(i).encode() for i in range(len(engines))]
+        # Loaded rows carry their shard's name as identity token (SQLAlchemy drops a falsy token such as 0).
+        self.tokens = {shard_name(i): i for i in range(len(engines))}
+        # table -> shard key column, for every model that declares __shard_key__
+        self.keys = {
+            mapper.local_table: mapper.class_.__shard_key__
+            for mapper in db.Model.registry.mappers if getattr(mapper.class_, '__shard_key__', None)
+        }
+        # tables whose integer id the allocator assigns
+        self.id_tables = {table for table in self.keys if 'id' in table.c and isinstance(table.c.id.type, Integer)}
+        self.ids = IdAllocator(primary, [primary] + engines)
+        self.executor = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix='shard')
+
+    def index_for(self, key):
+        key = b'/' + str(key).lower().encode()
+        return max(range(len(self.names)), key=lambda i: hashlib.blake2b(self.names[i] + key, digest_size=8).digest())
+
+
+_scope = ContextVar('db_shard', default=None)
+
+
+def get_shards():
+    return current_app.extensions.get('db_shards') if has_app_context() else None
+
+
+def shard_for(key):
+    """Index of the shard that holds rows keyed by `key` (0 when not sharded)."""
+    shards = get_shards()
+    return shards.index_for(key) if shards is not None else 0
+
+
+def use_shard(key=None, shard=None):
+    """Send this request's statements on sharded tables to `key`'s shard, or to shard index `shard`."""
+    if get_shards() is not None:
+        g.db_shard = shard if shard is not None else shard_for(key)
+
+
+@contextmanager
+def shard_scope(key=None, shard=None):
+    """use_shard() for the duration of a block; also works outside requests."""
+    token = _scope.set(shard if shard is not None else shard_for(key))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_shard():
+    shard = _scope.get()
+    if shard is None and has_app_context():
+        shard = g.get('db_shard')
+    return shard
+
+
+def fan_out(fn):
+    """
+    Call fn() once per shard, in parallel, each inside that shard's
+    shard_scope and its own app context (so its own db.session). Returns
+    the results in shard order; fn should return plain data, not ORM objects
+    that still need loading. Not sharded: one call, in the current context.
+    """
+    shards = get_shards()
+    if shards is None:
+        return [fn()]
+    app = current_app._get_current_object()
+
+    def run(index):
+        with app.app_context(), shard_scope(shard=index):
+            return fn()
+
+    return list(shards.executor.map(run, range(len(shards.engines))))
+
+
+def locate(model, **criteria):
+    """Index of the shard holding a `model` row matching `criteria` (such as id=...), None if none does."""
+    if get_shards() is None:
+        return 0
+    found = fan_out(lambda: model.query.filter_by(**criteria).first() is not None)
+    return next((index for index, hit in enumerate(found) if hit), None)
+
+
+def group_by_shard(rows, key):
+    """[(shard index, rows)] for dicts routed by rows[key], in first-seen order."""
+    shards = get_shards()
+    if shards is None:
+        return [(0, rows)]
+    groups = defaultdict(list)
+    for row in rows:
+        groups[shards.index_for(row[key])].append(row)
+    return list(groups.items())
+
+
+def assign_ids(table, rows):
+    """Give Core-inserted rows of a sharded table allocator ids (ORM inserts get them on flush)."""
+    shards = get_shards()
+    if shards is not None and table in shards.id_tables:
+        missing = [row for row in rows if row.get('id') is None]
+        for row, new_id in zip(missing, shards.ids.take(table, len(missing))):
+            row['id'] = new_id
+    return rows
+
+
+def _target_table(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table
+    table = getattr(clause, 'table', None)  # INSERT / UPDATE / DELETE
+    if table is None and isinstance(clause, Select):
+        froms = clause.get_final_froms()
+        table = froms[0] if len(froms) == 1 else None
+    return table
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends SELECTs of @read_only requests to
+    the read engine, and statements on sharded tables to their shard.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._shards = get_shards()
+        if self._shards is not None:
+            # Flushes pick a connection per row, by the row's own shard (see get_bind).
+            self.connection_callable = self._row_connection
+
+    def _row_connection(self, mapper=None, instance=None, **kwargs):
+        return self.get_transaction().connection(mapper, instance=instance)
+
+    def _shard_bind(self, mapper, clause, shard, instance):
+        if shard is not None:
+            return self._shards.engines[shard]
+        table = _target_table(mapper, clause)
+        key = self._shards.keys.get(table)
+        if key is not None and instance is not None:
+            state = inspect(instance)
+            if state.key is not None:
+                shard = self._shards.tokens[state.key[2]]
+            elif state.identity_token is not None:
+                shard = self._shards.tokens[state.identity_token]
+            else:
+                shard = self._shards.index_for(getattr(instance, key))
+                state.identity_token = shard_name(shard)
+            return self._shards.engines[shard]
+        if key is not None or isinstance(clause, TextClause):
+            shard = current_shard()
+            if shard is None:
+                if key is None:
+                    return None  # raw SQL outside any scope: the default database
+                raise ShardError(f"No shard selected for a statement on '{table.name}'; call use_shard() first")
+            return self._shards.engines[shard]
+        return None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, shard=None, instance=None, **kwargs):
+        if bind is None and self._shards is not None:
+            engine = self._shard_bind(mapper, clause, shard, instance)
+            if engine is not None:
+                return engine
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_request_context() and g.get('db_read_only')):
+            engine = current_app.extensions.get('read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute', retval=True)
+def _route_to_shard(orm_context):
+    """Run ORM statements on sharded models on one shard, tagging loaded rows with it."""
+    shards = orm_context.session._shards
+    mapper = orm_context.bind_mapper
+    if shards is None or mapper is None or mapper.local_table not in shards.keys:
+        return None
+    if 'shard' in orm_context.bind_arguments:
+        return None
+    if orm_context.is_select:
+        options = orm_context.load_options
+    elif orm_context.is_update or orm_context.is_delete:
+        options = orm_context.update_delete_options
+    else:
+        options = None
+    # Refreshes and lazy loads carry the shard of the row they load for.
+    token = options._identity_token if options is not None else None
+    shard = shards.tokens[token] if token is not None else current_shard()
+    if shard is None:
+        raise ShardError(f"No shard selected for a query on '{mapper.local_table.name}'; call use_shard() first")
+    orm_context.update_execution_options(identity_token=shard_name(shard))
+    return orm_context.invoke_statement(bind_arguments=dict(orm_context.bind_arguments, shard=shard))
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _allocate_ids(session, flush_context, instances):
+    shards = session._shards
+    if shards is None:
+        return
+    pending = defaultdict(list)
+    for obj in session.new:
+        table = inspect(obj).mapper.local_table
+        if table in shards.id_tables and obj.id is None:
+            pending[table].append(obj)
+    for table, objs in pending.items():
+        for obj, new_id in zip(objs, shards.ids.take(table, len(objs))):
+            obj.id = new_id
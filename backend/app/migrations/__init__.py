@@ -0,0 +1,90 @@
+# app/migrations/__init__.py
+"""
+Versioned schema migrations, applied in order at startup in place of a
+bare db.create_all().
+
+Each migration is a module with VERSION, DESCRIPTION and upgrade(conn).
+Migrations are written with the idempotent helpers in ops.py (ensure a
+table / column / index exists), so they are safe on databases that
+create_all() already built, and when several workers start at once.
+Each migration declares its own Table definitions with the columns and
+indexes it touches, as they were at that version, and never imports the
+models: a later model change needs a new migration, and never changes
+what an old one does.
+Applied versions are recorded in the schema_migrations table. When data
+is sharded, the default database and every shard are migrated alike.
+
+    python -m backend.app.migrations            # apply pending migrations
+    python -m backend.app.migrations --status   # list applied / pending
+"""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.exc import IntegrityError
+from . import (
+    v001_baseline, v002_query_indexes, v003_keyset_pagination, v004_access_rollups, v005_vital_readings,
+    v006_search_index, v007_record_metadata, v008_review_queue, v009_shard_ids,
+    v010_chain_outbox, v011_chain_batches, v012_chain_anchors, v013_chain_events,
+    v014_vital_reading_utc,
+)
+
+MIGRATIONS = [
+    v001_baseline,
+    v002_query_indexes,
+    v003_keyset_pagination,
+    v004_access_rollups,
+    v005_vital_readings,
+    v006_search_index,
+    v007_record_metadata,
+    v008_review_queue,
+    v009_shard_ids,
+    v010_chain_outbox,
+    v011_chain_batches,
+    v012_chain_anchors,
+    v013_chain_events,
+    v014_vital_reading_utc,
+]
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def applied_versions(engine):
+    _metadata.create_all(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine):
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.VERSION not in done]
+
+
+def upgrade(engine, verbose=False):
+    """Apply every pending migration, each in its own transaction. Returns the versions applied."""
+    applied = []
+    for migration in pending(engine):
+        try:
+            with engine.begin() as conn:
+                migration.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=migration.VERSION,
+                    description=migration.DESCRIPTION,
+                    applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # Another worker recorded this version first; its changes are already in.
+            continue
+        applied.append(migration.VERSION)
+        if verbose:
+            print(f"migrations - applied {migration.VERSION:03d} {migration.DESCRIPTION}")
+    return applied
+
+
+def status(engine):
+    done = applied_versions(engine)
+    return [(m.VERSION, m.DESCRIPTION, m.VERSION in done) for m in MIGRATIONS]
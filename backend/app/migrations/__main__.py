@@ -0,0 +1,20 @@
+# app/migrations/__main__.py
+import argparse
+from backend.app import create_app
+from backend.app.models import db
+from . import status, upgrade
+
+parser = argparse.ArgumentParser(prog='python -m backend.app.migrations')
+parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+args = parser.parse_args()
+
+app = create_app(migrate=False)
+with app.app_context():
+    engines = db.engines
+    for bind_key, engine in engines.items():
+        if len(engines) > 1:
+            print(f"== {bind_key or 'default'} ({engine.url})")
+        if not args.status:
+            upgrade(engine, verbose=True)
+        for version, description, done in status(engine):
+            print(f"{version:03d} {'applied' if done else 'pending':>8}  {description}")
@@ -0,0 +1,45 @@
+# app/migrations/ops.py
+"""
+Idempotent schema operations used by the migration modules. They take
+the Table each migration declares for itself (with the columns and
+indexes as of that version), never the live models, so a migration keeps
+doing what it did when it was written whatever the models become.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+
+def has_table(conn, name):
+    return inspect(conn).has_table(name)
+
+
+def has_column(conn, table_name, column_name):
+    return any(c['name'] == column_name for c in inspect(conn).get_columns(table_name))
+
+
+def has_index(conn, table_name, index_name):
+    return any(i['name'] == index_name for i in inspect(conn).get_indexes(table_name))
+
+
+def ensure_table(conn, table):
+    """Create a migration's table (with the indexes declared on it) unless it exists."""
+    table.create(conn, checkfirst=True)
+
+
+def ensure_column(conn, table, column_name):
+    """ALTER TABLE ... ADD COLUMN for a column of a migration's table missing from the database."""
+    if has_column(conn, table.name, column_name):
+        return False
+    column = table.c[column_name]
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} ADD {ddl}")
+    return True
+
+
+def ensure_index(conn, table, index_name):
+    """Create one of the indexes declared on a migration's table unless it exists."""
+    if has_index(conn, table.name, index_name):
+        return False
+    index = next(i for i in table.indexes if i.name == index_name)
+    index.create(conn)
+    return True
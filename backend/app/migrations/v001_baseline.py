@@ -0,0 +1,94 @@
+# app/migrations/v001_baseline.py
+"""
+Baseline: the schema db.create_all() used to produce, plus the columns
+added to Record since, so databases created before migrations existed
+are brought to the same state as new ones.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+from .ops import ensure_column, ensure_table
+
+VERSION = 1
+DESCRIPTION = 'baseline schema'
+
+metadata = MetaData()
+
+user = Table(
+    'user', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password', String(255), nullable=False),
+    Column('role', String(50), nullable=False),
+)
+
+record = Table(
+    'record', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', String(120), nullable=False),
+    Column('filename', String(255), nullable=False),
+    Column('blob_url', String(255), nullable=False),
+    Column('uploaded_at', DateTime, nullable=False),
+    Column('content_hash', String(64), nullable=True),
+    Column('deleted_at', DateTime, nullable=True),
+)
+
+blob = Table(
+    'blob', metadata,
+    Column('digest', String(64), primary_key=True),
+    Column('size', BigInteger, nullable=False),
+    Column('ref_count', Integer, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+)
+
+upload_session = Table(
+    'upload_session', metadata,
+    Column('id', String(32), primary_key=True),
+    Column('patient_id', String(120), nullable=False),
+    Column('uploaded_by', String(120), nullable=False),
+    Column('filename', String(255), nullable=False),
+    Column('next_chunk', Integer, nullable=False),
+    Column('bytes_received', BigInteger, nullable=False),
+    Column('total_size', BigInteger, nullable=True),
+    Column('status', String(20), nullable=False),
+    Column('created_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+access_log = Table(
+    'access_log', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('record_id', Integer, ForeignKey('record.id'), nullable=False),
+    Column('accessed_by', String(120), nullable=False),
+    Column('access_time', DateTime, nullable=False),
+)
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120), nullable=False),
+    Column('form_type', String(50), nullable=False),
+    Column('form_data', Text, nullable=False),
+    Column('submitted_at', DateTime, nullable=False),
+    Column('doctor_email', String(120), nullable=True),
+    Column('status', String(20)),
+)
+
+prescription = Table(
+    'prescription', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120), nullable=False),
+    Column('doctor_email', String(120), nullable=False),
+    Column('medication_name', String(200), nullable=False),
+    Column('dosage', String(100), nullable=False),
+    Column('frequency', String(100), nullable=False),
+    Column('duration', String(100), nullable=False),
+    Column('instructions', Text, nullable=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('status', String(20)),
+)
+
+
+def upgrade(conn):
+    for table in (user, record, blob, upload_session, access_log, medical_form, prescription):
+        ensure_table(conn, table)
+    ensure_column(conn, record, 'content_hash')
+    ensure_column(conn, record, 'deleted_at')
@@ -0,0 +1,65 @@
+# app/migrations/v002_query_indexes.py
+"""Composite indexes for the hot lookups: records, access logs, forms and prescriptions."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+from .ops import ensure_index
+
+VERSION = 2
+DESCRIPTION = 'query indexes for records, access logs, forms, prescriptions'
+
+metadata = MetaData()
+
+record = Table(
+    'record', metadata,
+    Column('patient_id', String(120)),
+    Column('filename', String(255)),
+    Column('uploaded_at', DateTime),
+    Column('content_hash', String(64)),
+    Index('ix_record_patient_uploaded', 'patient_id', 'uploaded_at'),
+    Index('ix_record_filename', 'filename'),
+    Index('ix_record_content_hash', 'content_hash'),
+)
+
+access_log = Table(
+    'access_log', metadata,
+    Column('record_id', Integer),
+    Column('access_time', DateTime),
+    Index('ix_access_log_record_time', 'record_id', 'access_time'),
+)
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('patient_email', String(120)),
+    Column('doctor_email', String(120)),
+    Column('status', String(20)),
+    Column('submitted_at', DateTime),
+    Index('ix_medical_form_patient_submitted', 'patient_email', 'submitted_at'),
+    Index('ix_medical_form_status_submitted', 'status', 'submitted_at'),
+    Index('ix_medical_form_doctor_submitted', 'doctor_email', 'submitted_at'),
+)
+
+prescription = Table(
+    'prescription', metadata,
+    Column('patient_email', String(120)),
+    Column('doctor_email', String(120)),
+    Column('created_at', DateTime),
+    Index('ix_prescription_patient_created', 'patient_email', 'created_at'),
+    Index('ix_prescription_doctor_created', 'doctor_email', 'created_at'),
+)
+
+
+INDEXES = [
+    (record, 'ix_record_patient_uploaded'),
+    (record, 'ix_record_filename'),
+    (record, 'ix_record_content_hash'),
+    (access_log, 'ix_access_log_record_time'),
+    (medical_form, 'ix_medical_form_patient_submitted'),
+    (medical_form, 'ix_medical_form_status_submitted'),
+    (medical_form, 'ix_medical_form_doctor_submitted'),
+    (prescription, 'ix_prescription_patient_created'),
+    (prescription, 'ix_prescription_doctor_created'),
+]
+
+
+def upgrade(conn):
+    for table, name in INDEXES:
+        ensure_index(conn, table, name)
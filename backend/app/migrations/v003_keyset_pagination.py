@@ -0,0 +1,43 @@
+# app/migrations/v003_keyset_pagination.py
+"""
+Indexes for keyset pagination: all records by upload time, and a patient's
+access log by time. AccessLog gains the patient_id of its record, backfilled
+here, so the log pages off one index instead of merging one range per record.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, select, update
+from .ops import ensure_column, ensure_index
+
+VERSION = 3
+DESCRIPTION = 'keyset pagination indexes, access_log.patient_id'
+
+metadata = MetaData()
+
+record = Table(
+    'record', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', String(120)),
+    Column('uploaded_at', DateTime),
+    Index('ix_record_uploaded', 'uploaded_at'),
+)
+
+access_log = Table(
+    'access_log', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('record_id', Integer),
+    Column('access_time', DateTime),
+    Column('patient_id', String(120), nullable=True),
+    Index('ix_access_log_patient_time', 'patient_id', 'access_time'),
+)
+
+
+def upgrade(conn):
+    ensure_column(conn, access_log, 'patient_id')
+    conn.execute(
+        update(access_log)
+        .where(access_log.c.patient_id.is_(None))
+        .values(patient_id=select(record.c.patient_id)
+                .where(record.c.id == access_log.c.record_id)
+                .scalar_subquery())
+    )
+    ensure_index(conn, record, 'ix_record_uploaded')
+    ensure_index(conn, access_log, 'ix_access_log_patient_time')
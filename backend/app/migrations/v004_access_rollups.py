@@ -0,0 +1,63 @@
+# app/migrations/v004_access_rollups.py
+"""Hourly / daily access rollups, backfilled from the existing access_log rows."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, UniqueConstraint, select
+from ..services.access_analytics import rollup_counts
+from .ops import ensure_table
+
+VERSION = 4
+DESCRIPTION = 'access analytics rollups'
+
+BACKFILL_CHUNK = 50000
+
+metadata = MetaData()
+
+access_rollup = Table(
+    'access_rollup', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('granularity', String(10), nullable=False),
+    Column('bucket_start', DateTime, nullable=False),
+    Column('record_id', Integer, nullable=False),
+    Column('patient_id', String(120), nullable=True),
+    Column('accessed_by', String(120), nullable=False),
+    Column('count', Integer, nullable=False),
+    UniqueConstraint('granularity', 'bucket_start', 'record_id', 'accessed_by', name='uq_access_rollup_bucket'),
+    Index('ix_access_rollup_patient', 'granularity', 'patient_id', 'bucket_start'),
+    Index('ix_access_rollup_accessor', 'granularity', 'accessed_by', 'bucket_start'),
+)
+
+access_log = Table(
+    'access_log', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('record_id', Integer),
+    Column('patient_id', String(120)),
+    Column('accessed_by', String(120)),
+    Column('access_time', DateTime),
+)
+
+
+def upgrade(conn):
+    ensure_table(conn, access_rollup)
+    if conn.execute(select(access_rollup.c.id).limit(1)).first() is not None:
+        return
+
+    totals = {}
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(access_log.c.id, access_log.c.record_id, access_log.c.patient_id, access_log.c.accessed_by,
+                   access_log.c.access_time)
+            .where(access_log.c.id > last_id).order_by(access_log.c.id).limit(BACKFILL_CHUNK)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        for key, n in rollup_counts(rows).items():
+            totals[key] = totals.get(key, 0) + n
+
+    values = [
+        dict(granularity=g, bucket_start=start, record_id=record_id, patient_id=patient_id,
+             accessed_by=accessed_by, count=n)
+        for (g, start, record_id, patient_id, accessed_by), n in totals.items()
+    ]
+    for i in range(0, len(values), BACKFILL_CHUNK):
+        conn.execute(access_rollup.insert(), values[i:i + BACKFILL_CHUNK])
@@ -0,0 +1,57 @@
+# app/migrations/v005_vital_readings.py
+"""Typed vitals time series, backfilled from the existing vitals forms."""
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text, select
+from ..services.vitals import readings_from_forms
+from .ops import ensure_index, ensure_table
+
+VERSION = 5
+DESCRIPTION = 'vital_reading time series'
+
+BACKFILL_CHUNK = 10000
+
+metadata = MetaData()
+
+vital_reading = Table(
+    'vital_reading', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120), nullable=False),
+    Column('recorded_at', DateTime, nullable=False),
+    Column('form_id', Integer, nullable=True),
+    Column('systolic', Float, nullable=True),
+    Column('diastolic', Float, nullable=True),
+    Column('heart_rate', Float, nullable=True),
+    Column('temperature', Float, nullable=True),
+    Column('spo2', Float, nullable=True),
+    Index('ix_vital_reading_patient_recorded', 'patient_email', 'recorded_at'),
+)
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120)),
+    Column('form_type', String(50)),
+    Column('form_data', Text),
+    Column('submitted_at', DateTime),
+)
+
+
+def upgrade(conn):
+    ensure_table(conn, vital_reading)
+    ensure_index(conn, vital_reading, 'ix_vital_reading_patient_recorded')
+    if conn.execute(select(vital_reading.c.id).limit(1)).first() is not None:
+        return
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(medical_form.c.id, medical_form.c.patient_email, medical_form.c.form_data,
+                   medical_form.c.submitted_at)
+            .where(medical_form.c.form_type == 'vitals', medical_form.c.id > last_id)
+            .order_by(medical_form.c.id).limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        values = readings_from_forms(rows)
+        if values:
+            conn.execute(vital_reading.insert(), values)
@@ -0,0 +1,81 @@
+# app/migrations/v006_search_index.py
+"""
+FTS5 search index over records and medical forms (SQLite only), backfilled
+from the existing forms and from record text already in the derived text
+cache. Records whose text has not been extracted yet are indexed by
+filename and get their text the next time they are previewed.
+"""
+import os
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, select, text
+from ..services import search_index
+from ..services.text_extraction import derived_text_cache
+
+VERSION = 6
+DESCRIPTION = 'full-text search index'
+
+BACKFILL_CHUNK = 1000
+
+metadata = MetaData()
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120)),
+    Column('form_type', String(50)),
+    Column('form_data', Text),
+    Column('submitted_at', DateTime),
+)
+
+record = Table(
+    'record', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', String(120)),
+    Column('filename', String(255)),
+    Column('uploaded_at', DateTime),
+    Column('content_hash', String(64)),
+    Column('deleted_at', DateTime),
+)
+
+CREATE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_index.TABLE} USING fts5("
+    "owner, title, body, kind UNINDEXED, doc_id UNINDEXED, patient_id UNINDEXED, created_at UNINDEXED, "
+    "tokenize='porter unicode61')"
+)
+
+
+def upgrade(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    conn.exec_driver_sql(CREATE_TABLE)
+    if conn.execute(text(f"SELECT rowid FROM {search_index.TABLE} LIMIT 1")).first() is not None:
+        return
+
+    for rows in _chunks(conn, medical_form, medical_form.c.id, medical_form.c.patient_email,
+                        medical_form.c.form_type, medical_form.c.form_data, medical_form.c.submitted_at):
+        search_index.index_entries(conn, [
+            search_index.form_entry(form_id, patient_email, form_type,
+                                    search_index.decode_form_data(form_data), submitted_at)
+            for form_id, patient_email, form_type, form_data, submitted_at in rows
+        ])
+
+    for rows in _chunks(conn, record, record.c.id, record.c.patient_id, record.c.filename, record.c.uploaded_at,
+                        record.c.content_hash, where=record.c.deleted_at.is_(None)):
+        entries = []
+        for record_id, patient_id, filename, uploaded_at, content_hash in rows:
+            text_path = derived_text_cache.path_for(content_hash) if content_hash else None
+            body = search_index.read_text(text_path) if text_path and os.path.exists(text_path) else ''
+            entries.append(search_index.record_entry(record_id, patient_id, filename, uploaded_at, body))
+        search_index.index_entries(conn, entries)
+
+
+def _chunks(conn, table, *columns, where=None):
+    last_id = 0
+    while True:
+        statement = select(*columns).where(table.c.id > last_id)
+        if where is not None:
+            statement = statement.where(where)
+        rows = conn.execute(statement.order_by(table.c.id).limit(BACKFILL_CHUNK)).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
@@ -0,0 +1,99 @@
+# app/migrations/v007_record_metadata.py
+"""
+Record metadata for server-side filtering: content_type, size and
+uploaded_by, with composite indexes per filter. content_type is backfilled
+from the filename and size from the record's blob, looked up on the
+digest's shard (blob_store.lookup), which need not be the record's; the
+uploader of older records is unknown and stays NULL.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, bindparam, select, update
+from ..database import get_shards
+from ..models import db
+from ..services import blob_store
+from ..services.record_filters import content_type_for
+from .ops import ensure_column, ensure_index
+
+VERSION = 7
+DESCRIPTION = 'record metadata columns and filter indexes'
+
+BACKFILL_CHUNK = 10000
+
+metadata = MetaData()
+
+record = Table(
+    'record', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', String(120)),
+    Column('filename', String(255)),
+    Column('uploaded_at', DateTime),
+    Column('content_hash', String(64)),
+    Column('content_type', String(100), nullable=True),
+    Column('size', BigInteger, nullable=True),
+    Column('uploaded_by', String(120), nullable=True),
+    Index('ix_record_patient_type_uploaded', 'patient_id', 'content_type', 'uploaded_at'),
+    Index('ix_record_patient_uploader_uploaded', 'patient_id', 'uploaded_by', 'uploaded_at'),
+)
+
+blob = Table(
+    'blob', metadata,
+    Column('digest', String(64), primary_key=True),
+    Column('size', BigInteger),
+)
+
+
+def _blob_sizes(conn, digests):
+    """{digest: size} for the blobs found, read through `conn` for those on its own database."""
+    shards = get_shards()
+    local = [d for d in digests if shards is None or shards.engines[shards.index_for(d)] is conn.engine]
+    sizes = {}
+    if local:
+        sizes.update(conn.execute(select(blob.c.digest, blob.c.size).where(blob.c.digest.in_(local))).all())
+    remote = set(digests) - set(local)
+    for digest in remote:
+        found = blob_store.lookup(digest)
+        if found is not None:
+            sizes[digest] = found.size
+    if remote:
+        # lookup() reads through db.session; end its transaction before the next shard is migrated.
+        db.session.close()
+    return sizes
+
+
+def upgrade(conn):
+    for column in ('content_type', 'size', 'uploaded_by'):
+        ensure_column(conn, record, column)
+
+    set_size = update(record).where(record.c.id == bindparam('b_id')).values(size=bindparam('b_size'))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(record.c.id, record.c.content_hash)
+            .where(record.c.size.is_(None), record.c.content_hash.is_not(None), record.c.id > last_id)
+            .order_by(record.c.id).limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        sizes = _blob_sizes(conn, {digest for _, digest in rows})
+        values = [{'b_id': record_id, 'b_size': sizes[digest]} for record_id, digest in rows if digest in sizes]
+        if values:
+            conn.execute(set_size, values)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(record.c.id, record.c.filename)
+            .where(record.c.content_type.is_(None), record.c.id > last_id)
+            .order_by(record.c.id).limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        by_type = {}
+        for record_id, filename in rows:
+            by_type.setdefault(content_type_for(filename), []).append(record_id)
+        for content_type, ids in by_type.items():
+            conn.execute(update(record).where(record.c.id.in_(ids)).values(content_type=content_type))
+
+    ensure_index(conn, record, 'ix_record_patient_type_uploaded')
+    ensure_index(conn, record, 'ix_record_patient_uploader_uploaded')
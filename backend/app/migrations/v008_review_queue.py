@@ -0,0 +1,37 @@
+# app/migrations/v008_review_queue.py
+"""
+Review work queue: MedicalForm gains claimed_by and available_at (set to
+submitted_at for existing forms, so every pending form starts claimable),
+plus the partial queue index over pending forms.
+"""
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, text, update
+from .ops import ensure_column, ensure_index
+
+VERSION = 8
+DESCRIPTION = 'medical form review queue'
+
+metadata = MetaData()
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('submitted_at', DateTime),
+    Column('status', String(20)),
+    Column('claimed_by', String(120), nullable=True),
+    Column('available_at', DateTime, nullable=True),
+    Index('ix_medical_form_claimed_submitted', 'claimed_by', 'submitted_at'),
+    Index('ix_medical_form_queue', 'status', 'available_at',
+          sqlite_where=text("status = 'pending'"), postgresql_where=text("status = 'pending'"),
+          mssql_where=text("status = 'pending'")),
+)
+
+
+def upgrade(conn):
+    ensure_column(conn, medical_form, 'claimed_by')
+    ensure_column(conn, medical_form, 'available_at')
+    conn.execute(
+        update(medical_form)
+        .where(medical_form.c.available_at.is_(None))
+        .values(available_at=medical_form.c.submitted_at)
+    )
+    ensure_index(conn, medical_form, 'ix_medical_form_claimed_submitted')
+    ensure_index(conn, medical_form, 'ix_medical_form_queue')
@@ -0,0 +1,22 @@
+# app/migrations/v009_shard_ids.py
+"""
+id_block: id ranges reserved by app processes when data is sharded
+(SQLALCHEMY_SHARD_URIS), so ids stay unique across shards. Applied to the
+default database and to every shard, which all share one schema.
+"""
+from sqlalchemy import BigInteger, Column, MetaData, String, Table
+
+VERSION = 9
+DESCRIPTION = 'shard id allocator'
+
+metadata = MetaData()
+
+id_block = Table(
+    'id_block', metadata,
+    Column('name', String(64), primary_key=True),
+    Column('next_id', BigInteger, nullable=False),
+)
+
+
+def upgrade(conn):
+    id_block.create(conn, checkfirst=True)
@@ -0,0 +1,47 @@
+# app/migrations/v010_chain_outbox.py
+"""
+Transactional outbox for blockchain access logging: the chain_outbox
+table with its partial queue index, and AccessLog.tx_hash for the hashes
+the worker writes back.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text, text
+from .ops import ensure_column, ensure_table
+
+VERSION = 10
+DESCRIPTION = 'blockchain outbox'
+
+metadata = MetaData()
+
+chain_outbox = Table(
+    'chain_outbox', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('idempotency_key', String(64), unique=True, nullable=False),
+    Column('patient_id', String(120), nullable=True),
+    Column('user_email', String(120), nullable=False),
+    Column('record_name', String(255), nullable=False),
+    Column('action', String(50), nullable=False),
+    Column('access_log_id', Integer, nullable=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('attempts', Integer, nullable=False),
+    Column('available_at', DateTime, nullable=False),
+    Column('claimed_by', String(120), nullable=True),
+    Column('raw_tx', Text, nullable=True),
+    Column('tx_hash', String(66), nullable=True),
+    Column('block_number', BigInteger, nullable=True),
+    Column('sent_at', DateTime, nullable=True),
+    Column('last_error', Text, nullable=True),
+    Index('ix_chain_outbox_queue', 'status', 'available_at',
+          sqlite_where=text("status = 'pending'"), postgresql_where=text("status = 'pending'"),
+          mssql_where=text("status = 'pending'")),
+)
+
+access_log = Table(
+    'access_log', metadata,
+    Column('tx_hash', String(66), nullable=True),
+)
+
+
+def upgrade(conn):
+    ensure_table(conn, chain_outbox)
+    ensure_column(conn, access_log, 'tx_hash')
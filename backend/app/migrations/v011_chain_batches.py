@@ -0,0 +1,23 @@
+# app/migrations/v011_chain_batches.py
+"""
+Batched blockchain logging: outbox rows sent in one logAccessBatch
+transaction share its hash, and rows look up the raw transaction (stored
+on one of them) by that hash.
+"""
+from sqlalchemy import Column, Index, MetaData, String, Table
+from .ops import ensure_index
+
+VERSION = 11
+DESCRIPTION = 'chain outbox tx hash index'
+
+metadata = MetaData()
+
+chain_outbox = Table(
+    'chain_outbox', metadata,
+    Column('tx_hash', String(66)),
+    Index('ix_chain_outbox_tx_hash', 'tx_hash'),
+)
+
+
+def upgrade(conn):
+    ensure_index(conn, chain_outbox, 'ix_chain_outbox_tx_hash')
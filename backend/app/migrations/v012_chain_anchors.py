@@ -0,0 +1,37 @@
+# app/migrations/v012_chain_anchors.py
+"""
+Merkle-root anchoring of access events: the chain_anchor table of epoch
+trees, each outbox row's epoch and leaf, and an index to find the outbox
+row of an AccessLog row for its inclusion proof.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table
+from .ops import ensure_column, ensure_index, ensure_table
+
+VERSION = 12
+DESCRIPTION = 'chain anchors'
+
+metadata = MetaData()
+
+chain_anchor = Table(
+    'chain_anchor', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('root', String(66), nullable=False),
+    Column('leaf_count', Integer, nullable=False),
+    Column('tree', LargeBinary, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+)
+
+chain_outbox = Table(
+    'chain_outbox', metadata,
+    Column('access_log_id', Integer),
+    Column('anchor_id', Integer, nullable=True),
+    Column('leaf_index', Integer, nullable=True),
+    Index('ix_chain_outbox_access_log', 'access_log_id'),
+)
+
+
+def upgrade(conn):
+    ensure_table(conn, chain_anchor)
+    ensure_column(conn, chain_outbox, 'anchor_id')
+    ensure_column(conn, chain_outbox, 'leaf_index')
+    ensure_index(conn, chain_outbox, 'ix_chain_outbox_access_log')
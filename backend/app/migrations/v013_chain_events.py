@@ -0,0 +1,47 @@
+# app/migrations/v013_chain_events.py
+"""
+Local index of the AccessLogger's AccessLogged events: the chain_event
+table, with an index per query filter, and the indexer's chain_cursor.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text, UniqueConstraint
+from .ops import ensure_table
+
+VERSION = 13
+DESCRIPTION = 'chain event index'
+
+metadata = MetaData()
+
+chain_event = Table(
+    'chain_event', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('block_number', BigInteger, nullable=False),
+    Column('block_hash', String(66), nullable=False),
+    Column('tx_hash', String(66), nullable=False),
+    Column('log_index', Integer, nullable=False),
+    Column('sender', String(42), nullable=False),
+    Column('user_email', String(255), nullable=False),
+    Column('record_name', String(255), nullable=False),
+    Column('action', String(50), nullable=False),
+    Column('timestamp', DateTime, nullable=False),
+    UniqueConstraint('block_hash', 'log_index', name='uq_chain_event_log'),
+    Index('ix_chain_event_record_time', 'record_name', 'timestamp'),
+    Index('ix_chain_event_user_time', 'user_email', 'timestamp'),
+    Index('ix_chain_event_sender_time', 'sender', 'timestamp'),
+    Index('ix_chain_event_time', 'timestamp'),
+    Index('ix_chain_event_block', 'block_number'),
+)
+
+chain_cursor = Table(
+    'chain_cursor', metadata,
+    Column('id', String(120), primary_key=True),
+    Column('block_number', BigInteger, nullable=False),
+    Column('recent_blocks', Text, nullable=False),
+    Column('claimed_by', String(120), nullable=True),
+    Column('lease_until', DateTime, nullable=True),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+
+def upgrade(conn):
+    ensure_table(conn, chain_event)
+    ensure_table(conn, chain_cursor)
@@ -0,0 +1,54 @@
+# app/migrations/v014_vital_reading_utc.py
+"""
+Vital readings taken from a form timestamp with a UTC offset were stored
+at the local wall-clock time; recompute recorded_at from the forms.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, bindparam, select, update
+from ..services.vitals import readings_from_forms
+
+VERSION = 14
+DESCRIPTION = 'vital_reading recorded_at in UTC'
+
+BACKFILL_CHUNK = 10000
+
+metadata = MetaData()
+
+medical_form = Table(
+    'medical_form', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_email', String(120)),
+    Column('form_type', String(50)),
+    Column('form_data', Text),
+    Column('submitted_at', DateTime),
+)
+
+vital_reading = Table(
+    'vital_reading', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('form_id', Integer),
+    Column('recorded_at', DateTime),
+)
+
+
+def upgrade(conn):
+    fix = (
+        update(vital_reading)
+        .where(vital_reading.c.form_id == bindparam('b_form_id'),
+               vital_reading.c.recorded_at != bindparam('b_recorded_at'))
+        .values(recorded_at=bindparam('b_recorded_at'))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(medical_form.c.id, medical_form.c.patient_email, medical_form.c.form_data,
+                   medical_form.c.submitted_at)
+            .where(medical_form.c.form_type == 'vitals', medical_form.c.id > last_id)
+            .order_by(medical_form.c.id).limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        values = [{'b_form_id': reading['form_id'], 'b_recorded_at': reading['recorded_at']}
+                  for reading in readings_from_forms(rows)]
+        if values:
+            conn.execute(fix, values)
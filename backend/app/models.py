@@ -1,7 +1,8 @@
 # File: backend/app/models.py
 from flask_sqlalchemy import SQLAlchemy
+from .database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,19 +11,161 @@ class User(db.Model):
     role = db.Column(db.String(50), nullable=False)  # 'patient' or 'doctor'
 
 class Record(db.Model):
+    __shard_key__ = 'patient_id'  # rows live on the patient's shard when sharded (see app/database.py)
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.String(120), nullable=False)  # email of the patient
     filename = db.Column(db.String(255), nullable=False)
     blob_url = db.Column(db.String(255), nullable=False)
     uploaded_at = db.Column(db.DateTime, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True)  # hex SHA-256 of the stored bytes
+    deleted_at = db.Column(db.DateTime, nullable=True)  # soft delete keeps AccessLog rows valid
+    content_type = db.Column(db.String(100), nullable=True)  # MIME type guessed from the filename
+    size = db.Column(db.BigInteger, nullable=True)  # bytes
+    uploaded_by = db.Column(db.String(120), nullable=True)  # email of the uploader (patient or doctor)
+
+    __table_args__ = (
+        db.Index('ix_record_patient_uploaded', 'patient_id', 'uploaded_at'),  # /list, /export, ?from=&to=
+        db.Index('ix_record_filename', 'filename'),  # download, preview, /list?prefix=
+        db.Index('ix_record_content_hash', 'content_hash'),  # blob pre-flight, dedup
+        db.Index('ix_record_uploaded', 'uploaded_at'),  # /records
+        db.Index('ix_record_patient_type_uploaded', 'patient_id', 'content_type', 'uploaded_at'),  # /list?type=
+        db.Index('ix_record_patient_uploader_uploaded', 'patient_id', 'uploaded_by', 'uploaded_at'),  # /list?uploader=
+    )
+
+class Blob(db.Model):
+    __shard_key__ = 'digest'
+
+    digest = db.Column(db.String(64), primary_key=True)  # hex SHA-256, also the storage key
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # live Records pointing at it
+    created_at = db.Column(db.DateTime, nullable=False)
+
+class UploadSession(db.Model):
+    __shard_key__ = 'id'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client
+    patient_id = db.Column(db.String(120), nullable=False)  # email of the patient
+    uploaded_by = db.Column(db.String(120), nullable=False)  # email of the uploader
+    filename = db.Column(db.String(255), nullable=False)  # final name inside uploads/
+    next_chunk = db.Column(db.Integer, nullable=False, default=0)  # first chunk not yet acknowledged
+    bytes_received = db.Column(db.BigInteger, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, nullable=True)  # optional, announced by the client
+    status = db.Column(db.String(20), nullable=False, default='open')  # 'open', 'committed'
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
 
 class AccessLog(db.Model):
+    __shard_key__ = 'patient_id'
+
     id = db.Column(db.Integer, primary_key=True)
     record_id = db.Column(db.Integer, db.ForeignKey('record.id'), nullable=False)
     accessed_by = db.Column(db.String(120), nullable=False)  # email of user accessing
     access_time = db.Column(db.DateTime, nullable=False)
+    patient_id = db.Column(db.String(120), nullable=True)  # copied from the record, so a patient's log pages by index
+    tx_hash = db.Column(db.String(66), nullable=True)  # blockchain transaction, once the outbox entry is mined
+
+    __table_args__ = (
+        db.Index('ix_access_log_record_time', 'record_id', 'access_time'),
+        db.Index('ix_access_log_patient_time', 'patient_id', 'access_time'),
+    )
+
+# Access events waiting to be (or already) logged on the blockchain, written in the
+# same transaction as the change they describe and sent by the chain outbox worker
+class ChainOutbox(db.Model):
+    __shard_key__ = 'patient_id'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)  # uuid4 hex, or the client's key
+    patient_id = db.Column(db.String(120), nullable=True)  # whose data was accessed
+    user_email = db.Column(db.String(120), nullable=False)  # logAccess arguments
+    record_name = db.Column(db.String(255), nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    access_log_id = db.Column(db.Integer, nullable=True)  # AccessLog row that gets the tx hash, if any
+    created_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False)  # next attempt; pushed past a worker's lease on claim
+    claimed_by = db.Column(db.String(120), nullable=True)  # worker holding (or last holding) the lease
+    anchor_id = db.Column(db.Integer, nullable=True)  # ChainAnchor epoch whose Merkle tree holds this row (anchor mode)
+    leaf_index = db.Column(db.Integer, nullable=True)  # the row's leaf in that tree
+    raw_tx = db.Column(db.Text, nullable=True)  # signed transaction, re-broadcast as is on retry; on one row per tx
+    tx_hash = db.Column(db.String(66), nullable=True)  # shared by the rows batched into one tx, known before broadcast
+    block_number = db.Column(db.BigInteger, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)  # receipt seen
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_chain_outbox_queue', 'status', 'available_at',
+                 sqlite_where=db.text("status = 'pending'"), postgresql_where=db.text("status = 'pending'"),
+                 mssql_where=db.text("status = 'pending'")),
+        db.Index('ix_chain_outbox_tx_hash', 'tx_hash'),
+        db.Index('ix_chain_outbox_access_log', 'access_log_id'),
+    )
+
+# Merkle trees of access-event epochs whose root the outbox worker anchors on-chain
+# (CHAIN_OUTBOX_MODE=anchor). Not sharded: epochs of every shard share one sequence.
+class ChainAnchor(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    root = db.Column(db.String(66), nullable=False)  # 0x hex, as passed to anchorRoot
+    leaf_count = db.Column(db.Integer, nullable=False)
+    tree = db.Column(db.LargeBinary, nullable=False)  # 32-byte nodes level by level, leaves first
+    created_at = db.Column(db.DateTime, nullable=False)
+
+# AccessLogged events copied from the chain by the event indexer (app/services/chain_index.py),
+# so history queries never scan the chain. Not sharded: one chain log serves every shard.
+class ChainEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    block_number = db.Column(db.BigInteger, nullable=False)
+    block_hash = db.Column(db.String(66), nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    log_index = db.Column(db.Integer, nullable=False)
+    sender = db.Column(db.String(42), nullable=False)  # the event's indexed `accessor`: the signing account
+    user_email = db.Column(db.String(255), nullable=False)  # logAccess arguments, cut to the column sizes
+    record_name = db.Column(db.String(255), nullable=False)
+    action = db.Column(db.String(50), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)  # block time, UTC
+
+    __table_args__ = (
+        db.UniqueConstraint('block_hash', 'log_index', name='uq_chain_event_log'),
+        db.Index('ix_chain_event_record_time', 'record_name', 'timestamp'),  # ?record=
+        db.Index('ix_chain_event_user_time', 'user_email', 'timestamp'),  # ?accessor=
+        db.Index('ix_chain_event_sender_time', 'sender', 'timestamp'),  # ?sender=
+        db.Index('ix_chain_event_time', 'timestamp'),  # ?from=&to= alone
+        db.Index('ix_chain_event_block', 'block_number'),  # reorg rollback
+    )
+
+# How far the event indexer got: the last indexed block and the hashes of the blocks a reorg
+# may still replace. One row per contract; its lease lets a single indexer run at a time.
+class ChainCursor(db.Model):
+    id = db.Column(db.String(120), primary_key=True)  # "<contract address>:AccessLogged"
+    block_number = db.Column(db.BigInteger, nullable=False)  # last indexed block
+    recent_blocks = db.Column(db.Text, nullable=False, default='[]')  # JSON [[number, hash], ...], oldest first
+    claimed_by = db.Column(db.String(120), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+# AccessLog counts per (hour or day, record, accessor), kept up to date by the access-log writer
+class AccessRollup(db.Model):
+    __shard_key__ = 'patient_id'
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)  # UTC start of the hour / day
+    record_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.String(120), nullable=True)  # owner of the record
+    accessed_by = db.Column(db.String(120), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'record_id', 'accessed_by', name='uq_access_rollup_bucket'),
+        db.Index('ix_access_rollup_patient', 'granularity', 'patient_id', 'bucket_start'),
+        db.Index('ix_access_rollup_accessor', 'granularity', 'accessed_by', 'bucket_start'),
+    )
 
 class MedicalForm(db.Model):
+    __shard_key__ = 'patient_email'
+
     id = db.Column(db.Integer, primary_key=True)
     patient_email = db.Column(db.String(120), nullable=False)
     form_type = db.Column(db.String(50), nullable=False)  # 'health_profile', 'symptoms', 'vitals', 'medications', 'family_history'
@@ -30,8 +173,43 @@ class MedicalForm(db.Model):
     submitted_at = db.Column(db.DateTime, nullable=False)
     doctor_email = db.Column(db.String(120), nullable=True)  # Doctor who reviewed it
     status = db.Column(db.String(20), default='pending')  # 'pending', 'reviewed', 'approved'
+    claimed_by = db.Column(db.String(120), nullable=True)  # doctor holding (or last holding) the review lease
+    available_at = db.Column(db.DateTime, nullable=True)  # claimable from then on: submission, or lease expiry
+
+    # Patients list their own forms; doctors list forms they hold OR forms they reviewed,
+    # all newest first (SQLite answers the OR with one index per branch). Doctors take
+    # pending forms from the review queue, a partial index over pending forms only.
+    __table_args__ = (
+        db.Index('ix_medical_form_patient_submitted', 'patient_email', 'submitted_at'),
+        db.Index('ix_medical_form_status_submitted', 'status', 'submitted_at'),
+        db.Index('ix_medical_form_doctor_submitted', 'doctor_email', 'submitted_at'),
+        db.Index('ix_medical_form_claimed_submitted', 'claimed_by', 'submitted_at'),
+        db.Index('ix_medical_form_queue', 'status', 'available_at',
+                 sqlite_where=db.text("status = 'pending'"), postgresql_where=db.text("status = 'pending'"),
+                 mssql_where=db.text("status = 'pending'")),
+    )
+
+# One typed row per vitals submission, so trends are read without parsing form_data JSON
+class VitalReading(db.Model):
+    __shard_key__ = 'patient_email'
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_email = db.Column(db.String(120), nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    form_id = db.Column(db.Integer, nullable=True)  # MedicalForm it was taken from
+    systolic = db.Column(db.Float, nullable=True)  # mmHg
+    diastolic = db.Column(db.Float, nullable=True)  # mmHg
+    heart_rate = db.Column(db.Float, nullable=True)  # beats per minute
+    temperature = db.Column(db.Float, nullable=True)  # degrees Celsius
+    spo2 = db.Column(db.Float, nullable=True)  # percent
+
+    __table_args__ = (
+        db.Index('ix_vital_reading_patient_recorded', 'patient_email', 'recorded_at'),
+    )
 
 class Prescription(db.Model):
+    __shard_key__ = 'patient_email'
+
     id = db.Column(db.Integer, primary_key=True)
     patient_email = db.Column(db.String(120), nullable=False)
     doctor_email = db.Column(db.String(120), nullable=False)
@@ -41,4 +219,9 @@ class Prescription(db.Model):
     duration = db.Column(db.String(100), nullable=False)
     instructions = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='active')  # 'active', 'completed', 'cancelled'
\ No newline at end of file
+    status = db.Column(db.String(20), default='active')  # 'active', 'completed', 'cancelled'
+
+    __table_args__ = (
+        db.Index('ix_prescription_patient_created', 'patient_email', 'created_at'),
+        db.Index('ix_prescription_doctor_created', 'doctor_email', 'created_at'),
+    )
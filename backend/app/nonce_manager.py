@@ -0,0 +1,267 @@
+# File: backend/app/nonce_manager.py
+import itertools
+import threading
+import time
+from web3.exceptions import TransactionNotFound
+
+# Transactions from one account need consecutive nonces. Asking the node
+# (get_transaction_count) before every send costs a round trip and races:
+# two threads or workers read the same count and one transaction is
+# refused. Nonces are handed out locally instead:
+#
+#   NonceManager     one account's next nonce, under a lock; read from the
+#                    node once ('pending' count) and again after resync()
+#   AccountPool      signing accounts used round-robin, each with its own
+#                    NonceManager, so transactions of different accounts
+#                    never wait on each other's nonces
+#   TransactionPipeline
+#                    signs and sends without waiting for the receipt, up to
+#                    max_in_flight transactions at a time; a daemon thread
+#                    polls receipts and completes them
+#
+# Local counters drift when a nonce is lost: a transaction signed but never
+# sent, one the node dropped, or another process using the same account.
+# Any "nonce too low" answer or dropped transaction resyncs the account's
+# counter from the node, and the pipeline sends the affected transaction
+# again with a new nonce.
+
+# Node errors for a nonce already used by the account, across geth, Hardhat and anvil
+NONCE_TOO_LOW = ('nonce too low', 'nonce has already been used')
+
+
+def is_nonce_too_low(error):
+    message = str(error).lower()
+    return any(pattern in message for pattern in NONCE_TOO_LOW)
+
+
+class NonceManager:
+    """Thread-safe local nonces of one account, with the nonces of its transactions in flight."""
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self.in_flight = {}  # nonce -> tx hash, from sent() until done()
+        self._next = None
+        self._behind = False
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        with self._lock:
+            if self._next is None or self._behind:
+                count = self.w3.eth.get_transaction_count(self.address, 'pending')
+                self._next = max(self._next, count) if self._behind else count
+                self._behind = False
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def sent(self, nonce, tx_hash):
+        with self._lock:
+            self.in_flight[nonce] = tx_hash
+
+    def done(self, nonce):
+        with self._lock:
+            self.in_flight.pop(nonce, None)
+
+    def resync(self, forward_only=False):
+        """
+        Read the counter from the node again at the next allocate(). With
+        forward_only (after "nonce too low") it only ever moves up, so
+        nonces other threads hold are not handed out twice; otherwise it
+        may move back, to reuse a nonce that was never sent or was dropped.
+        """
+        with self._lock:
+            if forward_only and self._next is not None:
+                self._behind = True
+            else:
+                self._next = None
+                self._behind = False
+
+
+class AccountPool:
+    """Signing accounts from private keys, taken round-robin; the first one is the primary account."""
+
+    def __init__(self, w3, keys):
+        if not keys:
+            raise ValueError("AccountPool needs at least one private key")
+        self.accounts = [w3.eth.account.from_key(key) for key in keys]
+        self.nonces = {account.address: NonceManager(w3, account.address) for account in self.accounts}
+        self._cycle = itertools.cycle(self.accounts)
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.accounts[0]
+
+    def next_account(self):
+        with self._lock:
+            return next(self._cycle)
+
+    def allocate(self, account=None):
+        """(account, nonce) for a new transaction, from `account` or the next account in turn."""
+        account = account or self.next_account()
+        return account, self.nonces[account.address].allocate()
+
+    def resync(self, address=None, forward_only=False):
+        for manager in self.nonces.values() if address is None else [self.nonces[address]]:
+            manager.resync(forward_only)
+
+    def in_flight(self):
+        return sum(len(manager.in_flight) for manager in self.nonces.values())
+
+
+class PendingTransaction:
+    """A transaction submitted to a TransactionPipeline; wait() returns its receipt."""
+
+    def __init__(self, call, tx):
+        self.call = call
+        self.tx = tx
+        self.account = None
+        self.nonce = None
+        self.tx_hash = None
+        self.sent_at = None
+        self.receipt = None
+        self.error = None
+        self.resends = 0
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"no receipt for {self.tx_hash} after {timeout:g}s")
+        if self.error is not None:
+            raise self.error
+        return self.receipt
+
+    def _finish(self, receipt=None, error=None):
+        self.receipt = receipt
+        self.error = error
+        self._done.set()
+
+
+class TransactionPipeline:
+    """
+    Sends contract calls from an AccountPool without waiting for them to be
+    mined. submit() returns once the node has the transaction; receipts are
+    collected on a daemon thread. A transaction without a receipt after
+    `drop_after` seconds that the node no longer knows was dropped: its
+    account is resynced and it is sent again, up to `max_resends` times.
+    """
+
+    def __init__(self, w3, pool, max_in_flight=256, poll_interval=0.2, drop_after=60, max_resends=3):
+        self.w3 = w3
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.drop_after = drop_after
+        self.max_resends = max_resends
+        self.stats = {'submitted': 0, 'mined': 0, 'reverted': 0, 'resynced': 0, 'resent': 0, 'failed': 0}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pending = {}  # tx hash -> PendingTransaction
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._track, name='tx-receipts', daemon=True)
+        self._thread.start()
+
+    def submit(self, call, tx=None):
+        """Sign and send `call` (a web3 contract function call) with extra `tx` fields; blocks while the pipeline is full."""
+        self._slots.acquire()
+        pending = PendingTransaction(call, dict(tx or {}))
+        try:
+            self._send(pending)
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats['submitted'] += 1
+        return pending
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, timeout=None):
+        """Wait for the transactions in flight (up to `timeout` seconds), then stop tracking receipts."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.in_flight() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(self.poll_interval)
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _send(self, pending, attempts=3):
+        if 'gas' not in pending.tx:
+            # Estimated without the nonce: nodes reject estimates for a nonce ahead of the account's.
+            pending.tx['gas'] = pending.call.estimate_gas({'from': (pending.account or self.pool.primary).address})
+        for attempt in range(attempts):
+            account, nonce = self.pool.allocate(pending.account)
+            try:
+                tx = pending.call.build_transaction({**pending.tx, 'from': account.address, 'nonce': nonce})
+                signed = account.sign_transaction(tx)
+                self.w3.eth.send_raw_transaction(signed.raw_transaction)
+            except Exception as e:
+                # Another sender took the nonce (move up to the node's count), or it is unused (reuse it).
+                too_low = is_nonce_too_low(e)
+                self.pool.resync(account.address, forward_only=too_low)
+                self.stats['resynced'] += 1
+                if not too_low or attempt == attempts - 1:
+                    raise
+                pending.account = account  # retry on the same account
+                continue
+            tx_hash = self.w3.to_hex(signed.hash)
+            self.pool.nonces[account.address].sent(nonce, tx_hash)
+            pending.account, pending.nonce, pending.tx_hash = account, nonce, tx_hash
+            pending.sent_at = time.monotonic()
+            with self._lock:
+                self._pending[tx_hash] = pending
+            return
+
+    def _track(self):
+        while not self._stop.is_set():
+            with self._lock:
+                waiting = list(self._pending.items())
+            for tx_hash, pending in waiting:
+                try:
+                    receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    receipt = None
+                except Exception:
+                    continue  # node unreachable: try again next round
+                if receipt is not None:
+                    self._complete(tx_hash, pending, receipt=receipt)
+                elif time.monotonic() - pending.sent_at > self.drop_after:
+                    self._check_dropped(tx_hash, pending)
+            self._stop.wait(self.poll_interval)
+
+    def _check_dropped(self, tx_hash, pending):
+        try:
+            self.w3.eth.get_transaction(tx_hash)
+            pending.sent_at = time.monotonic()  # still in the mempool, just slow
+            return
+        except TransactionNotFound:
+            pass
+        except Exception:
+            return
+        with self._lock:
+            del self._pending[tx_hash]
+        self.pool.nonces[pending.account.address].done(pending.nonce)
+        self.pool.resync(pending.account.address)
+        self.stats['resynced'] += 1
+        if pending.resends >= self.max_resends:
+            self._finish(pending, error=RuntimeError(f"transaction {tx_hash} dropped {pending.resends + 1} times"))
+            return
+        pending.resends += 1
+        self.stats['resent'] += 1
+        try:
+            self._send(pending)
+        except Exception as e:
+            self._finish(pending, error=e)
+
+    def _complete(self, tx_hash, pending, receipt):
+        with self._lock:
+            del self._pending[tx_hash]
+        self.pool.nonces[pending.account.address].done(pending.nonce)
+        self.stats['mined' if receipt['status'] == 1 else 'reverted'] += 1
+        self._finish(pending, receipt=receipt)
+
+    def _finish(self, pending, receipt=None, error=None):
+        if error is not None:
+            self.stats['failed'] += 1
+        pending._finish(receipt=receipt, error=error)
+        self._slots.release()
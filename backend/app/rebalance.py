@@ -0,0 +1,220 @@
+# app/rebalance.py
+"""
+Move sharded rows to the shard their key hashes to.
+
+Needed after adding a shard to SQLALCHEMY_SHARD_URIS (rendezvous hashing
+moves ~1/N of the keys onto it) and once when sharding an existing
+deployment, whose patient data still sits in the default database, which
+the app no longer reads sharded tables from.
+
+Each key (a patient's email, a blob's digest, an upload's id) is copied in
+one transaction on its home shard, then deleted from where it was in a
+second one. Rows the home shard already has (same primary key) are skipped,
+so a run interrupted between the two steps can simply be repeated; blob
+reference counts and access rollups the home shard also has are added up.
+
+--repair-blobs instead raises blob reference counts to the number of live
+records pointing at each blob, recreating missing Blob rows. A record and
+its blob's row can sit on different shards, and the two shards commit one
+after the other, so a failure between the commits can leave a count short
+(see app/services/blob_store.py). Counts are only ever raised: an excess
+reference merely keeps a blob's bytes around.
+
+    python -m backend.app.rebalance --dry-run
+    python -m backend.app.rebalance
+    python -m backend.app.rebalance --patient alice@example.com
+    python -m backend.app.rebalance --repair-blobs --dry-run
+"""
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import and_, delete, func, insert, inspect, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from backend.app import create_app
+from backend.app.database import shard_name
+from backend.app.models import AccessRollup, Blob, Record, db
+from backend.app.services import blob_store, search_index
+from backend.app.storage import BlobNotFound, get_storage
+
+BATCH = 500  # primary keys per IN (...) lookup
+ROLLUP_KEY = ('granularity', 'bucket_start', 'record_id', 'accessed_by')
+
+
+def has_search_index(conn):
+    return conn.dialect.name == 'sqlite' and inspect(conn).has_table(search_index.TABLE)
+
+
+def misplaced(shards, sources, only=None):
+    """{(source, home shard, key): Counter(table -> rows)} for every key stored off its home shard."""
+    moves = defaultdict(Counter)
+    for source, engine in sources:
+        with engine.connect() as conn:
+            for table in db.metadata.sorted_tables:
+                key = shards.keys.get(table)
+                if key is None or not inspect(conn).has_table(table.name):
+                    continue
+                column = table.c[key]
+                query = select(column, func.count()).where(column.is_not(None)).group_by(column)
+                if only is not None:
+                    query = query.where(column == only)
+                for value, count in conn.execute(query):
+                    home = shards.index_for(value)
+                    if home != source:
+                        moves[(source, home, value)][table.name] += count
+    return moves
+
+
+def _missing(conn, table, rows):
+    """The rows whose primary key `conn`'s copy of `table` does not have yet."""
+    pk = list(table.primary_key.columns)
+    key = pk[0] if len(pk) == 1 else tuple_(*pk)
+    present = set()
+    for i in range(0, len(rows), BATCH):
+        keys = [tuple(row[c.name] for c in pk) for row in rows[i:i + BATCH]]
+        wanted = [k[0] for k in keys] if len(pk) == 1 else keys
+        present.update(tuple(found) for found in conn.execute(select(*pk).where(key.in_(wanted))))
+    return [row for row in rows if tuple(row[c.name] for c in pk) not in present]
+
+
+def _merge_blobs(dst, rows):
+    table = Blob.__table__
+    for row in rows:
+        if dst.execute(update(table).where(table.c.digest == row['digest'])
+                       .values(ref_count=table.c.ref_count + row['ref_count'])).rowcount == 0:
+            dst.execute(insert(table).values(**row))
+
+
+def _merge_rollups(dst, rows):
+    table = AccessRollup.__table__
+    for row in rows:
+        same_bucket = and_(*(table.c[name] == row[name] for name in ROLLUP_KEY))
+        if dst.execute(update(table).where(same_bucket)
+                       .values(count=table.c.count + row['count'])).rowcount == 0:
+            dst.execute(insert(table).values(**row))
+
+
+def move(shards, src_engine, dst_engine, value):
+    """Copy every row keyed by `value` from src to dst, then delete it from src."""
+    tables = [t for t in db.metadata.sorted_tables if t in shards.keys]
+    with src_engine.connect() as src:
+        present = [t for t in tables if inspect(src).has_table(t.name)]
+        rows = {t: [dict(r) for r in src.execute(select(t).where(t.c[shards.keys[t]] == value)).mappings()]
+                for t in present}
+        documents = []
+        if has_search_index(src):
+            documents = [dict(r) for r in src.execute(
+                text(f"SELECT rowid, owner, title, body, kind, doc_id, patient_id, created_at "
+                     f"FROM {search_index.TABLE} WHERE patient_id = :value"), {'value': value}).mappings()]
+
+    with dst_engine.begin() as dst:
+        for table in present:
+            new = _missing(dst, table, rows[table]) if rows[table] else []
+            if table is Blob.__table__:
+                _merge_blobs(dst, new)
+            elif table is AccessRollup.__table__:
+                _merge_rollups(dst, new)
+            elif new:
+                dst.execute(insert(table), new)
+        if documents and has_search_index(dst):
+            for document in documents:
+                dst.execute(text(f"DELETE FROM {search_index.TABLE} WHERE rowid = :rowid"),
+                            {'rowid': document['rowid']})
+            dst.execute(text(
+                f"INSERT INTO {search_index.TABLE} (rowid, owner, title, body, kind, doc_id, patient_id, created_at) "
+                "VALUES (:rowid, :owner, :title, :body, :kind, :doc_id, :patient_id, :created_at)"
+            ), documents)
+
+    with src_engine.begin() as src:
+        for document in documents:
+            src.execute(text(f"DELETE FROM {search_index.TABLE} WHERE rowid = :rowid"), {'rowid': document['rowid']})
+        for table in reversed(present):
+            src.execute(delete(table).where(table.c[shards.keys[table]] == value))
+
+
+def blob_references(sources):
+    """({digest: live records pointing at it}, {digest: size known from a record}) over every database."""
+    record = Record.__table__
+    counts, sizes = Counter(), {}
+    query = (
+        select(record.c.content_hash, func.count(), func.max(record.c.size))
+        .where(record.c.deleted_at.is_(None), record.c.blob_url.startswith(blob_store.BLOB_URL_PREFIX))
+        .group_by(record.c.content_hash)
+    )
+    for _, engine in sources:
+        with engine.connect() as conn:
+            if not inspect(conn).has_table(record.name):
+                continue
+            for digest, live, size in conn.execute(query):
+                counts[digest] += live
+                if size is not None:
+                    sizes[digest] = size
+    return counts, sizes
+
+
+def repair_blobs(shards, sources, dry_run=False):
+    """Raise every blob's ref_count on its home shard to its live records. Returns the digests repaired."""
+    table = Blob.__table__
+    counts, sizes = blob_references(sources)
+    repaired = 0
+    for digest, live in sorted(counts.items()):
+        with shards.engines[shards.index_for(digest)].begin() as conn:
+            stored = conn.execute(select(table.c.ref_count).where(table.c.digest == digest)).scalar()
+            if stored is not None and stored >= live:
+                continue
+            print(f"{digest}: {'no blob row' if stored is None else f'{stored} reference(s)'} -> {live}")
+            repaired += 1
+            if dry_run:
+                continue
+            if stored is not None:
+                conn.execute(update(table).where(table.c.digest == digest, table.c.ref_count < live)
+                             .values(ref_count=live))
+                continue
+            size = sizes.get(digest)
+            if size is None:
+                try:
+                    size = get_storage().stat(blob_store.object_key(digest)).size
+                except BlobNotFound:
+                    print(f"{digest}: bytes missing from storage, left as is")
+                    repaired -= 1
+                    continue
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(table).values(digest=digest, size=size, ref_count=live,
+                                                      created_at=datetime.utcnow()))
+            except IntegrityError:
+                # A concurrent upload created the row; the next run sees its count.
+                repaired -= 1
+    return repaired
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m backend.app.rebalance', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='list the moves without making them')
+    parser.add_argument('--patient', help='only move rows keyed by this email (or digest, or upload id)')
+    parser.add_argument('--repair-blobs', action='store_true',
+                        help='raise blob reference counts to the live records instead of moving rows')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        shards = app.extensions.get('db_shards')
+        if shards is None:
+            raise SystemExit("SQLALCHEMY_SHARD_URIS is not set; nothing to rebalance")
+        sources = [(None, db.engines[None])] + list(enumerate(shards.engines))
+        engines = dict(sources)
+        if args.repair_blobs:
+            repaired = repair_blobs(shards, sources, args.dry_run)
+            print(f"{repaired} blob(s) {'to repair' if args.dry_run else 'repaired'}")
+            return
+        moves = misplaced(shards, sources, args.patient)
+        for (source, home, value), counts in sorted(moves.items(), key=lambda item: str(item[0])):
+            summary = ', '.join(f"{name} {n}" for name, n in sorted(counts.items()))
+            print(f"{value}: {'default' if source is None else shard_name(source)} -> {shard_name(home)} ({summary})")
+            if not args.dry_run:
+                move(shards, engines[source], engines[home], value)
+        print(f"{len(moves)} key(s) {'to move' if args.dry_run else 'moved'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,149 @@
 # app/routes/blockchain_routes.py
-from flask import Blueprint, request, jsonify
-from backend.app.services.blockchain_service import log_access
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from backend.app.database import locate, read_only, use_shard
+from backend.app import blockchain
+from backend.app.models import db, AccessLog, ChainEvent, ChainOutbox
+from backend.app.services import anchoring, chain_index, chain_outbox, pagination
 
 blockchain_bp = Blueprint('blockchain', __name__, url_prefix='/blockchain')
 
 @blockchain_bp.route('/log_access', methods=['POST'])
 def log_access_endpoint():
-    """API endpoint to log a new access event to the blockchain."""
+    """Queue an access event for the blockchain; retries with the same Idempotency-Key return the first one."""
     data = request.json
     if not data:
         return jsonify({"error": "Request body must be JSON"}), 400
-        
+
     required_fields = ['record_id', 'patient_id', 'accessor']
     if not all(field in data for field in required_fields):
         return jsonify({"error": "Missing required fields: 'record_id', 'patient_id', 'accessor'"}), 400
 
     record_id = data.get('record_id')
-    patient_id = data.get('patient_id')
+    patient_id = str(data.get('patient_id'))
     accessor = data.get('accessor')
 
+    key = request.headers.get('Idempotency-Key')
+    if key is not None:
+        try:
+            key = chain_outbox.parse_key(key)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    use_shard(patient_id)
+    try:
+        existing = ChainOutbox.query.filter_by(idempotency_key=key).first() if key else None
+        if existing is None:
+            try:
+                row = chain_outbox.enqueue(db.session, accessor, str(record_id), 'access', patient_id=patient_id,
+                                           idempotency_key=key)
+                db.session.commit()
+                return jsonify({"message": "Access queued for the blockchain", **chain_outbox.describe(row)}), 202
+            except IntegrityError:
+                db.session.rollback()  # a concurrent retry with the same key won
+                existing = ChainOutbox.query.filter_by(idempotency_key=key).first()
+        return jsonify({"message": "Access already queued", **chain_outbox.describe(existing)}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@blockchain_bp.route('/outbox/<key>', methods=['GET'])
+@jwt_required()
+def outbox_entry(key):
+    """Delivery status and transaction hash of one queued access event."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    shard = locate(ChainOutbox, idempotency_key=key)
+    if shard is None:
+        return jsonify({"error": "Not found"}), 404
+    use_shard(shard=shard)
+    row = ChainOutbox.query.filter_by(idempotency_key=key).first()
+    if not row:
+        return jsonify({"error": "Not found"}), 404
+    if role != 'doctor' and row.patient_id != email:
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(chain_outbox.describe(row)), 200
+
+@blockchain_bp.route('/outbox', methods=['GET'])
+@jwt_required()
+def outbox_summary():
+    """Queued / sent / failed counts, plus this process's worker counters."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    if role != 'doctor':
+        return jsonify({"error": "Unauthorized"}), 403
     try:
-        transaction_hash = log_access(record_id, patient_id, accessor)
+        worker = current_app.extensions.get('chain_outbox')
         return jsonify({
-            "message": "Access logged successfully",
-            "transaction_hash": transaction_hash
+            "counts": chain_outbox.counts(),
+            "worker": worker.stats if worker is not None else None
         }), 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": f"Failed to read the outbox: {str(e)}"}), 500
+
+@blockchain_bp.route('/proof/<int:access_log_id>', methods=['GET'])
+@jwt_required()
+def access_proof(access_log_id):
+    """
+    Merkle inclusion proof of an access log entry against the root its epoch
+    anchored on-chain. Only entries sent to the chain have one: a patient
+    reading their own records and exports write AccessLog rows alone, and
+    get 409 here.
+    """
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    shard = locate(AccessLog, id=access_log_id)
+    if shard is None:
+        return jsonify({"error": "Not found"}), 404
+    use_shard(shard=shard)
+    try:
+        log = db.session.get(AccessLog, access_log_id)
+        if log is None:
+            return jsonify({"error": "Not found"}), 404
+        if role != 'doctor' and log.patient_id != email:
+            return jsonify({"error": "Unauthorized"}), 403
+        row = ChainOutbox.query.filter_by(access_log_id=log.id).first()
+        if row is None:
+            return jsonify({
+                "error": "This access was never sent to the blockchain, so it has no proof",
+                "access_log_id": log.id
+            }), 409
+        if row.status != 'sent' or row.anchor_id is None:
+            return jsonify({"error": "This access is not anchored (yet)", **chain_outbox.describe(row)}), 409
+        worker = current_app.extensions.get('chain_outbox')
+        return jsonify({
+            "access_log_id": log.id,
+            "contract": blockchain.contract_address,
+            "anchorer": worker.client.address if worker is not None else None,
+            **anchoring.inclusion_proof(row)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to build the proof: {str(e)}"}), 500
+
+@blockchain_bp.route('/events', methods=['GET'])
+@jwt_required()
+@read_only
+def chain_events():
+    """AccessLogged events by record, accessor, sender and time range, from the local event index."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    if role != 'doctor':
+        return jsonify({"error": "Unauthorized"}), 403
+    try:
+        after, limit = pagination.page_args()
+        filters = chain_index.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        events, next_cursor = pagination.keyset_page(
+            chain_index.events_query(filters), ChainEvent.timestamp, ChainEvent.id, after, limit
+        )
+        indexer = current_app.extensions.get('chain_index')
+        return pagination.with_next_cursor(jsonify({
+            "events": [chain_index.describe(event) for event in events],
+            "indexed_block": indexer.indexed_block() if indexer is not None else None,
+            "next_cursor": next_cursor
+        }), next_cursor), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to read chain events: {str(e)}"}), 500
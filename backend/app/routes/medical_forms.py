@@ -1,10 +1,39 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_cors import cross_origin
+from ..database import fan_out, locate, read_only, shard_scope, use_shard
 from ..models import db, MedicalForm, Prescription
+from ..services import pagination, review_queue, search_index, vitals
 from datetime import datetime
 import json
 
+def serialize_form(form):
+    return {
+        "id": form.id,
+        "patient_email": form.patient_email,
+        "form_type": form.form_type,
+        "form_data": json.loads(form.form_data),
+        "submitted_at": form.submitted_at.isoformat(),
+        "doctor_email": form.doctor_email,
+        "status": form.status,
+        "claimed_by": form.claimed_by if form.status == 'pending' else None,
+        "lease_expires_at": form.available_at.isoformat() if form.status == 'pending' and form.claimed_by else None
+    }
+
+def serialize_prescription(prescription):
+    return {
+        "id": prescription.id,
+        "patient_email": prescription.patient_email,
+        "doctor_email": prescription.doctor_email,
+        "medication_name": prescription.medication_name,
+        "dosage": prescription.dosage,
+        "frequency": prescription.frequency,
+        "duration": prescription.duration,
+        "instructions": prescription.instructions,
+        "created_at": prescription.created_at.isoformat(),
+        "status": prescription.status
+    }
+
 medical_forms_bp = Blueprint('medical_forms', __name__)
 
 @medical_forms_bp.route('/forms', methods=['POST', 'OPTIONS'])
@@ -33,16 +62,24 @@ def submit_form():
         if form_type not in valid_types:
             return jsonify({"error": f"Invalid form_type. Must be one of: {valid_types}"}), 400
         
-        # Create new medical form
+        # Create new medical form; it joins the review queue right away
+        use_shard(email)
+        submitted_at = datetime.utcnow()
         medical_form = MedicalForm(
             patient_email=email,
             form_type=form_type,
             form_data=json.dumps(form_data),
-            submitted_at=datetime.utcnow(),
-            status='pending'
+            submitted_at=submitted_at,
+            status='pending',
+            available_at=submitted_at
         )
         
         db.session.add(medical_form)
+        db.session.flush()
+        search_index.index_form(db.session, medical_form, form_data)
+        reading = vitals.reading_for_form(medical_form, form_data)
+        if reading is not None:
+            db.session.add(reading)
         db.session.commit()
         
         return jsonify({
@@ -58,47 +95,177 @@ def submit_form():
 @medical_forms_bp.route('/forms', methods=['GET', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
+@read_only
 def get_forms():
     """Get medical forms for the current user"""
     if request.method == 'OPTIONS':
         return '', 200
     
+    try:
+        after, limit = pagination.page_args()
+    except pagination.CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
         identity = get_jwt_identity()
         email, role = identity.split(':')
         
         if role.lower() == 'patient':
             # Patients can see their own forms
-            forms = MedicalForm.query.filter_by(patient_email=email).order_by(MedicalForm.submitted_at.desc()).all()
+            use_shard(email)
+            forms, next_cursor = pagination.keyset_page(
+                MedicalForm.query.filter_by(patient_email=email),
+                MedicalForm.submitted_at, MedicalForm.id, after, limit
+            )
+            forms_data = [serialize_form(form) for form in forms]
         elif role.lower() == 'doctor':
-            # Doctors can see all pending forms and forms they've reviewed
-            forms = MedicalForm.query.filter(
-                (MedicalForm.status == 'pending') | (MedicalForm.doctor_email == email)
-            ).order_by(MedicalForm.submitted_at.desc()).all()
+            # Doctors see the pending forms they have claimed and forms they've reviewed, from
+            # every shard; unclaimed pending forms are handed out by POST /forms/claim
+            forms_data, next_cursor = pagination.merge_pages(fan_out(lambda: [
+                item
+                for query in (MedicalForm.query.filter_by(claimed_by=email, status='pending'),
+                              MedicalForm.query.filter_by(doctor_email=email))
+                for item in pagination.keyset_items(query, MedicalForm.submitted_at, MedicalForm.id, after, limit,
+                                                    serialize_form)
+            ]), limit)
         else:
             return jsonify({"error": "Invalid role"}), 403
         
-        forms_data = []
-        for form in forms:
-            forms_data.append({
-                "id": form.id,
-                "patient_email": form.patient_email,
-                "form_type": form.form_type,
-                "form_data": json.loads(form.form_data),
-                "submitted_at": form.submitted_at.isoformat(),
-                "doctor_email": form.doctor_email,
-                "status": form.status
-            })
-        
-        return jsonify({"forms": forms_data}), 200
+        return pagination.with_next_cursor(jsonify({"forms": forms_data, "next_cursor": next_cursor}), next_cursor), 200
         
     except Exception as e:
         return jsonify({"error": f"Failed to get forms: {str(e)}"}), 500
 
+@medical_forms_bp.route('/vitals/trend', methods=['GET', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def get_vitals_trend():
+    """Downsampled vitals series with rolling averages and out-of-range flags"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    
+    if role.lower() == 'patient':
+        patient_email = request.args.get('patient', email)
+        if patient_email != email:
+            return jsonify({"error": "Patients can only view their own vitals"}), 403
+    elif role.lower() == 'doctor':
+        patient_email = request.args.get('patient')
+        if not patient_email:
+            return jsonify({"error": "patient is required"}), 400
+    else:
+        return jsonify({"error": "Invalid role"}), 403
+    
+    try:
+        start, end, bucket, window = vitals.parse_trend_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    use_shard(patient_email)
+    try:
+        times, values = vitals.load_readings(patient_email, start, end)
+        first = start or (times[0].astype(datetime) if len(times) else end)
+        bucket_seconds = vitals.bucket_seconds_for(bucket, first, end)
+        result = vitals.trend(times, values, bucket_seconds, window)
+        result.update({
+            "patient_email": patient_email,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat(),
+            "bucket_seconds": bucket_seconds,
+            "window": window,
+            "metrics": list(vitals.METRICS),
+            "normal_ranges": vitals.NORMAL_RANGES
+        })
+        return jsonify(result), 200
+        
+    except Exception as e:
+        return jsonify({"error": f"Failed to get vitals trend: {str(e)}"}), 500
+
+@medical_forms_bp.route('/forms/claim', methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def claim_forms():
+    """Doctor claims the next pending forms from the review queue, with a lease"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    
+    if role.lower() != 'doctor':
+        return jsonify({"error": "Only doctors can claim forms"}), 403
+    
+    try:
+        count, lease_seconds = review_queue.claim_args(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        forms = []
+        for shard in review_queue.shard_order():
+            with shard_scope(shard=shard):
+                form_ids = review_queue.claim(db.session, email, count - len(forms), lease_seconds)
+                db.session.commit()
+                forms += MedicalForm.query.filter(MedicalForm.id.in_(form_ids)).all()
+            if len(forms) >= count:
+                break
+        forms.sort(key=lambda form: form.submitted_at)
+        return jsonify({
+            "forms": [serialize_form(form) for form in forms],
+            "lease_seconds": lease_seconds
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to claim forms: {str(e)}"}), 500
+
+@medical_forms_bp.route('/forms/<int:form_id>/lease', methods=['POST', 'DELETE', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def form_lease(form_id):
+    """Doctor renews (POST) or releases (DELETE) the lease on a claimed form"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    
+    if role.lower() != 'doctor':
+        return jsonify({"error": "Only doctors can hold forms"}), 403
+    
+    try:
+        _, lease_seconds = review_queue.claim_args(request.get_json(silent=True) or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        shard = locate(MedicalForm, id=form_id)
+        if shard is None:
+            return jsonify({"error": "Form not found"}), 404
+        use_shard(shard=shard)
+        form = db.session.get(MedicalForm, form_id)
+        if not form:
+            return jsonify({"error": "Form not found"}), 404
+        if request.method == 'DELETE':
+            review_queue.release(form, email)
+        else:
+            review_queue.renew(form, email, lease_seconds)
+        db.session.commit()
+        return jsonify(serialize_form(form)), 200
+        
+    except review_queue.LeaseError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to update lease: {str(e)}"}), 500
+
 @medical_forms_bp.route('/forms/<int:form_id>/review', methods=['POST', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
-def review_form():
+def review_form(form_id):
     """Doctor reviews a medical form"""
     if request.method == 'OPTIONS':
         return '', 200
@@ -110,16 +277,21 @@ def review_form():
         if role.lower() != 'doctor':
             return jsonify({"error": "Only doctors can review forms"}), 403
         
-        form_id = request.view_args['form_id']
         data = request.get_json()
         status = data.get('status', 'reviewed')
         
         if status not in ['reviewed', 'approved']:
             return jsonify({"error": "Status must be 'reviewed' or 'approved'"}), 400
         
+        shard = locate(MedicalForm, id=form_id)
+        if shard is None:
+            return jsonify({"error": "Form not found"}), 404
+        use_shard(shard=shard)
         form = MedicalForm.query.get(form_id)
         if not form:
             return jsonify({"error": "Form not found"}), 404
+        if review_queue.leased_to_other(form, email):
+            return jsonify({"error": "Form is claimed by another doctor"}), 409
         
         form.doctor_email = email
         form.status = status
@@ -161,6 +333,7 @@ def create_prescription():
         if not all([patient_email, medication_name, dosage, frequency, duration]):
             return jsonify({"error": "Missing required fields"}), 400
         
+        use_shard(patient_email)
         prescription = Prescription(
             patient_email=patient_email,
             doctor_email=email,
@@ -188,38 +361,39 @@ def create_prescription():
 @medical_forms_bp.route('/prescriptions', methods=['GET', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
+@read_only
 def get_prescriptions():
     """Get prescriptions for the current user"""
     if request.method == 'OPTIONS':
         return '', 200
     
+    try:
+        after, limit = pagination.page_args()
+    except pagination.CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
         identity = get_jwt_identity()
         email, role = identity.split(':')
         
         if role.lower() == 'patient':
-            prescriptions = Prescription.query.filter_by(patient_email=email).order_by(Prescription.created_at.desc()).all()
+            use_shard(email)
+            prescriptions, next_cursor = pagination.keyset_page(
+                Prescription.query.filter_by(patient_email=email), Prescription.created_at, Prescription.id, after, limit
+            )
+            prescriptions_data = [serialize_prescription(prescription) for prescription in prescriptions]
         elif role.lower() == 'doctor':
-            prescriptions = Prescription.query.filter_by(doctor_email=email).order_by(Prescription.created_at.desc()).all()
+            # A doctor's prescriptions span patients, so every shard contributes to the page.
+            prescriptions_data, next_cursor = pagination.merge_pages(fan_out(lambda: pagination.keyset_items(
+                Prescription.query.filter_by(doctor_email=email), Prescription.created_at, Prescription.id, after, limit,
+                serialize_prescription
+            )), limit)
         else:
             return jsonify({"error": "Invalid role"}), 403
         
-        prescriptions_data = []
-        for prescription in prescriptions:
-            prescriptions_data.append({
-                "id": prescription.id,
-                "patient_email": prescription.patient_email,
-                "doctor_email": prescription.doctor_email,
-                "medication_name": prescription.medication_name,
-                "dosage": prescription.dosage,
-                "frequency": prescription.frequency,
-                "duration": prescription.duration,
-                "instructions": prescription.instructions,
-                "created_at": prescription.created_at.isoformat(),
-                "status": prescription.status
-            })
-        
-        return jsonify({"prescriptions": prescriptions_data}), 200
+        return pagination.with_next_cursor(
+            jsonify({"prescriptions": prescriptions_data, "next_cursor": next_cursor}), next_cursor
+        ), 200
         
     except Exception as e:
         return jsonify({"error": f"Failed to get prescriptions: {str(e)}"}), 500
@@ -227,7 +401,7 @@ def get_prescriptions():
 @medical_forms_bp.route('/prescriptions/<int:prescription_id>/status', methods=['PUT', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
-def update_prescription_status():
+def update_prescription_status(prescription_id):
     """Update prescription status"""
     if request.method == 'OPTIONS':
         return '', 200
@@ -236,13 +410,16 @@ def update_prescription_status():
         identity = get_jwt_identity()
         email, role = identity.split(':')
         
-        prescription_id = request.view_args['prescription_id']
         data = request.get_json()
         status = data.get('status')
         
         if status not in ['active', 'completed', 'cancelled']:
             return jsonify({"error": "Invalid status"}), 400
         
+        shard = locate(Prescription, id=prescription_id)
+        if shard is None:
+            return jsonify({"error": "Prescription not found"}), 404
+        use_shard(shard=shard)
         prescription = Prescription.query.get(prescription_id)
         if not prescription:
             return jsonify({"error": "Prescription not found"}), 404
@@ -1,213 +1,1003 @@
 # File: backend/app/routes/storage_routes.py
-from flask import Blueprint, request, send_file, jsonify
+from flask import Blueprint, request, send_file, jsonify, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from azure.storage.blob import BlobServiceClient
+from flask_cors import cross_origin
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from werkzeug.utils import secure_filename
-from io import BytesIO
+from contextlib import contextmanager
 from datetime import datetime
-from backend.app.models import db, Record, AccessLog
-#from backend.app.blockchain import log_access  # SKIPPED for deployment
+from backend.app.models import db, Record, AccessLog, UploadSession, MedicalForm, Prescription
+from backend.app.database import fan_out, locate, read_only, shard_scope, use_shard
+from backend.app.services import (
+    access_analytics, access_log_writer, blob_store, bulk_upload, chain_outbox, chunked_upload, pagination, record_filters,
+    search_index, zip_export
+)
+from backend.app.services.http_cache import not_modified_response, requested_range, set_validators
+from backend.app.services.text_extraction import ExtractionError, derived_text_cache, read_lines, read_page
+from backend.app.storage import BlobNotFound, get_storage
+import mimetypes
 import os
+import tempfile
+import uuid
 
 storage_bp = Blueprint('storage', __name__)
 
-# Global variables initialized later
-blob_service_client = None
-container_client = None
-container_name = "patient-records"
+# Record bytes live in the configured StorageBackend (STORAGE_BACKEND=local|azure|memory).
+# Uploads are spooled and hashed on local disk first, so chunked uploads and
+# deduplication work the same whatever the backend.
+UPLOAD_FOLDER = 'uploads'
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def init_storage():
-    """Initialize Azure Blob Storage connection after .env is loaded."""
-    global blob_service_client, container_client
-    if blob_service_client is not None:
-        return  # Already initialized
-
-    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    if not connection_string:
-        raise ValueError("storage_routes.py - AZURE_STORAGE_CONNECTION_STRING is not set in .env file")
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    container_client = blob_service_client.get_container_client(container_name)
-
-    # Ensure container exists
-    try:
-        container_client.create_container()
-        print("storage_routes.py - Container created:", container_name)
-    except Exception as e:
-        print("storage_routes.py - Container creation skipped:", str(e))
+# Prefetched export blobs stay in memory up to this size, then spill to a temp file
+EXPORT_SPOOL_SIZE = int(os.getenv('EXPORT_SPOOL_SIZE', 8 * 1024 * 1024))
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt'}
 
+# Chunked uploads: suggested chunk size handed to clients, and the hard cap per PUT
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+
+# Previews are served in pages of extracted text (sizes in UTF-8 bytes)
+PREVIEW_PAGE_SIZE = 64 * 1024
+MAX_PREVIEW_PAGE_SIZE = 1024 * 1024
+PREVIEW_LINE_COUNT = 200
+MAX_PREVIEW_LINE_COUNT = 5000
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def parse_identity(identity_str):
-    """Parse string identity to dict."""
-    email, role = identity_str.split(':')
-    return {'email': email, 'role': role}
+def preview_window():
+    """Parse ?offset=&limit= for paginated previews; returns (offset, limit) or raises ValueError."""
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', PREVIEW_PAGE_SIZE, type=int)
+    if offset < 0 or limit <= 0:
+        raise ValueError("offset must be >= 0 and limit > 0")
+    return offset, min(limit, MAX_PREVIEW_PAGE_SIZE)
+
+def line_window():
+    """Parse ?start_line=&count= for line-based previews; None when not requested."""
+    if 'start_line' not in request.args:
+        return None
+    start_line = request.args.get('start_line', 0, type=int)
+    count = request.args.get('count', PREVIEW_LINE_COUNT, type=int)
+    if start_line < 0 or count <= 0:
+        raise ValueError("start_line must be >= 0 and count > 0")
+    return start_line, min(count, MAX_PREVIEW_LINE_COUNT)
+
+def find_record(filename):
+    """Latest live record stored under `filename` (re-uploads add new versions)."""
+    shard = locate(Record, filename=filename, deleted_at=None)
+    if shard is None:
+        return None
+    use_shard(shard=shard)
+    return Record.query.filter_by(filename=filename, deleted_at=None).order_by(Record.id.desc()).first()
+
+@contextmanager
+def local_copy(storage, key):
+    """Yield a local path holding the bytes of `key`, downloading them to a temp file if needed."""
+    path = storage.local_path(key)
+    if path:
+        yield path
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=chunked_upload.partial_dir(UPLOAD_FOLDER))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            storage.download_to(key, f)
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+def fetch_blob(storage, key):
+    """Open `key` for reading; runs on the export prefetch pool."""
+    path = storage.local_path(key)
+    if path:
+        return open(path, 'rb')
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    storage.download_to(key, spool)
+    spool.seek(0)
+    return spool
+
+def extract_text(filename, digest, file_path):
+    """Extract a new upload's text into the derived text cache (for search and previews); None if it has none."""
+    try:
+        return derived_text_cache.get_or_extract(digest, filename, lambda: file_path)
+    except ExtractionError:
+        return None  # still searchable by filename
 
-@storage_bp.route('/upload', methods=['POST'])
+def add_record(patient_email, filename, digest, size, uploaded_by):
+    """Stage a Record pointing at blob `digest`, taking a reference on it."""
+    blob_store.acquire(digest, size)
+    record = Record(
+        patient_id=patient_email,
+        filename=filename,
+        blob_url=blob_store.blob_url(digest),
+        uploaded_at=datetime.utcnow(),
+        content_hash=digest,
+        content_type=record_filters.content_type_for(filename),
+        size=size,
+        uploaded_by=uploaded_by
+    )
+    db.session.add(record)
+    return record
+
+@storage_bp.route('/upload', methods=['POST', 'OPTIONS'])
+@cross_origin()
 @jwt_required()
 def upload_file():
-    init_storage()  # Ensure initialized
-
-    identity_str = get_jwt_identity()  # String like "email:role"
-    current_user = parse_identity(identity_str)
-    print(f"storage_routes.py - upload_file: Current user: {current_user}")
+    """Upload file to storage + save metadata to SQL DB."""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+    
     file = request.files.get('file')
     patient_email = request.form.get('patientEmail', current_user['email'])
 
     if not file:
-        return jsonify({"error": "No file provided"}), 422
+        return jsonify({"error": "No file provided"}), 400
     if file.filename == '':
-        return jsonify({"error": "No file selected"}), 422
+        return jsonify({"error": "No file selected"}), 400
     if not allowed_file(file.filename):
-        return jsonify({"error": "File type not allowed. Allowed: pdf, docx, txt"}), 422
+        return jsonify({"error": "File type not allowed. Allowed: pdf, docx, txt"}), 400
 
     filename = secure_filename(file.filename)
-    blob_name = f"{patient_email}/{filename}"
-    print(f"storage_routes.py - upload_file: Uploading {blob_name} for {patient_email}")
+    local_filename = f"{patient_email}_{filename}"
+    use_shard(patient_email)
 
+    tmp_path = None
     try:
-        blob_client = container_client.get_blob_client(blob_name)
-        blob_client.upload_blob(file, overwrite=True)
-        record = Record(
-            patient_id=patient_email,
-            filename=blob_name,
-            blob_url=f"https://{blob_service_client.account_name}.blob.core.windows.net/{container_name}/{blob_name}",
-            uploaded_at=datetime.utcnow()
-        )
-        db.session.add(record)
+        tmp_path, content_hash, size = chunked_upload.spool_stream(UPLOAD_FOLDER, file.stream)
+        text_path = extract_text(local_filename, content_hash, tmp_path)
+        record = add_record(patient_email, local_filename, content_hash, size, current_user['email'])
+        db.session.flush()
+        search_index.index_record(db.session, record, text_path)
+        chain_outbox.enqueue(db.session, current_user['email'], local_filename, 'upload', patient_id=patient_email)
+        blob_store.place(get_storage(), tmp_path, content_hash)
         db.session.commit()
-        # log_access(current_user['email'], blob_name, 'upload')  # SKIPPED for deployment
-        print(f"storage_routes.py - SKIPPED blockchain log for upload: {current_user['email']} on {blob_name}")
         return jsonify({
             "message": "File uploaded successfully",
             "record_id": record.id,
-            "filename": blob_name,
-            "patient_id": patient_email
+            "filename": local_filename,
+            "patient_id": patient_email,
+            "sha256": content_hash
         }), 200
     except Exception as e:
         db.session.rollback()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return jsonify({"error": f"Upload failed: {str(e)}"}), 500
 
-@storage_bp.route('/list', methods=['GET'])
+@storage_bp.route('/upload/bulk', methods=['POST', 'OPTIONS'])
+@cross_origin()
 @jwt_required()
-def list_files():
-    # No blob client needed for list (DB only), but initialize for consistency
-    init_storage()
+def upload_files_bulk():
+    """Upload many files (or ZIP archives of them) in one request and one DB transaction."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    files = request.files.getlist('files')
+    patient_email = request.form.get('patientEmail', current_user['email'])
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    use_shard(patient_email)
+
+    items, results, archives = bulk_upload.expand_uploads(files, allowed_file)
+    try:
+        if len(items) > bulk_upload.MAX_BULK_FILES:
+            return jsonify({"error": f"Too many files. Maximum: {bulk_upload.MAX_BULK_FILES}"}), 400
+
+        # Hash and spool every file concurrently; nothing touches the DB yet.
+        spooled = bulk_upload.run_parallel(
+            lambda item: chunked_upload.spool_stream(UPLOAD_FOLDER, item.open()), items
+        )
+    finally:
+        for archive in archives:
+            archive.close()
+
+    staged = []
+    for item, (outcome, error) in zip(items, spooled):
+        if error:
+            results.append(item.result("failed", error=str(error)))
+            continue
+        tmp_path, content_hash, size = outcome
+        staged.append((item, f"{patient_email}_{item.name}", tmp_path, content_hash, size))
+
+    # Text extraction (for the search index) also runs before the transaction opens.
+    texts = bulk_upload.run_parallel(
+        lambda entry: extract_text(entry[1], entry[3], entry[2]), staged
+    )
+    storage = get_storage()
+    trash_keys = []
+    try:
+        records = [add_record(patient_email, filename, content_hash, size, current_user['email'])
+                   for _, filename, _, content_hash, size in staged]
+        db.session.flush()
+        # Push the blobs to storage concurrently (remote backends are latency bound) before the
+        # commit; a file whose write fails is dropped from the batch, reference and all.
+        placed = bulk_upload.run_parallel(
+            lambda entry: blob_store.place(storage, entry[2], entry[3]), staged
+        )
+        kept, dropped = [], []
+        for entry, record, (text_path, _), (_, error) in zip(staged, records, texts, placed):
+            item, _, tmp_path, content_hash, _ = entry
+            if error:
+                db.session.delete(record)
+                trash_keys.append((blob_store.release(storage, content_hash), content_hash))
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                dropped.append(item.result("failed", error=f"Storage write failed: {str(error)}"))
+                continue
+            search_index.index_record(db.session, record, text_path)
+            chain_outbox.enqueue(db.session, current_user['email'], record.filename, 'upload', patient_id=patient_email)
+            kept.append((entry, record))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for trash_key, content_hash in trash_keys:
+            blob_store.restore(storage, trash_key, content_hash)
+        for item, _, tmp_path, _, _ in staged:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            results.append(item.result("failed", error=f"Upload failed: {str(e)}"))
+        return jsonify({"uploaded": 0, "results": results}), 500
+    for trash_key, _ in trash_keys:
+        blob_store.purge(storage, trash_key)
+
+    results.extend(dropped)
+    records = [record for _, record in kept]
+    for (item, filename, _, content_hash, size), record in kept:
+        results.append(item.result(
+            "uploaded", record_id=record.id, stored_as=filename, size=size, sha256=content_hash
+        ))
+
+    status = 200 if records or not results else 400
+    return jsonify({"uploaded": len(records), "patient_id": patient_email, "results": results}), status
+
+def upload_session_state(session):
+    return {
+        "upload_id": session.id,
+        "filename": session.filename,
+        "patient_id": session.patient_id,
+        "next_chunk": session.next_chunk,
+        "bytes_received": session.bytes_received,
+        "total_size": session.total_size,
+        "status": session.status
+    }
+
+def get_owned_upload(upload_id, current_user):
+    """Return (session, error_response) for an upload owned by the current user."""
+    use_shard(upload_id)
+    session = db.session.get(UploadSession, upload_id)
+    if not session:
+        return None, (jsonify({"error": "Upload not found"}), 404)
+    if session.uploaded_by != current_user['email']:
+        return None, (jsonify({"error": "Unauthorized"}), 403)
+    if session.status != 'open':
+        return None, (jsonify({"error": f"Upload is already {session.status}"}), 409)
+    return session, None
+
+@storage_bp.route('/uploads', methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def initiate_upload():
+    """Start a resumable chunked upload and return its upload_id."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    data = request.get_json(silent=True) or {}
+    original_name = data.get('filename', '')
+    patient_email = data.get('patientEmail', current_user['email'])
+    total_size = data.get('size')
 
-    identity_str = get_jwt_identity()  # String like "email:role"
-    current_user = parse_identity(identity_str)
-    print(f"storage_routes.py - list_files: Current user: {current_user}")
+    if not original_name:
+        return jsonify({"error": "No file selected"}), 400
+    if not allowed_file(original_name):
+        return jsonify({"error": "File type not allowed. Allowed: pdf, docx, txt"}), 400
+    if total_size is not None and (not isinstance(total_size, int) or total_size < 0):
+        return jsonify({"error": "size must be a non-negative integer"}), 400
+
+    filename = secure_filename(original_name)
+    now = datetime.utcnow()
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        patient_id=patient_email,
+        uploaded_by=current_user['email'],
+        filename=f"{patient_email}_{filename}",
+        next_chunk=0,
+        bytes_received=0,
+        total_size=total_size,
+        status='open',
+        created_at=now,
+        updated_at=now
+    )
+
+    try:
+        chunked_upload.create_partial(UPLOAD_FOLDER, session.id)
+        db.session.add(session)
+        db.session.commit()
+        state = upload_session_state(session)
+        state["chunk_size"] = UPLOAD_CHUNK_SIZE
+        return jsonify(state), 201
+    except Exception as e:
+        db.session.rollback()
+        chunked_upload.discard(UPLOAD_FOLDER, session.id)
+        return jsonify({"error": f"Failed to start upload: {str(e)}"}), 500
+
+@storage_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def upload_status(upload_id):
+    """Report how far an upload got, so an interrupted client knows which chunk to resend."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    use_shard(upload_id)
+    session = db.session.get(UploadSession, upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    if session.uploaded_by != current_user['email']:
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(upload_session_state(session)), 200
+
+@storage_bp.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def upload_chunk(upload_id, index):
+    """Append chunk `index` (raw request body) to an open upload."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    if request.content_length is not None and request.content_length > MAX_CHUNK_SIZE:
+        return jsonify({"error": f"Chunk too large. Maximum: {MAX_CHUNK_SIZE} bytes"}), 413
+
+    with chunked_upload.upload_lock(UPLOAD_FOLDER, upload_id):
+        session, error = get_owned_upload(upload_id, current_user)
+        if error:
+            return error
+
+        # A resend of an acknowledged chunk is a no-op; a gap is rejected.
+        if index < session.next_chunk:
+            return jsonify(upload_session_state(session)), 200
+        if index > session.next_chunk:
+            return jsonify({
+                "error": f"Expected chunk {session.next_chunk}",
+                "next_chunk": session.next_chunk
+            }), 409
+
+        try:
+            written = chunked_upload.append_chunk(
+                UPLOAD_FOLDER, session.id, session.bytes_received, request.stream, MAX_CHUNK_SIZE
+            )
+            if written == 0:
+                return jsonify({"error": "Empty chunk"}), 400
+            received = session.bytes_received + written
+            if session.total_size is not None and received > session.total_size:
+                return jsonify({"error": "Upload exceeds the announced size"}), 400
+
+            session.bytes_received = received
+            session.next_chunk = index + 1
+            session.updated_at = datetime.utcnow()
+            db.session.commit()
+            return jsonify(upload_session_state(session)), 200
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 413
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Chunk upload failed: {str(e)}"}), 500
+
+@storage_bp.route('/uploads/<upload_id>/commit', methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def commit_upload(upload_id):
+    """Move a completed upload into storage and save its Record."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    data = request.get_json(silent=True) or {}
+    expected_hash = data.get('sha256')
+
+    with chunked_upload.upload_lock(UPLOAD_FOLDER, upload_id):
+        session, error = get_owned_upload(upload_id, current_user)
+        if error:
+            return error
+        if session.total_size is not None and session.bytes_received != session.total_size:
+            return jsonify({
+                "error": f"Upload incomplete: {session.bytes_received} of {session.total_size} bytes received",
+                "next_chunk": session.next_chunk
+            }), 409
+
+        # The record and its search entry go to the patient's shard (the upload stays on its own).
+        use_shard(session.patient_id)
+        try:
+            if expected_hash:
+                # Verify before the rename so a corrupt upload never replaces a good file.
+                actual_hash = chunked_upload.current_digest(UPLOAD_FOLDER, session.id, session.bytes_received)
+                if actual_hash != expected_hash.lower():
+                    return jsonify({"error": "Checksum mismatch", "sha256": actual_hash}), 422
+
+            tmp_path, content_hash = chunked_upload.finalize(UPLOAD_FOLDER, session.id, session.bytes_received)
+            text_path = extract_text(session.filename, content_hash, tmp_path)
+            record = add_record(session.patient_id, session.filename, content_hash, session.bytes_received,
+                                session.uploaded_by)
+            session.status = 'committed'
+            session.updated_at = datetime.utcnow()
+            db.session.flush()
+            search_index.index_record(db.session, record, text_path)
+            chain_outbox.enqueue(db.session, current_user['email'], session.filename, 'upload',
+                                 patient_id=session.patient_id)
+            blob_store.place(get_storage(), tmp_path, content_hash)
+            db.session.commit()
+            return jsonify({
+                "message": "File uploaded successfully",
+                "record_id": record.id,
+                "filename": session.filename,
+                "patient_id": session.patient_id,
+                "size": session.bytes_received,
+                "sha256": content_hash
+            }), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Upload failed: {str(e)}"}), 500
+
+@storage_bp.route('/uploads/<upload_id>', methods=['DELETE', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def abort_upload(upload_id):
+    """Abandon an open upload and delete its partial data."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    with chunked_upload.upload_lock(UPLOAD_FOLDER, upload_id):
+        session, error = get_owned_upload(upload_id, current_user)
+        if error:
+            return error
+        try:
+            chunked_upload.discard(UPLOAD_FOLDER, session.id)
+            db.session.delete(session)
+            db.session.commit()
+            return jsonify({"message": "Upload aborted", "upload_id": upload_id}), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Failed to abort upload: {str(e)}"}), 500
+
+@storage_bp.route('/list', methods=['GET', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+@read_only
+def list_files():
+    """List files for a patient (by email) from DB metadata, optionally filtered."""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+    
     patient_email = request.args.get('patient', current_user['email'])
+    use_shard(patient_email)
+    try:
+        after, limit = pagination.page_args()
+        # ?from=&to=&type=&prefix=&uploader= (repeat them with ?cursor= for later pages)
+        filters = record_filters.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        records = Record.query.filter_by(patient_id=patient_email).all()
+        records, next_cursor = pagination.keyset_page(
+            record_filters.apply_filters(
+                Record.query.filter_by(patient_id=patient_email, deleted_at=None), patient_email, filters
+            ),
+            Record.uploaded_at, Record.id, after, limit
+        )
         if current_user['role'] == 'doctor' and patient_email != current_user['email']:
-            # log_access(current_user['email'], patient_email, 'list')  # SKIPPED for deployment
-            print(f"storage_routes.py - SKIPPED blockchain log for list: {current_user['email']} on {patient_email}")
-        return jsonify({
+            access_log_writer.log_chain(current_user['email'], patient_email, 'list', patient_id=patient_email)
+        return pagination.with_next_cursor(jsonify({
             "files": [
                 {
                     "id": r.id,
                     "patient_id": r.patient_id,
                     "filename": r.filename,
-                    "upload_time": r.uploaded_at.isoformat()
+                    "upload_time": r.uploaded_at.isoformat(),
+                    "content_type": r.content_type,
+                    "size": r.size,
+                    "uploaded_by": r.uploaded_by,
+                    "sha256": r.content_hash
                 } for r in records
-            ]
-        }), 200
+            ],
+            "next_cursor": next_cursor
+        }), next_cursor), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch records: {str(e)}"}), 500
 
+@storage_bp.route('/search', methods=['GET', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def search_records():
+    """Full-text search over a patient's records and medical forms, best matches first."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    # Patients search their own documents; doctors one patient's, or everyone's without ?patient=.
+    patient_email = request.args.get('patient', current_user['email'] if current_user['role'] != 'doctor' else None)
+    if current_user['role'] != 'doctor' and patient_email != current_user['email']:
+        return jsonify({"error": "Unauthorized"}), 403
+    kind = request.args.get('type')
+    if kind is not None and kind not in search_index.KINDS:
+        return jsonify({"error": "type must be 'record' or 'form'"}), 400
+    limit = request.args.get('limit', search_index.DEFAULT_RESULTS, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit <= 0 or offset < 0:
+        return jsonify({"error": "offset must be >= 0 and limit > 0"}), 400
+    if not search_index.available(db.session):
+        return jsonify({"error": "Search requires the SQLite FTS5 index"}), 501
+
+    try:
+        limit = min(limit, search_index.MAX_RESULTS)
+        if patient_email:
+            use_shard(patient_email)
+            results = search_index.search(db.session, request.args.get('q', ''), patient_id=patient_email, kind=kind,
+                                          limit=limit, offset=offset)
+        else:
+            results = search_index.search_all(request.args.get('q', ''), kind=kind, limit=limit, offset=offset)
+        if current_user['role'] == 'doctor' and patient_email and patient_email != current_user['email']:
+            access_log_writer.log_chain(current_user['email'], patient_email, 'search', patient_id=patient_email)
+        return jsonify({"results": results, "patient_id": patient_email, "offset": offset}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Search failed: {str(e)}"}), 500
+
 @storage_bp.route('/download/<path:filename>', methods=['GET'])
 @jwt_required()
 def download_file(filename):
-    init_storage()
-
-    identity_str = get_jwt_identity()  # String like "email:role"
-    current_user = parse_identity(identity_str)
+    """Download file from storage + log access."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+    
     try:
-        record = Record.query.filter_by(filename=filename).first()
+        record = find_record(filename)
         if not record:
             return jsonify({"error": "Record not found"}), 404
-        log = AccessLog(record_id=record.id, accessed_by=current_user['email'], access_time=datetime.utcnow())
-        db.session.add(log)
-        db.session.commit()
-        if current_user['role'] == 'doctor' or not filename.startswith(current_user['email'] + '/'):
-            # log_access(current_user['email'], filename, 'download')  # SKIPPED for deployment
-            print(f"storage_routes.py - SKIPPED blockchain log for download: {current_user['email']} on {filename}")
-        blob_client = container_client.get_blob_client(filename)
-        blob_data = blob_client.download_blob().readall()
-        return send_file(
-            BytesIO(blob_data),
-            download_name=filename.split('/')[-1],
-            as_attachment=True
-        )
+        # Queued for the batched writer (with the blockchain entry): the response does not wait for a commit.
+        logged = current_user['role'] == 'doctor' or not filename.startswith(current_user['email'] + '_')
+        access_log_writer.record_access(record, current_user['email'], action='download' if logged else None)
+        
+        storage = get_storage()
+        key = blob_store.record_key(record)
+        # A Range request is served from a local copy only if one exists: filling a
+        # cache for it would download the whole blob to answer a few bytes.
+        file_path = storage.local_path(key, fill=request.range is None)
+        if file_path:
+            # send_file answers Range / If-Range / If-None-Match / If-Modified-Since itself;
+            # the stored content hash gives an ETag that survives re-saves of identical bytes.
+            try:
+                return send_file(
+                    os.path.abspath(file_path),
+                    as_attachment=True,
+                    download_name=filename,
+                    conditional=True,
+                    etag=record.content_hash or True
+                )
+            except FileNotFoundError:
+                pass  # a cached copy evicted by another worker since local_path(): stream it instead
+
+        info = storage.stat(key)
+        etag = record.content_hash or info.etag
+        not_modified = not_modified_response(etag, info.last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        span = requested_range(info.size, etag, info.last_modified)
+        if span is None:
+            response = Response(storage.get(key), mimetype=mimetype, direct_passthrough=True)
+            response.content_length = info.size
+        else:
+            # Only the requested bytes are read from the backend.
+            start, stop = span
+            response = Response(storage.get(key, start, stop - start), status=206,
+                                mimetype=mimetype, direct_passthrough=True)
+            response.content_length = stop - start
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{info.size}"
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        set_validators(response, etag, info.last_modified)
+        return response
+    except BlobNotFound:
+        return jsonify({"error": "File not found in storage"}), 404
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
     except Exception as e:
         return jsonify({"error": f"Download failed: {str(e)}"}), 500
 
 @storage_bp.route('/preview/<path:filename>', methods=['GET'])
 @jwt_required()
 def preview_file(filename):
-    init_storage()
+    """Preview a page of the file's extracted text + log access."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
 
-    identity_str = get_jwt_identity()  # String like "email:role"
-    current_user = parse_identity(identity_str)
     try:
-        record = Record.query.filter_by(filename=filename).first()
+        offset, limit = preview_window()
+        lines = line_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        record = find_record(filename)
         if not record:
             return jsonify({"error": "Record not found"}), 404
-        log = AccessLog(record_id=record.id, accessed_by=current_user['email'], access_time=datetime.utcnow())
-        db.session.add(log)
-        db.session.commit()
-        if current_user['role'] == 'doctor' or not filename.startswith(current_user['email'] + '/'):
-            # log_access(current_user['email'], filename, 'preview')  # SKIPPED for deployment
-            print(f"storage_routes.py - SKIPPED blockchain log for preview: {current_user['email']} on {filename}")
-        blob_client = container_client.get_blob_client(filename)
-        blob_data = blob_client.download_blob().readall().decode('utf-8')
-        return jsonify({"content": blob_data}), 200
+        # Queued for the batched writer (with the blockchain entry): the response does not wait for a commit.
+        logged = current_user['role'] == 'doctor' or not filename.startswith(current_user['email'] + '_')
+        access_log_writer.record_access(record, current_user['email'], action='preview' if logged else None)
+        
+        storage = get_storage()
+        key = blob_store.record_key(record)
+        if not storage.exists(key):
+            return jsonify({"error": "File not found in storage"}), 404
+
+        if not record.content_hash:
+            # Records from before content hashing: hash once so the text cache can key on it.
+            with local_copy(storage, key) as file_path:
+                record.content_hash = chunked_upload.file_digest(file_path)
+            db.session.commit()
+
+        # Extraction runs once per content hash; later pages and previews read the cache
+        # only, so remote backends are not read again either.
+        text_path = derived_text_cache.get(record.content_hash)
+        if not text_path:
+            with local_copy(storage, key) as file_path:
+                text_path = derived_text_cache.get_or_extract(
+                    record.content_hash, record.filename, lambda: file_path
+                )
+            # Records uploaded before the search index only had their filename indexed.
+            search_index.index_record(db.session, record, text_path)
+            db.session.commit()
+
+        def read_preview(text_path):
+            if lines:
+                # The sidecar line index turns a line number into a byte offset without scanning.
+                start_line, count = lines
+                index_path = derived_text_cache.line_index(text_path)
+                content, next_line, total_lines = read_lines(text_path, index_path, start_line, count)
+                return jsonify({
+                    "content": content,
+                    "start_line": start_line,
+                    "next_line": next_line,
+                    "total_lines": total_lines
+                }), 200
+            content, next_offset, total_size = read_page(text_path, offset, limit)
+            return jsonify({
+                "content": content,
+                "offset": offset,
+                "next_offset": next_offset,
+                "total_size": total_size
+            }), 200
+
+        try:
+            return read_preview(text_path)
+        except FileNotFoundError:
+            # Evicted by another worker since the lookup: extract the text again.
+            with local_copy(storage, key) as file_path:
+                text_path = derived_text_cache.get_or_extract(
+                    record.content_hash, record.filename, lambda: file_path
+                )
+            return read_preview(text_path)
+    except ExtractionError as e:
+        return jsonify({"error": f"Preview not available: {str(e)}"}), 415
     except Exception as e:
         return jsonify({"error": f"Preview failed: {str(e)}"}), 500
 
+@storage_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_patient():
+    """Stream a ZIP of all of a patient's record files plus their forms and prescriptions."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    patient_email = request.args.get('patient', current_user['email'])
+    if current_user['role'] != 'doctor' and patient_email != current_user['email']:
+        return jsonify({"error": "Unauthorized"}), 403
+    use_shard(patient_email)
+
+    try:
+        # Everything that needs the DB happens here; the generator only reads blobs.
+        storage = get_storage()
+        records = Record.query.filter_by(patient_id=patient_email, deleted_at=None).order_by(Record.id).all()
+        forms = MedicalForm.query.filter_by(patient_email=patient_email).order_by(MedicalForm.submitted_at).all()
+        prescriptions = Prescription.query.filter_by(patient_email=patient_email).order_by(Prescription.created_at).all()
+
+        entries = []
+        now = datetime.utcnow()
+        for r in records:
+            key = blob_store.record_key(r)
+            if not storage.exists(key):
+                continue
+            entries.append(zip_export.ExportEntry(
+                f"records/{r.id}_{r.filename.split('/')[-1]}",
+                fetch=lambda key=key: fetch_blob(storage, key),
+                modified=r.uploaded_at
+            ))
+            access_log_writer.record_access(r, current_user['email'], access_time=now)
+        entries.append(zip_export.medical_forms_entry(forms))
+        entries.append(zip_export.prescriptions_entry(prescriptions))
+        if current_user['role'] == 'doctor' or patient_email != current_user['email']:
+            access_log_writer.log_chain(current_user['email'], patient_email, 'export', patient_id=patient_email)
+
+        response = Response(zip_export.stream_zip(entries), mimetype='application/zip')
+        response.headers.set('Content-Disposition', 'attachment', filename=f"{patient_email}_records.zip")
+        return response
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Export failed: {str(e)}"}), 500
+
 @storage_bp.route('/access-logs/<patient_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def access_logs(patient_id):
-    init_storage()
+    """Get access logs for a patient's records."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+    
+    try:
+        after, limit = pagination.page_args()
+    except pagination.CursorError as e:
+        return jsonify({"error": str(e)}), 400
 
-    identity_str = get_jwt_identity()  # String like "email:role"
-    current_user = parse_identity(identity_str)
+    use_shard(patient_id)
     try:
-        records = Record.query.filter_by(patient_id=patient_id).all()
-        if not records:
+        if not Record.query.filter_by(patient_id=patient_id).first():
             return jsonify({"message": "No records found for this patient"}), 404
-        logs = AccessLog.query.filter(AccessLog.record_id.in_([r.id for r in records])).all()
+        logs, next_cursor = pagination.keyset_page(
+            AccessLog.query.filter_by(patient_id=patient_id),
+            AccessLog.access_time, AccessLog.id, after, limit
+        )
         if current_user['role'] == 'doctor' and patient_id != current_user['email']:
-            # log_access(current_user['email'], patient_id, 'access_logs')  # SKIPPED for deployment
-            print(f"storage_routes.py - SKIPPED blockchain log for access_logs: {current_user['email']} on {patient_id}")
-        return jsonify([
+            access_log_writer.log_chain(current_user['email'], patient_id, 'access_logs', patient_id=patient_id)
+        # The body stays a bare list; the next page's cursor is in X-Next-Cursor.
+        return pagination.with_next_cursor(jsonify([
             {
                 "record_id": log.record_id,
                 "accessed_by": log.accessed_by,
                 "access_time": log.access_time.isoformat()
             } for log in logs
-        ]), 200
+        ]), next_cursor), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch access logs: {str(e)}"}), 500
 
+@storage_bp.route('/access-analytics', methods=['GET'])
+@jwt_required()
+@read_only
+def access_analytics_summary():
+    """Access counts, top accessors and a time series over a range, read from the rollups."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    patient_id = request.args.get('patient')
+    accessed_by = request.args.get('accessor')
+    if current_user['role'] != 'doctor':
+        # Patients see who accessed their own records, nothing else.
+        if patient_id not in (None, current_user['email']) or accessed_by:
+            return jsonify({"error": "Unauthorized"}), 403
+        patient_id = current_user['email']
+
+    try:
+        start, end, granularity, top = access_analytics.parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if patient_id is not None:
+            use_shard(patient_id)
+            summary = access_analytics.summarize(start, end, granularity, patient_id=patient_id,
+                                                 accessed_by=accessed_by, top=top)
+        else:
+            summary = access_analytics.summarize_all(start, end, granularity, accessed_by=accessed_by, top=top)
+        summary.update({
+            "patient_id": patient_id,
+            "accessor": accessed_by,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "granularity": granularity
+        })
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch access analytics: {str(e)}"}), 500
+
 @storage_bp.route('/records', methods=['GET'])
+@jwt_required()
+@read_only
 def list_all_records():
+    """List all records (for testing purposes - requires authentication)."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+    
+    try:
+        after, limit = pagination.page_args()
+    except pagination.CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Every patient's records: one page from each shard, merged.
+        files, next_cursor = pagination.merge_pages(fan_out(lambda: pagination.keyset_items(
+            Record.query.filter_by(deleted_at=None), Record.uploaded_at, Record.id, after, limit,
+            lambda r: {
+                "id": r.id,
+                "patient_id": r.patient_id,
+                "filename": r.filename,
+                "upload_time": r.uploaded_at.isoformat()
+            }
+        )), limit)
+        return pagination.with_next_cursor(jsonify({
+            "files": files,
+            "next_cursor": next_cursor
+        }), next_cursor), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch records: {str(e)}"}), 500
+
+@storage_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    """Hit/miss counters of the blob read cache (per worker process)."""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    if current_user['role'] != 'doctor':
+        return jsonify({"error": "Unauthorized"}), 403
+    storage = get_storage()
+    stats = getattr(storage, 'stats', None)
+    return jsonify({
+        "backend": storage.name,
+        "pid": os.getpid(),
+        "cache": stats.snapshot() if stats else None
+    }), 200
+
+@storage_bp.route('/records/<int:record_id>', methods=['DELETE', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def delete_record(record_id):
+    """Delete a record; its blob is removed once no other record references it."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    shard = locate(Record, id=record_id)
+    if shard is None:
+        return jsonify({"error": "Record not found"}), 404
+    use_shard(shard=shard)
+    record = db.session.get(Record, record_id)
+    if not record or record.deleted_at is not None:
+        return jsonify({"error": "Record not found"}), 404
+    if current_user['role'] != 'doctor' and record.patient_id != current_user['email']:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    storage = get_storage()
+    digest = record.content_hash if record.blob_url.startswith(blob_store.BLOB_URL_PREFIX) else None
+    trash_key = None
+    try:
+        record.deleted_at = datetime.utcnow()
+        search_index.remove_record(db.session, record.id)
+        if digest:
+            trash_key = blob_store.release(storage, digest)
+        chain_outbox.enqueue(db.session, current_user['email'], record.filename, 'delete', patient_id=record.patient_id)
+        db.session.commit()
+        blob_store.purge(storage, trash_key)
+        return jsonify({"message": "Record deleted", "record_id": record_id}), 200
+    except Exception as e:
+        db.session.rollback()
+        blob_store.restore(storage, trash_key, digest)
+        return jsonify({"error": f"Delete failed: {str(e)}"}), 500
+
+def blob_visible_to(digest, current_user):
+    """
+    Patients may only learn about (and link) blobs already referenced by
+    their own records; otherwise a known hash would grant access to another
+    patient's file. Doctors can already read every record.
+    """
+    if current_user['role'] == 'doctor':
+        return True
+    with shard_scope(current_user['email']):
+        return Record.query.filter_by(
+            content_hash=digest, patient_id=current_user['email'], deleted_at=None
+        ).first() is not None
+
+@storage_bp.route('/blobs/<digest>', methods=['GET', 'HEAD'])
+@jwt_required()
+def blob_exists(digest):
+    """Pre-flight check: does the server already hold bytes with this SHA-256?"""
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    digest = digest.lower()
+    if not blob_store.is_digest(digest):
+        return jsonify({"error": "Digest must be a hex SHA-256"}), 400
+    blob = blob_store.lookup(digest)
+    if not blob or not blob_visible_to(digest, current_user):
+        return jsonify({"exists": False, "sha256": digest}), 404
+    return jsonify({"exists": True, "sha256": digest, "size": blob.size}), 200
+
+@storage_bp.route('/blobs/<digest>/records', methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def link_blob(digest):
+    """Create a record for bytes the server already holds, without re-sending them."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    identity = get_jwt_identity()
+    email, role = identity.split(':')
+    current_user = {'email': email, 'role': role}
+
+    data = request.get_json(silent=True) or {}
+    original_name = data.get('filename', '')
+    patient_email = data.get('patientEmail', current_user['email'])
+
+    digest = digest.lower()
+    if not blob_store.is_digest(digest):
+        return jsonify({"error": "Digest must be a hex SHA-256"}), 400
+    if not original_name:
+        return jsonify({"error": "No file selected"}), 400
+    if not allowed_file(original_name):
+        return jsonify({"error": "File type not allowed. Allowed: pdf, docx, txt"}), 400
+
+    blob = blob_store.lookup(digest)
+    if not blob or not blob_visible_to(digest, current_user):
+        return jsonify({"error": "Blob not found, upload the file instead"}), 404
+
+    local_filename = f"{patient_email}_{secure_filename(original_name)}"
+    use_shard(patient_email)
     try:
-        records = Record.query.all()
+        record = add_record(patient_email, local_filename, digest, blob.size, current_user['email'])
+        db.session.flush()
+        # Same bytes as an existing record, so their text is normally cached already.
+        search_index.index_record(db.session, record, derived_text_cache.get(digest))
+        chain_outbox.enqueue(db.session, current_user['email'], local_filename, 'upload', patient_id=patient_email)
+        db.session.commit()
         return jsonify({
-            "files": [
-                {
-                    "id": r.id,
-                    "patient_id": r.patient_id,
-                    "filename": r.filename,
-                    "upload_time": r.uploaded_at.isoformat()
-                } for r in records
-            ]
+            "message": "File uploaded successfully",
+            "record_id": record.id,
+            "filename": local_filename,
+            "patient_id": patient_email,
+            "sha256": digest
         }), 200
     except Exception as e:
-        return jsonify({"error": f"Failed to fetch records: {str(e)}"}), 500
\ No newline at end of file
+        db.session.rollback()
+        return jsonify({"error": f"Upload failed: {str(e)}"}), 500
@@ -0,0 +1,131 @@
+# app/services/access_analytics.py
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..database import fan_out, get_shards
+from ..models import AccessRollup
+
+# Hourly buckets answer "today" / "this week"; daily buckets answer months and years.
+GRANULARITIES = ('hour', 'day')
+MAX_HOUR_RANGE = timedelta(days=31)
+DEFAULT_RANGE = timedelta(days=30)
+DEFAULT_TOP = 10
+MAX_TOP = 100
+SHARD_TOP_FACTOR = 4  # each shard reports this many times `top` accessors when merging
+
+
+def bucket_start(moment, granularity):
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_counts(events):
+    """Aggregate access events into {(granularity, bucket, record_id, patient_id, accessed_by): count}."""
+    counts = Counter()
+    for event in events:
+        for granularity in GRANULARITIES:
+            counts[(
+                granularity,
+                bucket_start(event['access_time'], granularity),
+                event['record_id'],
+                event.get('patient_id'),
+                event['accessed_by'],
+            )] += 1
+    return counts
+
+
+def apply_events(session, events):
+    """
+    Add a batch of access events to the rollups inside the caller's
+    transaction. One UPDATE (or INSERT) per distinct bucket in the batch,
+    not per event.
+    """
+    for (granularity, start, record_id, patient_id, accessed_by), n in rollup_counts(events).items():
+        key = dict(granularity=granularity, bucket_start=start, record_id=record_id, accessed_by=accessed_by)
+        increment = {AccessRollup.count: AccessRollup.count + n}
+        if session.query(AccessRollup).filter_by(**key).update(increment, synchronize_session=False):
+            continue
+        try:
+            with session.begin_nested():
+                session.add(AccessRollup(patient_id=patient_id, count=n, **key))
+        except IntegrityError:
+            # Another worker's flush created the bucket first.
+            session.query(AccessRollup).filter_by(**key).update(increment, synchronize_session=False)
+
+
+def summarize(start, end, granularity, patient_id=None, accessed_by=None, top=DEFAULT_TOP):
+    """
+    Totals over [start, end) from the rollup table: overall count, top-N
+    accessors and a per-bucket series. Buckets partly outside the range are
+    included whole, so callers should align ranges to the granularity.
+    """
+    base = AccessRollup.query.filter(
+        AccessRollup.granularity == granularity,
+        AccessRollup.bucket_start >= bucket_start(start, granularity),
+        AccessRollup.bucket_start < end
+    )
+    if patient_id is not None:
+        base = base.filter(AccessRollup.patient_id == patient_id)
+    if accessed_by is not None:
+        base = base.filter(AccessRollup.accessed_by == accessed_by)
+
+    total = func.sum(AccessRollup.count)
+    accessors = (
+        base.with_entities(AccessRollup.accessed_by, total.label('n'))
+        .group_by(AccessRollup.accessed_by)
+        .order_by(total.desc(), AccessRollup.accessed_by)
+        .limit(top)
+        .all()
+    )
+    series = (
+        base.with_entities(AccessRollup.bucket_start, total.label('n'))
+        .group_by(AccessRollup.bucket_start)
+        .order_by(AccessRollup.bucket_start)
+        .all()
+    )
+    return {
+        "total": sum(n for _, n in series),
+        "top_accessors": [{"accessed_by": who, "count": n} for who, n in accessors],
+        "series": [{"bucket": bucket.isoformat(), "count": n} for bucket, n in series],
+    }
+
+
+def summarize_all(start, end, granularity, accessed_by=None, top=DEFAULT_TOP):
+    """
+    summarize() over every patient. On a sharded database each shard is
+    summarized in parallel and the results added up; the top accessors are
+    exact unless one misses every shard's top SHARD_TOP_FACTOR * top.
+    """
+    if get_shards() is None:
+        return summarize(start, end, granularity, accessed_by=accessed_by, top=top)
+    parts = fan_out(lambda: summarize(start, end, granularity, accessed_by=accessed_by, top=top * SHARD_TOP_FACTOR))
+    accessors, series = Counter(), Counter()
+    for part in parts:
+        accessors.update({a['accessed_by']: a['count'] for a in part['top_accessors']})
+        series.update({b['bucket']: b['count'] for b in part['series']})
+    return {
+        "total": sum(part['total'] for part in parts),
+        "top_accessors": [{"accessed_by": who, "count": n}
+                          for who, n in sorted(accessors.items(), key=lambda item: (-item[1], item[0]))[:top]],
+        "series": [{"bucket": bucket, "count": n} for bucket, n in sorted(series.items())],
+    }
+
+
+def parse_range(args, now=None):
+    """Read ?start=&end=&granularity=&top= (ISO dates / datetimes). Raises ValueError."""
+    now = now or datetime.utcnow()
+    end = datetime.fromisoformat(args['end']) if args.get('end') else now
+    start = datetime.fromisoformat(args['start']) if args.get('start') else end - DEFAULT_RANGE
+    if start >= end:
+        raise ValueError("start must be before end")
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError("granularity must be 'hour' or 'day'")
+    if granularity == 'hour' and end - start > MAX_HOUR_RANGE:
+        raise ValueError("hourly analytics are limited to 31 days; use granularity=day")
+    top = int(args.get('top', DEFAULT_TOP))
+    if top <= 0:
+        raise ValueError("top must be > 0")
+    return start, end, granularity, min(top, MAX_TOP)
@@ -0,0 +1,310 @@
+# app/services/access_log_writer.py
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from ..database import assign_ids, group_by_shard, shard_scope
+from ..models import db, AccessLog
+from . import access_analytics, chain_outbox
+
+try:
+    import fcntl
+except ImportError:  # Windows: orphaned journals are then only replayed by the process that wrote them
+    fcntl = None
+
+# Access events are queued in-process and bulk-inserted by a background
+# flusher, so a download or preview no longer waits for a commit.
+#
+#   sync          insert + commit inside the request (the old behaviour)
+#   at_most_once  queue only; events still queued when the process dies are
+#                 lost, and so are events arriving while the queue is full
+#   durable       also append each event to a local journal segment before
+#                 returning; segments are deleted once their events are
+#                 committed and replayed on startup otherwise (at-least-once).
+#                 While the queue is full, requests insert their own event
+#                 inline as in sync mode instead of losing it
+#
+# An event may also carry a blockchain log entry ('chain'), inserted into
+# the chain outbox in the same transaction as its AccessLog row; events
+# with no record_id are chain entries only (a doctor listing a patient's
+# records).
+ACCESS_LOG_MODE = os.getenv('ACCESS_LOG_MODE', 'durable')
+ACCESS_LOG_BATCH_SIZE = int(os.getenv('ACCESS_LOG_BATCH_SIZE', 500))
+ACCESS_LOG_FLUSH_INTERVAL = float(os.getenv('ACCESS_LOG_FLUSH_INTERVAL', 0.5))
+ACCESS_LOG_MAX_QUEUE = int(os.getenv('ACCESS_LOG_MAX_QUEUE', 100000))
+ACCESS_LOG_JOURNAL_DIR = os.getenv('ACCESS_LOG_JOURNAL_DIR', os.path.join('uploads', '.access-log'))
+
+MODES = ('sync', 'at_most_once', 'durable')
+ACCESS_COLUMNS = ('record_id', 'accessed_by', 'patient_id', 'access_time')
+SEGMENT_SUFFIX = '.jsonl'
+
+
+class _Segment:
+    """An append-only journal file, flock'ed while its writer is alive."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex}{SEGMENT_SUFFIX}")
+        self.handle = open(self.path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, event):
+        self.handle.write(json.dumps(event) + '\n')
+        self.handle.flush()  # survives a crash of the process, not of the machine
+
+    def close(self):
+        self.handle.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+
+class AccessLogWriter:
+    """
+    Batches AccessLog inserts. record() only enqueues (and, in durable mode,
+    journals) the event; a daemon thread inserts queued events in batches
+    of `batch_size`, at least every `flush_interval` seconds. flush() forces
+    a write and close() drains the queue; close() is registered with atexit.
+    """
+
+    def __init__(self, app, mode=ACCESS_LOG_MODE, batch_size=ACCESS_LOG_BATCH_SIZE,
+                 flush_interval=ACCESS_LOG_FLUSH_INTERVAL, max_queue=ACCESS_LOG_MAX_QUEUE,
+                 journal_dir=ACCESS_LOG_JOURNAL_DIR):
+        if mode not in MODES:
+            raise ValueError(f"Unknown ACCESS_LOG_MODE '{mode}'. Expected one of: {', '.join(MODES)}")
+        self.app = app
+        self.mode = mode
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.journal_dir = journal_dir
+
+        self._events = []
+        self._segment = None
+        self._sealed = []  # (segment, events) taken from the queue but not yet committed
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'inline': 0, 'batches': 0, 'failures': 0, 'replayed': 0}
+
+        if mode == 'durable':
+            os.makedirs(journal_dir, exist_ok=True)
+            self._segment = _Segment(journal_dir)
+            try:
+                self.replay_orphans()
+            except Exception as e:
+                print(f"access_log_writer.py - journal replay failed, will retry on next start: {e}")
+        if mode != 'sync':
+            self._thread = threading.Thread(target=self._run, name='access-log-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # Producer side
+
+    def record(self, record_id, accessed_by, patient_id=None, access_time=None, chain=None):
+        event = {
+            'record_id': record_id,
+            'accessed_by': accessed_by,
+            'patient_id': patient_id,
+            'access_time': access_time or datetime.utcnow(),
+        }
+        if chain is not None:
+            event['chain'] = chain  # {'user_email', 'record_name', 'action'}
+        if self.mode == 'sync' or self._closed:
+            self._insert([event])
+            return
+        with self._lock:
+            full = len(self._events) >= self.max_queue
+            if full and self.mode == 'at_most_once':
+                # The database is not keeping up; shed load instead of growing without bound.
+                self.stats['dropped'] += 1
+                return
+            if not full:
+                if self._segment is not None:
+                    self._segment.append(_to_json(event))
+                self._events.append(event)
+                self.stats['queued'] += 1
+            if len(self._events) >= self.batch_size:
+                self._wakeup.notify()
+        if full:
+            # Durable events are never shed: the request waits for its own insert, which also
+            # slows producers down to what the database can take. A failure reaches the caller.
+            self.stats['inline'] += 1
+            self._insert([event])
+
+    # Consumer side
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and len(self._events) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _take(self):
+        """Move the queued events (and their journal segment) aside for writing."""
+        with self._lock:
+            if not self._events:
+                return
+            events, self._events = self._events, []
+            segment = self._segment
+            if segment is not None:
+                self._segment = _Segment(self.journal_dir)
+            self._sealed.append((segment, events))
+
+    def flush(self):
+        """Write everything queued so far. Failed batches stay queued for the next flush."""
+        with self._flush_lock:
+            self._take()
+            while self._sealed:
+                segment, events = self._sealed[0]
+                try:
+                    while events:
+                        # Committed batches are trimmed off, so a retry never writes them twice.
+                        self._insert(events[:self.batch_size])
+                        del events[:self.batch_size]
+                        self.stats['batches'] += 1
+                except Exception as e:
+                    self.stats['failures'] += 1
+                    print(f"access_log_writer.py - flush failed, will retry: {e}")
+                    return False
+                self._sealed.pop(0)
+                if segment is not None:
+                    segment.remove()
+            return True
+
+    def _insert(self, events):
+        with self.app.app_context():
+            try:
+                # A Core insert (not an ORM bulk insert), so it can run on each patient's shard.
+                for shard, group in group_by_shard(events, 'patient_id'):
+                    with shard_scope(shard=shard):
+                        accesses = [event for event in group if event['record_id'] is not None]
+                        ids = _insert_access_logs(db.session, accesses, linked=any('chain' in e for e in accesses))
+                        log_ids = {id(event): log_id for event, log_id in zip(accesses, ids)}
+                        chain_outbox.insert_entries(db.session, [
+                            chain_outbox.entry(patient_id=event['patient_id'], access_log_id=log_ids.get(id(event)),
+                                               now=event['access_time'], **event['chain'])
+                            for event in group if 'chain' in event
+                        ])
+                        # Rollups move in the same transaction, so they never disagree with the raw rows.
+                        access_analytics.apply_events(db.session, accesses)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        self.stats['written'] += len(events)
+
+    def close(self):
+        """Stop the flusher and write whatever is still queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.flush_interval * 4, 5))
+        self.flush()
+        if self._segment is not None and not self._sealed:
+            self._segment.remove()
+            self._segment = None
+
+    # Recovery
+
+    def replay_orphans(self):
+        """Insert the events of journal segments left behind by processes that died before flushing."""
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, f"*{SEGMENT_SUFFIX}"))):
+            if self._segment is not None and path == self._segment.path:
+                continue
+            try:
+                handle = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # another worker replayed it
+            with handle:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # its writer is still alive
+                elif not path.startswith(os.path.join(self.journal_dir, f"{os.getpid()}-")):
+                    continue
+                events = [_from_json(line) for line in handle if line.strip()]
+                for start in range(0, len(events), self.batch_size):
+                    self._insert(events[start:start + self.batch_size])
+                os.remove(path)
+                self.stats['replayed'] += len(events)
+
+
+def _insert_access_logs(session, events, linked=False):
+    """Insert AccessLog rows for `events`. Their ids come back when sharded, or with RETURNING when `linked`."""
+    table = AccessLog.__table__
+    rows = assign_ids(table, [{key: event[key] for key in ACCESS_COLUMNS} for event in events])
+    if not rows:
+        return []
+    if not linked or rows[0].get('id') is not None:
+        session.execute(insert(table), rows)
+    elif session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars())
+    else:
+        return [session.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+    return [row.get('id') for row in rows]
+
+
+def _to_json(event):
+    return dict(event, access_time=event['access_time'].isoformat())
+
+
+def _from_json(line):
+    event = json.loads(line)
+    event['access_time'] = datetime.fromisoformat(event['access_time'])
+    return event
+
+
+def init_app(app):
+    """Create the app's writer from ACCESS_LOG_* config (environment defaults)."""
+    app.config.setdefault('ACCESS_LOG_MODE', ACCESS_LOG_MODE)
+    app.config.setdefault('ACCESS_LOG_BATCH_SIZE', ACCESS_LOG_BATCH_SIZE)
+    app.config.setdefault('ACCESS_LOG_FLUSH_INTERVAL', ACCESS_LOG_FLUSH_INTERVAL)
+    app.config.setdefault('ACCESS_LOG_JOURNAL_DIR', ACCESS_LOG_JOURNAL_DIR)
+    app.extensions['access_log_writer'] = AccessLogWriter(
+        app,
+        mode=app.config['ACCESS_LOG_MODE'],
+        batch_size=app.config['ACCESS_LOG_BATCH_SIZE'],
+        flush_interval=app.config['ACCESS_LOG_FLUSH_INTERVAL'],
+        journal_dir=app.config['ACCESS_LOG_JOURNAL_DIR']
+    )
+    return app.extensions['access_log_writer']
+
+
+def get_writer():
+    app = current_app._get_current_object()
+    if 'access_log_writer' not in app.extensions:
+        init_app(app)
+    return app.extensions['access_log_writer']
+
+
+def record_access(record, accessed_by, access_time=None, action=None):
+    """
+    Log that `accessed_by` read `record`; returns without waiting for the
+    database. With an `action`, the access is also logged on the blockchain.
+    """
+    chain = {'user_email': accessed_by, 'record_name': record.filename, 'action': action} if action else None
+    get_writer().record(record.id, accessed_by, patient_id=record.patient_id, access_time=access_time, chain=chain)
+
+
+def log_chain(user_email, record_name, action, patient_id=None):
+    """Log an access on the blockchain only (no AccessLog row), through the same batches."""
+    get_writer().record(None, user_email, patient_id=patient_id,
+                        chain={'user_email': user_email, 'record_name': record_name, 'action': action})
@@ -0,0 +1,120 @@
+# app/services/anchoring.py
+import calendar
+import os
+from datetime import datetime
+from eth_abi import encode
+from eth_utils import keccak
+from ..models import db, ChainAnchor
+
+# Anchoring mode (CHAIN_OUTBOX_MODE=anchor) puts one Merkle root per epoch
+# on-chain instead of one AccessLogged event per access. The outbox worker
+# (app/services/chain_outbox.py) waits until due outbox rows make an epoch
+# -- CHAIN_ANCHOR_EPOCH_EVENTS of them, or the oldest has waited
+# CHAIN_ANCHOR_EPOCH_SECONDS (chain_outbox.epoch_due) -- claims them,
+# seals them into a tree (seal) and sends one anchorRoot(root, leafCount)
+# transaction for all of them, with the outbox's sign-before-send and
+# retry rules. On-chain cost is O(1) per epoch.
+#
+# Leaves are keccak256(keccak256(abi.encode(idempotencyKey, userEmail,
+# recordName, action, createdAt))) in outbox id order; parents hash their
+# two children in sorted order (as OpenZeppelin's MerkleProof does), and
+# an odd last node moves up a level unchanged. The tree is stored in
+# chain_anchor, level by level, so a proof is log2(n) slices of it and
+# AccessLogger.verifyInclusion(anchorer, root, leaf, proof) checks one
+# on-chain in O(log n).
+CHAIN_ANCHOR_EPOCH_SECONDS = float(os.getenv('CHAIN_ANCHOR_EPOCH_SECONDS', 300))
+CHAIN_ANCHOR_EPOCH_EVENTS = int(os.getenv('CHAIN_ANCHOR_EPOCH_EVENTS', 10_000))
+
+LEAF_TYPES = ['string', 'string', 'string', 'string', 'uint256']
+LEAF_ENCODING = 'keccak256(keccak256(abi.encode(string idempotencyKey, string userEmail, string recordName, ' \
+                'string action, uint256 createdAt)))'
+NODE_SIZE = 32
+
+
+def leaf_fields(row):
+    """The values a ChainOutbox row's leaf commits to, in LEAF_TYPES order."""
+    return [row.idempotency_key, row.user_email, row.record_name, row.action,
+            calendar.timegm(row.created_at.utctimetuple())]
+
+
+def leaf_hash(row):
+    return keccak(keccak(encode(LEAF_TYPES, leaf_fields(row))))
+
+
+def hash_pair(a, b):
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+def level_sizes(leaf_count):
+    sizes = [leaf_count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def build_tree(leaves):
+    """Every level of the tree over `leaves` (32-byte hashes), leaves first, as one bytes string."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([hash_pair(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                       for i in range(0, len(level), 2)])
+    return b''.join(node for level in levels for node in level)
+
+
+def tree_root(tree):
+    return tree[-NODE_SIZE:]
+
+
+def proof(tree, leaf_count, index):
+    """Sibling hashes from leaf `index` up to the root."""
+    siblings = []
+    offset = 0
+    for size in level_sizes(leaf_count)[:-1]:
+        sibling = index ^ 1
+        if sibling < size:
+            start = (offset + sibling) * NODE_SIZE
+            siblings.append(tree[start:start + NODE_SIZE])
+        offset += size
+        index //= 2
+    return siblings
+
+
+def verify(root, leaf, siblings):
+    node = leaf
+    for sibling in siblings:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+def seal(session, rows):
+    """Build the epoch's tree over `rows`, add its ChainAnchor and give each row its leaf (the caller commits)."""
+    tree = build_tree([leaf_hash(row) for row in rows])
+    anchor = ChainAnchor(root='0x' + tree_root(tree).hex(), leaf_count=len(rows), tree=tree,
+                         created_at=datetime.utcnow())
+    session.add(anchor)
+    session.flush()
+    for index, row in enumerate(rows):
+        row.anchor_id = anchor.id
+        row.leaf_index = index
+    return anchor
+
+
+def inclusion_proof(row):
+    """An anchored outbox row's leaf, proof and root, as the proof endpoint returns them."""
+    anchor = db.session.get(ChainAnchor, row.anchor_id)
+    siblings = proof(anchor.tree, anchor.leaf_count, row.leaf_index)
+    leaf = leaf_hash(row)
+    return {
+        "leaf": dict(zip(('idempotency_key', 'user_email', 'record_name', 'action', 'created_at'), leaf_fields(row))),
+        "leaf_encoding": LEAF_ENCODING,
+        "leaf_hash": '0x' + leaf.hex(),
+        "leaf_index": row.leaf_index,
+        "proof": ['0x' + sibling.hex() for sibling in siblings],
+        "root": anchor.root,
+        "leaf_count": anchor.leaf_count,
+        "epoch": anchor.id,
+        "transaction_hash": row.tx_hash,
+        "block_number": row.block_number,
+        "verified": verify(tree_root(anchor.tree), leaf, siblings),
+    }
@@ -0,0 +1,128 @@
+# app/services/blob_store.py
+import os
+import re
+import uuid
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from ..database import shard_scope
+from ..models import db, Blob
+from ..storage import BlobNotFound
+
+# Content-addressed layout: objects/ab/cd/abcd... under the storage backend
+# (two levels of 256-way fan-out keep local directories small even with
+# millions of blobs). When the database is sharded, Blob rows are sharded
+# by digest, whichever patients reference them.
+#
+# A Record and its Blob row then usually live on different shards, and one
+# session commit is a commit per shard, one after the other: not atomic.
+# A failure between the two can leave ref_count one too high (the blob's
+# bytes are kept for nothing) or one too low (the last delete of another
+# record drops bytes this record still uses). python -m backend.app.rebalance
+# --repair-blobs raises every count back to the live records that use it.
+OBJECTS_PREFIX = 'objects'
+TRASH_PREFIX = '.trash'
+BLOB_URL_PREFIX = 'sha256:'
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_digest(value):
+    return bool(value) and bool(_DIGEST_RE.match(value))
+
+
+def blob_url(digest):
+    """Value stored in Record.blob_url for content-addressed records."""
+    return f"{BLOB_URL_PREFIX}{digest}"
+
+
+def object_key(digest):
+    return f"{OBJECTS_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def record_key(record):
+    """Storage key of a record's bytes, for both content-addressed and legacy per-name records."""
+    if record.blob_url.startswith(BLOB_URL_PREFIX):
+        return object_key(record.blob_url[len(BLOB_URL_PREFIX):])
+    return record.filename
+
+
+def lookup(digest):
+    with shard_scope(digest):
+        blob = db.session.get(Blob, digest)
+    if blob is None or blob.ref_count <= 0:
+        return None
+    return blob
+
+
+def acquire(digest, size):
+    """
+    Add one reference to `digest` inside the caller's transaction, creating
+    the Blob row on first use. The caller then calls place() and commits.
+    """
+    increment = {Blob.ref_count: Blob.ref_count + 1}
+    with shard_scope(digest):
+        if Blob.query.filter_by(digest=digest).update(increment, synchronize_session=False):
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(digest=digest, size=size, ref_count=1, created_at=datetime.utcnow()))
+        except IntegrityError:
+            # A concurrent upload of the same bytes created the row first.
+            Blob.query.filter_by(digest=digest).update(increment, synchronize_session=False)
+
+
+def place(storage, tmp_path, digest):
+    """
+    Move a spooled upload into its content-addressed key once acquire()
+    holds the reference, before the caller commits: a record is never
+    committed pointing at bytes that failed to store. If the commit fails
+    instead, the object is left without a reference, which is harmless (a
+    later upload of the same bytes reuses it). If the bytes are already
+    stored the temp file is simply dropped.
+    """
+    key = object_key(digest)
+    if storage.exists(key):
+        os.remove(tmp_path)
+        return key
+    storage.put_file(key, tmp_path)
+    return key
+
+
+def release(storage, digest):
+    """
+    Drop one reference inside the caller's transaction. When it was the last
+    one the Blob row is deleted and the object is moved aside; the caller
+    commits and then calls purge() on the returned key (or restore() on
+    rollback). Returns None while other records still use the blob.
+
+    Moving the object before the commit matters: a concurrent upload of the
+    same bytes cannot commit its new reference until this transaction ends,
+    so it will always find the object missing and write it back.
+    """
+    with shard_scope(digest):
+        Blob.query.filter_by(digest=digest).update(
+            {Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False
+        )
+        if not Blob.query.filter(Blob.digest == digest, Blob.ref_count <= 0).delete(synchronize_session=False):
+            return None
+
+    trash_key = f"{TRASH_PREFIX}/{digest}.{uuid.uuid4().hex}"
+    try:
+        storage.move(object_key(digest), trash_key)
+    except BlobNotFound:
+        return None
+    return trash_key
+
+
+def purge(storage, trash_key):
+    if trash_key:
+        storage.delete(trash_key)
+
+
+def restore(storage, trash_key, digest):
+    """Undo release() after a failed commit."""
+    if trash_key:
+        try:
+            storage.move(trash_key, object_key(digest))
+        except BlobNotFound:
+            pass
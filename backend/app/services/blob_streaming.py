@@ -0,0 +1,52 @@
+# app/services/blob_streaming.py
+import queue
+import threading
+
+# Sentinel pushed by the reader thread once the downloader is exhausted.
+_DONE = object()
+
+
+def stream_chunks(downloader, read_ahead=2):
+    """
+    Yield the chunks of an Azure StorageStreamDownloader while a background
+    thread fetches at most `read_ahead` chunks ahead of the consumer.
+    Peak memory is bounded by (read_ahead + 1) * chunk size, independent of
+    the blob size. Closing the generator (client disconnect) stops the reader.
+    """
+    if read_ahead < 1:
+        yield from downloader.chunks()
+        return
+
+    buffer = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for chunk in downloader.chunks():
+                if not put(chunk):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, name='blob-read-ahead', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
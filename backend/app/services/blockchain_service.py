@@ -1,104 +1,78 @@
 # app/services/blockchain_service.py
-from web3 import Web3
-import os
+import threading
+from flask import current_app, has_app_context
+from ..nonce_manager import TransactionPipeline
 
-# Ethereum configuration
-WEB3_PROVIDER = "http://127.0.0.1:8545"
-CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"  # Your deployed address
-ACCOUNT_ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"  # Hardhat's first account
-PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"  # Hardhat's first private key
+# Direct sends to the AccessLogger, for callers that need a transaction
+# hash now rather than an outbox row (requests go through the outbox, see
+# app/services/chain_outbox.py). Transactions go through the configured
+# node, contract and wallet(s) of app/blockchain.py, with the real ABI.
+# They are pipelined: nonces come from the client's AccountPool (shared
+# with the app's outbox worker when there is one, so the two never hand
+# out the same nonce) and the receipt is awaited only with wait=True. See
+# app/nonce_manager.py.
+_pipeline = None
+_pipeline_lock = threading.Lock()
 
-# Contract ABI (updated to match new AccessLogger.sol)
-CONTRACT_ABI = [
-    {
-        "anonymous": False,
-        "inputs": [
-            {"indexed": False, "internalType": "uint256", "name": "recordId", "type": "uint256"},
-            {"indexed": False, "internalType": "uint256", "name": "patientId", "type": "uint256"},
-            {"indexed": False, "internalType": "string", "name": "accessor", "type": "string"},
-            {"indexed": False, "internalType": "uint256", "name": "timestamp", "type": "uint256"}
-        ],
-        "name": "AccessLogged",
-        "type": "event"
-    },
-    {
-        "inputs": [
-            {"internalType": "uint256", "name": "recordId", "type": "uint256"},
-            {"internalType": "uint256", "name": "patientId", "type": "uint256"},
-            {"internalType": "string", "name": "accessor", "type": "string"}
-        ],
-        "name": "logAccess",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
 
-# Initialize Web3
-w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER))
-checksum_address = w3.to_checksum_address(CONTRACT_ADDRESS)
-contract = w3.eth.contract(address=checksum_address, abi=CONTRACT_ABI)
+def get_client():
+    """The outbox worker's AccessLoggerClient when the app has one, else a new one; None without a chain."""
+    worker = current_app.extensions.get('chain_outbox') if has_app_context() else None
+    if worker is not None:
+        return worker.client
+    from .. import blockchain
+    return blockchain.get_client()
 
-def log_access(record_id, patient_id, accessor):
-    """
-    Log an access event to the blockchain.
-    Returns the transaction hash.
-    """
-    try:
-        nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-        tx = contract.functions.logAccess(int(record_id), int(patient_id), accessor).build_transaction({
-            'from': ACCOUNT_ADDRESS,
-            'nonce': nonce,
-            'gas': 200000,
-            'gasPrice': w3.to_wei('20', 'gwei')
-        })
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        return w3.to_hex(tx_hash)
-    except Exception as e:
-        raise Exception(f"Failed to log access: {str(e)}")
 
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            client = get_client()
+            if client is None:
+                raise RuntimeError("No blockchain configured (ETHEREUM_PROVIDER_URL, ACCESS_LOGGER_ADDRESS, "
+                                   "WALLET_PRIVATE_KEY)")
+            _pipeline = (client, TransactionPipeline(client.w3, client.pool))
+        return _pipeline
 
-def store_file_hash(filename, file_hash):
-    """
-    Store a file hash on the blockchain.
-    Returns the transaction hash.
-    """
-    try:
-        nonce = w3.eth.get_transaction_count(ACCOUNT_ADDRESS)
-        tx = contract.functions.storeFileHash(filename, file_hash).build_transaction({
-            'from': ACCOUNT_ADDRESS,
-            'nonce': nonce,
-            'gas': 200000,
-            'gasPrice': w3.to_wei('20', 'gwei')
-        })
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        return w3.to_hex(tx_hash)
-    except Exception as e:
-        raise Exception(f"Failed to store hash: {str(e)}")
 
-def get_file_hash(filename):
+def log_access(user_email, record_name, action, wait=False):
     """
-    Retrieve a file hash from the blockchain.
+    Log an access event to the blockchain (AccessLogger.logAccess).
+    Returns the transaction hash once the node has the transaction, or
+    once it is mined with wait=True.
     """
     try:
-        file_hash = contract.functions.getFileHash(filename).call()
-        return w3.to_hex(file_hash)
+        client, pipeline = get_pipeline()
+        pending = pipeline.submit(client.call([(user_email, record_name, action)]))
+        if wait:
+            pending.wait()
+        return pending.tx_hash
     except Exception as e:
-        raise Exception(f"Failed to retrieve hash: {str(e)}")
+        raise Exception(f"Failed to log access: {str(e)}")
 
 def get_access_logs(record_id):
     """
-    Retrieve access logs for a record from the blockchain.
+    Retrieve access logs for a record, newest first, from the local index
+    of the AccessLogger's AccessLogged events (app/services/chain_index.py)
+    instead of scanning the chain. Events name the record by its stored
+    filename, so the record is looked up first; an unknown id has none.
+    Needs an app context.
     """
+    from . import chain_index
+    from ..database import locate, shard_scope
+    from ..models import db, ChainEvent, Record
     try:
-        logs = contract.functions.getAccessLogs(record_id).call()
-        return [
-            {"patientId": log[0], "accessor": log[1], "timestamp": log[2]}
-            for log in logs
-        ]
+        shard = locate(Record, id=record_id)
+        if shard is None:
+            return []
+        with shard_scope(shard=shard):
+            record = db.session.get(Record, record_id)
+            filename = record.filename if record is not None else None
+        if filename is None:
+            return []
+        events = chain_index.events_query({'record': filename}).order_by(
+            ChainEvent.timestamp.desc(), ChainEvent.id.desc()).all()
+        return [chain_index.describe(event) for event in events]
     except Exception as e:
-        raise Exception(f"Failed to retrieve access logs: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to retrieve access logs: {str(e)}")
@@ -0,0 +1,94 @@
+# app/services/bulk_upload.py
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+
+# One pool per process bounds storage concurrency across all bulk requests.
+BULK_UPLOAD_WORKERS = int(os.getenv('BULK_UPLOAD_WORKERS', 8))
+MAX_BULK_FILES = 500
+MAX_ZIP_MEMBER_SIZE = 512 * 1024 * 1024
+MAX_ZIP_TOTAL_SIZE = 2 * 1024 * 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BULK_UPLOAD_WORKERS, thread_name_prefix='bulk-upload')
+        return _executor
+
+
+class BulkItem:
+    """One file of a bulk upload: a plain multipart part or a ZIP member."""
+
+    def __init__(self, name, opener, source=None):
+        self.name = name
+        self.opener = opener
+        self.source = source  # archive name for ZIP members
+
+    def open(self):
+        return self.opener()
+
+    def result(self, status, **fields):
+        entry = {"filename": self.name, "status": status}
+        if self.source:
+            entry["archive"] = self.source
+        entry.update(fields)
+        return entry
+
+
+def expand_uploads(files, allowed_file):
+    """
+    Turn the uploaded parts into BulkItems, unpacking ZIP archives.
+    Returns (items, results, archives): results already holds an entry for
+    every rejected file, and archives must be closed once the items are read.
+    """
+    items, results, archives = [], [], []
+    for file in files:
+        if not file or file.filename == '':
+            continue
+        if file.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                results.append({"filename": file.filename, "status": "rejected", "error": "Not a valid ZIP archive"})
+                continue
+            archives.append(archive)
+            total = 0
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                item = BulkItem(secure_filename(os.path.basename(info.filename)),
+                                lambda archive=archive, info=info: archive.open(info),
+                                source=file.filename)
+                total += info.file_size
+                if not item.name or not allowed_file(item.name):
+                    results.append(item.result("rejected", error="File type not allowed. Allowed: pdf, docx, txt"))
+                elif info.file_size > MAX_ZIP_MEMBER_SIZE or total > MAX_ZIP_TOTAL_SIZE:
+                    results.append(item.result("rejected", error="Archive member too large"))
+                else:
+                    items.append(item)
+        elif allowed_file(file.filename):
+            items.append(BulkItem(secure_filename(file.filename), lambda file=file: file.stream))
+        else:
+            results.append({"filename": file.filename, "status": "rejected",
+                            "error": "File type not allowed. Allowed: pdf, docx, txt"})
+    return items, results, archives
+
+
+def run_parallel(fn, items):
+    """
+    Apply fn to every item on the shared pool. Returns a list of
+    (value, error) pairs in item order; one failure does not stop the rest.
+    """
+    def guarded(item):
+        try:
+            return fn(item), None
+        except Exception as e:
+            return None, e
+    return list(executor().map(guarded, items))
@@ -0,0 +1,329 @@
+# app/services/chain_index.py
+import atexit
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from eth_utils import event_abi_to_log_topic
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+from ..models import db, ChainCursor, ChainEvent
+
+# Access history is read from a local copy of the AccessLogger's
+# AccessLogged events. The contract keeps no state to query, and reading
+# events back from a node is an eth_getLogs scan over every block since
+# deployment, per request. An indexer follows the chain instead:
+#
+#   1. check for a reorg: compare the hashes of the last indexed blocks
+#      (up to CHAIN_INDEXER_REORG_DEPTH of them, kept on the chain_cursor
+#      row) with the node's, newest first; if the newest no longer
+#      matches, delete the events above the newest block that still does
+#      and index from there again
+#   2. eth_getLogs for the contract's AccessLogged topic from the next
+#      block up to the head, in block ranges sized to the provider: a
+#      range the provider refuses (too many results, range too wide,
+#      timeout) is halved and retried, and every full range that succeeds
+#      doubles it again, up to CHAIN_INDEXER_MAX_RANGE blocks but below the
+#      smallest range refused in the last RANGE_PROBE_AFTER calls
+#   3. insert the decoded events into chain_event and move the cursor in
+#      one transaction per range, so a crash redoes at most one range
+#
+# The cursor row carries a lease: with an indexer thread in every app
+# process, one of them indexes and the others stand by. Queries filter by
+# record, accessor (the userEmail argument), sender (the signing account)
+# and time range, each on a (column, timestamp) index of chain_event, in
+# keyset pages newest first.
+#
+#   CHAIN_INDEXER=thread  follow the chain in every app process (the default)
+#   CHAIN_INDEXER=off     only serve queries; run python -m backend.app.chain_indexer
+CHAIN_INDEXER = os.getenv('CHAIN_INDEXER', 'thread')
+CHAIN_INDEXER_REORG_DEPTH = int(os.getenv('CHAIN_INDEXER_REORG_DEPTH', 12))  # blocks a reorg may replace
+CHAIN_INDEXER_MAX_RANGE = int(os.getenv('CHAIN_INDEXER_MAX_RANGE', 2000))  # blocks per eth_getLogs call
+CHAIN_INDEXER_START_BLOCK = int(os.getenv('CHAIN_INDEXER_START_BLOCK', 0))  # the contract's deployment block
+CHAIN_INDEXER_POLL_INTERVAL = float(os.getenv('CHAIN_INDEXER_POLL_INTERVAL', 2.0))
+
+INDEXER_MODES = ('thread', 'off')
+LEASE_SECONDS = 60
+RANGE_PROBE_AFTER = 50  # successful eth_getLogs calls before a refused range size is tried again
+# Provider errors for an eth_getLogs range that is too large, across geth, Infura, Alchemy and others
+RANGE_ERRORS = ('query returned more than', 'block range', 'range is too', 'range too', 'too many',
+                'limit exceeded', 'response size', 'timeout', 'timed out')
+
+
+def is_range_error(error):
+    message = str(error).lower()
+    return any(pattern in message for pattern in RANGE_ERRORS)
+
+
+def _fit(value, column):
+    return value[:column.type.length]
+
+
+def event_row(event):
+    """A chain_event row (as a dict) for a decoded AccessLogged event."""
+    args = event['args']
+    return dict(
+        block_number=event['blockNumber'], block_hash=Web3.to_hex(event['blockHash']),
+        tx_hash=Web3.to_hex(event['transactionHash']), log_index=event['logIndex'], sender=args['accessor'],
+        user_email=_fit(args['userEmail'], ChainEvent.user_email),
+        record_name=_fit(args['recordName'], ChainEvent.record_name),
+        action=_fit(args['action'], ChainEvent.action),
+        timestamp=datetime.fromtimestamp(args['timestamp'], timezone.utc).replace(tzinfo=None)
+    )
+
+
+def parse_filters(args):
+    """
+    Read ?record=&accessor=&sender=&from=&to= into a dict of the filters
+    present. `sender` is an account address. Raises ValueError.
+    """
+    filters = {name: args[name] for name in ('record', 'accessor', 'sender') if args.get(name)}
+    if 'sender' in filters:
+        if not Web3.is_address(filters['sender']):
+            raise ValueError("sender must be an account address")
+        filters['sender'] = Web3.to_checksum_address(filters['sender'])
+    try:
+        if args.get('from'):
+            filters['from'] = datetime.fromisoformat(args['from'])
+        if args.get('to'):
+            filters['to'] = datetime.fromisoformat(args['to'])
+    except ValueError:
+        raise ValueError("from and to must be ISO dates or datetimes")
+    if 'from' in filters and 'to' in filters and filters['from'] >= filters['to']:
+        raise ValueError("from must be before to")
+    return filters
+
+
+def events_query(filters):
+    """ChainEvent rows matching the parsed filters (unordered; the caller pages them by timestamp)."""
+    query = ChainEvent.query
+    if 'record' in filters:
+        query = query.filter(ChainEvent.record_name == filters['record'])
+    if 'accessor' in filters:
+        query = query.filter(ChainEvent.user_email == filters['accessor'])
+    if 'sender' in filters:
+        query = query.filter(ChainEvent.sender == filters['sender'])
+    if 'from' in filters:
+        query = query.filter(ChainEvent.timestamp >= filters['from'])
+    if 'to' in filters:
+        query = query.filter(ChainEvent.timestamp < filters['to'])
+    return query
+
+
+def describe(event):
+    return {
+        "record_name": event.record_name,
+        "accessor": event.user_email,
+        "action": event.action,
+        "sender": event.sender,
+        "timestamp": event.timestamp.isoformat(),
+        "block_number": event.block_number,
+        "transaction_hash": event.tx_hash,
+        "log_index": event.log_index,
+    }
+
+
+class EventIndexer:
+    """
+    Copies the AccessLogged events of `contract` (a web3 contract bound to
+    the AccessLogger) into chain_event: on a daemon thread after start(),
+    or up to the chain's head per sync() call. Blocks more than
+    `reorg_depth` below the head are taken as final.
+    """
+
+    def __init__(self, app, contract, reorg_depth=CHAIN_INDEXER_REORG_DEPTH, max_range=CHAIN_INDEXER_MAX_RANGE,
+                 start_block=CHAIN_INDEXER_START_BLOCK, poll_interval=CHAIN_INDEXER_POLL_INTERVAL):
+        self.app = app
+        self.contract = contract
+        self.w3 = contract.w3
+        self.event = contract.events.AccessLogged()
+        self.topic = Web3.to_hex(event_abi_to_log_topic(self.event.abi))
+        self.cursor_id = f"{contract.address}:AccessLogged"
+        self.reorg_depth = max(reorg_depth, 1)
+        self.max_range = max(max_range, 1)
+        self.range = self.max_range  # blocks per eth_getLogs call, shrunk to what the provider accepts
+        self._ceiling = self.max_range  # below the smallest range the provider refused lately
+        self._accepted = 0
+        self.start_block = start_block
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'events': 0, 'blocks': 0, 'ranges': 0, 'range_halved': 0, 'reorgs': 0, 'rolled_back': 0,
+                      'skipped': 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='chain-indexer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"chain_index.py - sync failed, will retry: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def indexed_block(self):
+        """The last block indexed, or None before the first sync (needs an app context)."""
+        cursor = db.session.get(ChainCursor, self.cursor_id)
+        return cursor.block_number if cursor is not None and cursor.block_number >= self.start_block else None
+
+    def sync(self):
+        """Undo a reorg if there was one, then index up to the head. Returns False if another indexer holds the lease."""
+        with self.app.app_context():
+            if not self._claim():
+                return False
+            cursor = db.session.get(ChainCursor, self.cursor_id)
+            self._check_reorg(cursor)
+            head = self.w3.eth.block_number
+            while cursor.block_number < head and not self._stop.is_set():
+                self._index_range(cursor, head)
+            return True
+
+    def _claim(self):
+        now = datetime.utcnow()
+        if db.session.get(ChainCursor, self.cursor_id) is None:
+            try:
+                db.session.add(ChainCursor(id=self.cursor_id, block_number=self.start_block - 1, recent_blocks='[]',
+                                           updated_at=now))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()  # another indexer created it first
+        claimed = db.session.execute(
+            update(ChainCursor)
+            .where(ChainCursor.id == self.cursor_id,
+                   or_(ChainCursor.claimed_by == self.name, ChainCursor.lease_until.is_(None),
+                       ChainCursor.lease_until < now))
+            .values(claimed_by=self.name, lease_until=now + timedelta(seconds=LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def _block(self, number):
+        try:
+            return self.w3.eth.get_block(number)
+        except BlockNotFound:
+            return None
+
+    def _check_reorg(self, cursor):
+        recent = json.loads(cursor.recent_blocks)
+        if not recent:
+            return
+        fork = None  # the newest indexed block still on the chain
+        for number, block_hash in reversed(recent):
+            block = self._block(number)
+            if block is not None and Web3.to_hex(block['hash']) == block_hash:
+                fork = number
+                break
+        if fork == recent[-1][0]:
+            return
+        if fork is None:
+            fork = recent[0][0] - 1
+            print(f"chain_index.py - reorg deeper than {len(recent)} blocks, indexing again from block {fork + 1}")
+        removed = db.session.execute(
+            delete(ChainEvent).where(ChainEvent.block_number > fork).execution_options(synchronize_session=False)
+        ).rowcount
+        cursor.block_number = min(cursor.block_number, fork)
+        cursor.recent_blocks = json.dumps([block for block in recent if block[0] <= fork])
+        cursor.updated_at = datetime.utcnow()
+        db.session.commit()
+        self.stats['reorgs'] += 1
+        self.stats['rolled_back'] += removed
+
+    def _get_logs(self, start, head):
+        """The contract's AccessLogged logs from `start` on, over as many blocks as the provider accepts, and the last block covered."""
+        while True:
+            end = min(head, start + self.range - 1)
+            try:
+                logs = self.w3.eth.get_logs({'address': self.contract.address, 'topics': [self.topic],
+                                             'fromBlock': start, 'toBlock': end})
+            except Exception as e:
+                if end == start or not is_range_error(e):
+                    raise
+                self._ceiling = end - start
+                self._accepted = 0
+                self.range = max((end - start + 1) // 2, 1)
+                self.stats['range_halved'] += 1
+                continue
+            self._accepted += 1
+            if self._accepted >= RANGE_PROBE_AFTER:
+                self._ceiling, self._accepted = self.max_range, 0
+            if end - start + 1 == self.range:
+                self.range = min(self.range * 2, self._ceiling)
+            return logs, end
+
+    def _index_range(self, cursor, head):
+        start = cursor.block_number + 1
+        logs, end = self._get_logs(start, head)
+        # Blocks a reorg may still replace: keep their hashes for the next check, and make sure
+        # the logs and the blocks come from the same chain, which continues the indexed one.
+        recent = [block for block in json.loads(cursor.recent_blocks) if block[0] > head - self.reorg_depth]
+        hashes = {}
+        for number in range(max(start, head - self.reorg_depth + 1), end + 1):
+            block = self._block(number)
+            parent = hashes.get(number - 1) or (recent[-1][1] if recent and recent[-1][0] == number - 1 else None)
+            if block is None or (parent is not None and Web3.to_hex(block['parentHash']) != parent):
+                raise RuntimeError(f"chain reorganised at block {number} while indexing; checking again")
+            hashes[number] = Web3.to_hex(block['hash'])
+        rows = []
+        for log in logs:
+            if log['blockNumber'] in hashes and Web3.to_hex(log['blockHash']) != hashes[log['blockNumber']]:
+                raise RuntimeError(f"chain reorganised at block {log['blockNumber']} while indexing; checking again")
+            try:
+                rows.append(event_row(self.event.process_log(log)))
+            except Exception:
+                self.stats['skipped'] += 1  # not decodable as AccessLogged
+        if rows:
+            db.session.execute(insert(ChainEvent), rows)
+        now = datetime.utcnow()
+        cursor.block_number = end
+        cursor.recent_blocks = json.dumps(recent + sorted(hashes.items()))
+        cursor.lease_until = now + timedelta(seconds=LEASE_SECONDS)
+        cursor.updated_at = now
+        db.session.commit()
+        self.stats['events'] += len(rows)
+        self.stats['blocks'] += end - start + 1
+        self.stats['ranges'] += 1
+
+
+def init_app(app, contract=None):
+    """
+    Create the app's event indexer when a chain is configured (see
+    app/blockchain.py) and, with CHAIN_INDEXER=thread, start it.
+    """
+    app.config.setdefault('CHAIN_INDEXER', CHAIN_INDEXER)
+    app.config.setdefault('CHAIN_INDEXER_REORG_DEPTH', CHAIN_INDEXER_REORG_DEPTH)
+    app.config.setdefault('CHAIN_INDEXER_MAX_RANGE', CHAIN_INDEXER_MAX_RANGE)
+    app.config.setdefault('CHAIN_INDEXER_START_BLOCK', CHAIN_INDEXER_START_BLOCK)
+    app.config.setdefault('CHAIN_INDEXER_POLL_INTERVAL', CHAIN_INDEXER_POLL_INTERVAL)
+    mode = app.config['CHAIN_INDEXER']
+    if mode not in INDEXER_MODES:
+        raise ValueError(f"Unknown CHAIN_INDEXER '{mode}'. Expected one of: {', '.join(INDEXER_MODES)}")
+    if contract is None:
+        from .. import blockchain
+        contract = blockchain.get_contract()
+    indexer = None
+    if contract is not None:
+        indexer = EventIndexer(
+            app, contract,
+            reorg_depth=app.config['CHAIN_INDEXER_REORG_DEPTH'],
+            max_range=app.config['CHAIN_INDEXER_MAX_RANGE'],
+            start_block=app.config['CHAIN_INDEXER_START_BLOCK'],
+            poll_interval=app.config['CHAIN_INDEXER_POLL_INTERVAL']
+        )
+        if mode == 'thread':
+            indexer.start()
+    app.extensions['chain_index'] = indexer
+    return indexer
@@ -0,0 +1,444 @@
+# app/services/chain_outbox.py
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text, update
+from . import anchoring
+from ..blockchain import NonceTooLow
+from ..database import assign_ids, fan_out, get_shards, shard_scope
+from ..models import db, AccessLog, ChainOutbox
+
+# Blockchain access logging goes through a transactional outbox. A request
+# never talks to the node: it inserts a chain_outbox row in the same
+# transaction as the change it logs (an upload, a delete), or hands it to
+# the access-log writer, which inserts it next to the AccessLog row of a
+# read. A worker thread drains the outbox:
+#
+#   1. claim a batch of due rows under a lease (the review queue's UPDATE
+#      ... WHERE id IN (oldest N), against the partial ix_chain_outbox_queue)
+#   2. pack the rows that have no transaction yet into logAccessBatch
+#      transactions of up to CHAIN_OUTBOX_TX_EVENTS events (one event per
+#      row), halving any batch whose gas estimate is over
+#      CHAIN_OUTBOX_TX_GAS_LIMIT or that the node cannot estimate (over its
+#      block gas limit); sign them and commit each transaction's hash on
+#      all of its rows, and the raw transaction on the first of them,
+#      BEFORE broadcasting, so whatever happens next a retry re-sends that
+#      same transaction, which the node drops as a duplicate or reports as
+#      mined
+#   3. broadcast, wait for receipts, mark the rows sent and copy each tx
+#      hash onto its AccessLog row
+#
+# Failures (node down, no receipt within the timeout) leave a row pending
+# with exponential backoff; the rows of a transaction whose nonce another
+# one took, or that reverted, are packed and signed again. A row fails for
+# good after CHAIN_OUTBOX_MAX_ATTEMPTS. CHAIN_OUTBOX_TX_EVENTS=1 sends one
+# logAccess per row, for a contract deployed before logAccessBatch.
+#
+# With CHAIN_OUTBOX_MODE=anchor, step 2 instead seals the claimed rows into
+# one Merkle tree and signs a single anchorRoot transaction for its root
+# (app/services/anchoring.py); a claim waits until the due rows make an
+# epoch (epoch_due), and takes up to CHAIN_ANCHOR_EPOCH_EVENTS rows.
+# Idempotency keys are unique, so a client retrying POST
+# /api/blockchain/log_access with the same Idempotency-Key header gets the
+# first row back instead of a second transaction.
+#
+#   CHAIN_OUTBOX_WORKER=thread  drain in every app process (the default)
+#   CHAIN_OUTBOX_WORKER=off     only queue; run python -m backend.app.chain_worker
+#   CHAIN_OUTBOX_MODE=events    one AccessLogged event per row (the default)
+#   CHAIN_OUTBOX_MODE=anchor    one Merkle root per epoch of rows
+CHAIN_OUTBOX_WORKER = os.getenv('CHAIN_OUTBOX_WORKER', 'thread')
+CHAIN_OUTBOX_MODE = os.getenv('CHAIN_OUTBOX_MODE', 'events')
+CHAIN_OUTBOX_BATCH_SIZE = int(os.getenv('CHAIN_OUTBOX_BATCH_SIZE', 500))  # rows claimed per shard and pass
+CHAIN_OUTBOX_TX_EVENTS = int(os.getenv('CHAIN_OUTBOX_TX_EVENTS', 100))  # rows per transaction
+CHAIN_OUTBOX_TX_GAS_LIMIT = int(os.getenv('CHAIN_OUTBOX_TX_GAS_LIMIT', 10_000_000))
+CHAIN_OUTBOX_POLL_INTERVAL = float(os.getenv('CHAIN_OUTBOX_POLL_INTERVAL', 1.0))
+CHAIN_OUTBOX_RECEIPT_TIMEOUT = float(os.getenv('CHAIN_OUTBOX_RECEIPT_TIMEOUT', 120))
+CHAIN_OUTBOX_MAX_ATTEMPTS = int(os.getenv('CHAIN_OUTBOX_MAX_ATTEMPTS', 20))
+
+WORKER_MODES = ('thread', 'off')
+DELIVERY_MODES = ('events', 'anchor')
+QUEUE_CONDITION = "status = 'pending'"  # must match the index predicate literally
+STATUSES = ('pending', 'sent', 'failed')
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 15 * 60
+RECEIPT_POLL_SECONDS = 0.25
+MAX_KEY_LENGTH = 64
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def entry(user_email, record_name, action, patient_id=None, access_log_id=None, idempotency_key=None, now=None):
+    """A chain_outbox row as a dict, due at once."""
+    now = now or datetime.utcnow()
+    return dict(
+        idempotency_key=idempotency_key or new_key(), patient_id=patient_id, user_email=user_email,
+        record_name=record_name, action=action, access_log_id=access_log_id,
+        created_at=now, available_at=now, status='pending', attempts=0
+    )
+
+
+def enqueue(session, user_email, record_name, action, patient_id=None, idempotency_key=None):
+    """Add an outbox row to the caller's transaction (the caller commits)."""
+    row = ChainOutbox(**entry(user_email, record_name, action, patient_id=patient_id,
+                              idempotency_key=idempotency_key))
+    session.add(row)
+    return row
+
+
+def insert_entries(session, rows):
+    """Core-insert outbox rows (dicts from entry()) in the caller's transaction."""
+    if rows:
+        session.execute(insert(ChainOutbox.__table__), assign_ids(ChainOutbox.__table__, rows))
+
+
+def parse_key(value):
+    """Validate a client-supplied Idempotency-Key. Raises ValueError."""
+    if not value or len(value) > MAX_KEY_LENGTH or not value.isprintable():
+        raise ValueError(f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} printable characters")
+    return value
+
+
+def backoff(attempts):
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def claim(session, worker, count, lease_seconds, now=None):
+    """Lease up to `count` due rows to `worker`, counting an attempt; returns their ids (the caller commits)."""
+    now = now or datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    due = (
+        select(ChainOutbox.id)
+        .where(text(QUEUE_CONDITION), ChainOutbox.available_at <= now)
+        .order_by(ChainOutbox.available_at)
+        .limit(count)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(ChainOutbox)
+        .where(ChainOutbox.id.in_(due.scalar_subquery()))
+        .values(claimed_by=worker, available_at=lease_until, attempts=ChainOutbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if session.get_bind().dialect.update_returning:
+        return list(session.execute(statement.returning(ChainOutbox.id)).scalars())
+    session.execute(statement)
+    return list(session.execute(
+        select(ChainOutbox.id).where(ChainOutbox.claimed_by == worker, ChainOutbox.available_at == lease_until)
+    ).scalars())
+
+
+def epoch_due(session, events, seconds, now=None):
+    """Whether the due rows make an anchoring epoch: `events` of them, one older than `seconds`, or one already sealed."""
+    now = now or datetime.utcnow()
+    due = (
+        select(ChainOutbox.created_at, ChainOutbox.tx_hash)
+        .where(text(QUEUE_CONDITION), ChainOutbox.available_at <= now)
+        .limit(events)
+        .subquery()
+    )
+    count, oldest, sealed = session.execute(
+        select(func.count(), func.min(due.c.created_at), func.count(due.c.tx_hash))
+    ).one()
+    return count >= events or sealed > 0 or (oldest is not None and oldest <= now - timedelta(seconds=seconds))
+
+
+def transaction_entries(rows):
+    return [(row.user_email, row.record_name, row.action) for row in rows]
+
+
+def counts():
+    """Outbox rows per status, over every shard."""
+    totals = dict.fromkeys(STATUSES, 0)
+    for part in fan_out(lambda: db.session.execute(
+        select(ChainOutbox.status, func.count()).group_by(ChainOutbox.status)
+    ).all()):
+        for status, n in part:
+            totals[status] = totals.get(status, 0) + n
+    return totals
+
+
+def describe(row):
+    return {
+        "idempotency_key": row.idempotency_key,
+        "status": row.status,
+        "action": row.action,
+        "record_name": row.record_name,
+        "attempts": row.attempts,
+        "transaction_hash": row.tx_hash if row.status == 'sent' else None,
+        "block_number": row.block_number,
+        "created_at": row.created_at.isoformat(),
+        "sent_at": row.sent_at.isoformat() if row.sent_at else None,
+        "last_error": row.last_error,
+    }
+
+
+class OutboxWorker:
+    """
+    Drains the chain outbox with `client` (a blockchain.AccessLoggerClient):
+    on a daemon thread after start(), or one pass per drain() call. A pass
+    claims a batch on every shard; the thread sleeps `poll_interval` only
+    when no batch came back full. A batch goes out as transactions of up
+    to `tx_events` rows and `tx_gas_limit` gas, or, in `mode` 'anchor', as
+    one anchorRoot transaction per epoch of up to `epoch_events` rows.
+    """
+
+    def __init__(self, app, client, batch_size=CHAIN_OUTBOX_BATCH_SIZE, poll_interval=CHAIN_OUTBOX_POLL_INTERVAL,
+                 receipt_timeout=CHAIN_OUTBOX_RECEIPT_TIMEOUT, max_attempts=CHAIN_OUTBOX_MAX_ATTEMPTS,
+                 tx_events=CHAIN_OUTBOX_TX_EVENTS, tx_gas_limit=CHAIN_OUTBOX_TX_GAS_LIMIT, mode=CHAIN_OUTBOX_MODE,
+                 epoch_events=anchoring.CHAIN_ANCHOR_EPOCH_EVENTS,
+                 epoch_seconds=anchoring.CHAIN_ANCHOR_EPOCH_SECONDS):
+        if mode not in DELIVERY_MODES:
+            raise ValueError(f"Unknown CHAIN_OUTBOX_MODE '{mode}'. Expected one of: {', '.join(DELIVERY_MODES)}")
+        self.app = app
+        self.client = client
+        self.mode = mode
+        self.batch_size = max(epoch_events if mode == 'anchor' else batch_size, 1)
+        self.tx_events = max(tx_events, 1)
+        self.tx_gas_limit = tx_gas_limit
+        self.epoch_seconds = epoch_seconds
+        self.poll_interval = poll_interval
+        self.receipt_timeout = receipt_timeout
+        self.max_attempts = max_attempts
+        # Outlives a full receipt wait, so another worker only takes over rows of a stuck or dead one.
+        self.lease_seconds = receipt_timeout * 2 + 60
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'transactions': 0, 'gas_used': 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='chain-outbox', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                busy = self.drain()
+            except Exception as e:
+                print(f"chain_outbox.py - drain failed, will retry: {e}")
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
+
+    def drain(self):
+        """One batch per shard. Returns True if a batch was full, so more rows may be due."""
+        with self.app.app_context():
+            shards = get_shards()
+        full = False
+        for index in range(len(shards.engines)) if shards is not None else [0]:
+            with self.app.app_context(), shard_scope(shard=index):
+                full = self._drain_batch() >= self.batch_size or full
+        return full
+
+    def _drain_batch(self):
+        if self.mode == 'anchor' and not epoch_due(db.session, self.batch_size, self.epoch_seconds):
+            return 0
+        ids = claim(db.session, self.name, self.batch_size, self.lease_seconds)
+        db.session.commit()
+        if not ids:
+            return 0
+        self.stats['batches'] += 1
+        rows = ChainOutbox.query.filter(ChainOutbox.id.in_(ids)).order_by(ChainOutbox.id).all()
+        try:
+            signed = self._sign(rows)
+        except Exception as e:
+            db.session.rollback()
+            self.client.resync()  # nonces allocated for the rolled back transactions were never used
+            for row in rows:
+                self._retry(row, e)
+            db.session.commit()
+            return len(rows)
+
+        unsent = {}
+        for tx_hash, raw_tx in signed.items():
+            try:
+                self.client.broadcast(raw_tx)
+            except Exception as e:
+                # Maybe mined by an earlier attempt (the node then refuses it again): the receipt decides.
+                unsent[tx_hash] = e
+        self._await_receipts(rows, unsent)
+        db.session.commit()
+        return len(rows)
+
+    def _sign(self, rows):
+        """
+        Sign transactions for the rows that have none and commit them before
+        anything is sent. Returns {tx hash: raw transaction} for every
+        transaction the rows are waiting on.
+        """
+        signed = self._raw_transactions(rows)
+        for row in rows:
+            if row.tx_hash is not None and row.tx_hash not in signed and self.client.receipt(row.tx_hash) is None:
+                # The rest of its batch gave up on the transaction while this row was not claimed.
+                row.tx_hash = None
+        unsigned = [row for row in rows if row.tx_hash is None]
+        # Nonces are allocated locally, round-robin over the client's accounts; anchors come from its primary one.
+        account = self.client.account if self.mode == 'anchor' else None
+        for batch, call, gas in self._transactions(unsigned) if unsigned else []:
+            tx_hash, raw_tx = self.client.sign_call(call, gas=gas, account=account)
+            for row in batch:
+                row.tx_hash = tx_hash
+            batch[0].raw_tx = signed[tx_hash] = raw_tx  # stored once per transaction
+            self.stats['transactions'] += 1
+        db.session.commit()
+        return signed
+
+    def _transactions(self, rows):
+        """(rows, contract call, gas or None) for each transaction that sends `rows`."""
+        if self.mode == 'anchor':
+            anchor = anchoring.seal(db.session, rows)
+            call = self.client.anchor_call(bytes.fromhex(anchor.root[2:]), anchor.leaf_count)
+            return [(rows, call, None)]
+        return [(batch, self.client.call(transaction_entries(batch)), gas) for batch, gas in self._pack(rows)]
+
+    def _raw_transactions(self, rows):
+        """Raw transactions of the rows' hashes, including ones stored on rows of the batch that are not claimed."""
+        signed = {row.tx_hash: row.raw_tx for row in rows if row.raw_tx is not None}
+        missing = {row.tx_hash for row in rows if row.tx_hash is not None} - signed.keys()
+        if missing:
+            signed.update(db.session.execute(
+                select(ChainOutbox.tx_hash, ChainOutbox.raw_tx)
+                .where(ChainOutbox.tx_hash.in_(missing), ChainOutbox.raw_tx.isnot(None))
+            ).all())
+        return signed
+
+    def _pack(self, rows):
+        """Split rows into (rows, gas) transactions of at most tx_events rows and tx_gas_limit gas, in order."""
+        todo = deque(rows[i:i + self.tx_events] for i in range(0, len(rows), self.tx_events))
+        packed = []
+        while todo:
+            batch = todo.popleft()
+            try:
+                gas = self.client.estimate_gas(transaction_entries(batch))
+            except Exception:
+                if len(batch) == 1:
+                    raise
+                gas = None  # typically over the node's block gas limit
+            if len(batch) > 1 and (gas is None or gas > self.tx_gas_limit):
+                half = len(batch) // 2
+                todo.extendleft([batch[half:], batch[:half]])
+                continue
+            packed.append((batch, gas))
+        return packed
+
+    def _await_receipts(self, rows, unsent):
+        pending = {}
+        for row in rows:
+            pending.setdefault(row.tx_hash, []).append(row)
+        deadline = time.monotonic() + self.receipt_timeout
+        while pending:
+            for tx_hash, batch in list(pending.items()):
+                try:
+                    receipt = self.client.receipt(tx_hash)
+                except Exception as e:
+                    for waiting in pending.values():
+                        for row in waiting:
+                            self._retry(row, e)
+                    return
+                if receipt is not None:
+                    del pending[tx_hash]
+                    self._settle(batch, receipt)
+                elif tx_hash in unsent:
+                    del pending[tx_hash]
+                    if isinstance(unsent[tx_hash], NonceTooLow):
+                        self.client.resync()
+                    for row in batch:
+                        if isinstance(unsent[tx_hash], NonceTooLow):
+                            # Another transaction took the nonce, so this one can never be mined: sign anew.
+                            row.raw_tx = row.tx_hash = None
+                        self._retry(row, unsent[tx_hash])
+            if pending and time.monotonic() >= deadline:
+                break
+            if pending:
+                time.sleep(RECEIPT_POLL_SECONDS)
+        if pending:
+            self.client.resync()  # in case the node dropped one, leaving a gap
+        for batch in pending.values():
+            for row in batch:
+                self._retry(row, f"no receipt after {self.receipt_timeout:g}s; will re-send")
+
+    def _settle(self, batch, receipt):
+        if receipt['status'] != 1:
+            # The nonce is spent either way, so a retry needs a new transaction.
+            for row in batch:
+                row.raw_tx = row.tx_hash = None
+                self._retry(row, f"transaction reverted in block {receipt['blockNumber']}")
+            return
+        now = datetime.utcnow()
+        for row in batch:
+            row.status = 'sent'
+            row.block_number = receipt['blockNumber']
+            row.sent_at = now
+            row.last_error = None
+        linked = [row.access_log_id for row in batch if row.access_log_id is not None]
+        if linked:
+            db.session.execute(
+                update(AccessLog).where(AccessLog.id.in_(linked)).values(tx_hash=batch[0].tx_hash)
+                .execution_options(synchronize_session=False)
+            )
+        self.stats['sent'] += len(batch)
+        self.stats['gas_used'] += receipt['gasUsed']
+
+    def _retry(self, row, error):
+        row.last_error = str(error)[:1000]
+        if row.attempts >= self.max_attempts:
+            row.status = 'failed'
+            self.stats['failed'] += 1
+        else:
+            row.available_at = datetime.utcnow() + timedelta(seconds=backoff(row.attempts))
+            self.stats['retried'] += 1
+
+
+def init_app(app, client=None):
+    """
+    Create the app's outbox worker when a chain is configured (see
+    app/blockchain.py) and, with CHAIN_OUTBOX_WORKER=thread, start it.
+    Without a chain, rows are still queued and sent once one is configured.
+    """
+    app.config.setdefault('CHAIN_OUTBOX_WORKER', CHAIN_OUTBOX_WORKER)
+    app.config.setdefault('CHAIN_OUTBOX_BATCH_SIZE', CHAIN_OUTBOX_BATCH_SIZE)
+    app.config.setdefault('CHAIN_OUTBOX_POLL_INTERVAL', CHAIN_OUTBOX_POLL_INTERVAL)
+    app.config.setdefault('CHAIN_OUTBOX_RECEIPT_TIMEOUT', CHAIN_OUTBOX_RECEIPT_TIMEOUT)
+    app.config.setdefault('CHAIN_OUTBOX_MAX_ATTEMPTS', CHAIN_OUTBOX_MAX_ATTEMPTS)
+    app.config.setdefault('CHAIN_OUTBOX_TX_EVENTS', CHAIN_OUTBOX_TX_EVENTS)
+    app.config.setdefault('CHAIN_OUTBOX_TX_GAS_LIMIT', CHAIN_OUTBOX_TX_GAS_LIMIT)
+    app.config.setdefault('CHAIN_OUTBOX_MODE', CHAIN_OUTBOX_MODE)
+    app.config.setdefault('CHAIN_ANCHOR_EPOCH_EVENTS', anchoring.CHAIN_ANCHOR_EPOCH_EVENTS)
+    app.config.setdefault('CHAIN_ANCHOR_EPOCH_SECONDS', anchoring.CHAIN_ANCHOR_EPOCH_SECONDS)
+    mode = app.config['CHAIN_OUTBOX_WORKER']
+    if mode not in WORKER_MODES:
+        raise ValueError(f"Unknown CHAIN_OUTBOX_WORKER '{mode}'. Expected one of: {', '.join(WORKER_MODES)}")
+    if client is None:
+        from .. import blockchain
+        client = blockchain.get_client()
+    worker = None
+    if client is not None:
+        worker = OutboxWorker(
+            app, client,
+            batch_size=app.config['CHAIN_OUTBOX_BATCH_SIZE'],
+            poll_interval=app.config['CHAIN_OUTBOX_POLL_INTERVAL'],
+            receipt_timeout=app.config['CHAIN_OUTBOX_RECEIPT_TIMEOUT'],
+            max_attempts=app.config['CHAIN_OUTBOX_MAX_ATTEMPTS'],
+            tx_events=app.config['CHAIN_OUTBOX_TX_EVENTS'],
+            tx_gas_limit=app.config['CHAIN_OUTBOX_TX_GAS_LIMIT'],
+            mode=app.config['CHAIN_OUTBOX_MODE'],
+            epoch_events=app.config['CHAIN_ANCHOR_EPOCH_EVENTS'],
+            epoch_seconds=app.config['CHAIN_ANCHOR_EPOCH_SECONDS']
+        )
+        if mode == 'thread':
+            worker.start()
+    app.extensions['chain_outbox'] = worker
+    return worker
@@ -0,0 +1,207 @@
+# app/services/chunked_upload.py
+import hashlib
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process (the dev server), so a lock per process will do
+    fcntl = None
+
+# Partial uploads live next to their final destination so the commit
+# rename never crosses a filesystem boundary.
+PARTIAL_DIR_NAME = '.partial'
+COPY_BUFFER_SIZE = 64 * 1024
+
+# upload_id -> (offset, sha256 object). The hash object cannot be persisted,
+# so it is cached per process and rebuilt from the partial file on a miss
+# (another worker took the previous chunk, or the process restarted). The
+# bytes before an acknowledged offset never change, so a cached state for
+# that exact offset is always valid.
+_hashers = {}
+_locks = {}  # upload_id -> threading.Lock, without fcntl only
+_registry_lock = threading.Lock()
+
+
+def partial_dir(upload_folder):
+    path = os.path.join(upload_folder, PARTIAL_DIR_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def partial_path(upload_folder, upload_id):
+    return os.path.join(partial_dir(upload_folder), f"{upload_id}.part")
+
+
+@contextmanager
+def upload_lock(upload_folder, upload_id):
+    """
+    Serialise chunk writes, the commit and the abort of one upload across
+    threads and worker processes: flock on its partial file, taken on a
+    descriptor of its own so two requests in one process exclude each
+    other too. Without a partial file (unknown id, or already committed or
+    aborted) there is nothing to protect; the caller finds the session's
+    state and refuses. Without fcntl (Windows) the lock is per process.
+    """
+    if fcntl is None:
+        with _registry_lock:
+            lock = _locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            yield
+        return
+    try:
+        f = open(partial_path(upload_folder, os.path.basename(upload_id)), 'rb')
+    except (FileNotFoundError, ValueError):
+        f = None
+    if f is None:
+        yield
+        return
+    with f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # released when f is closed
+        yield
+
+
+def create_partial(upload_folder, upload_id):
+    """Create the empty temp file for a new upload."""
+    path = partial_path(upload_folder, upload_id)
+    open(path, 'wb').close()
+    with _registry_lock:
+        _hashers[upload_id] = (0, hashlib.sha256())
+    return path
+
+
+def _hasher_at(path, upload_id, offset):
+    """Return a sha256 object covering exactly the first `offset` bytes of the file."""
+    with _registry_lock:
+        cached = _hashers.get(upload_id)
+    if cached and cached[0] == offset:
+        return cached[1].copy()
+
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(path, 'rb') as f:
+        while remaining:
+            block = f.read(min(COPY_BUFFER_SIZE, remaining))
+            if not block:
+                raise ValueError("Partial upload is shorter than the acknowledged size")
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def append_chunk(upload_folder, upload_id, offset, stream, max_bytes):
+    """
+    Append one chunk read from `stream` at byte `offset` of the partial file.
+    Anything past `offset` (left by an interrupted chunk) is discarded first.
+    Returns the number of bytes written.
+    """
+    path = partial_path(upload_folder, upload_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError("Partial upload data is missing")
+
+    hasher = _hasher_at(path, upload_id, offset)
+    written = 0
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        while True:
+            block = stream.read(COPY_BUFFER_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if written > max_bytes:
+                raise ValueError(f"Chunk exceeds the maximum size of {max_bytes} bytes")
+            f.write(block)
+            hasher.update(block)
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Only publish the new hash state once the chunk is fully on disk.
+    with _registry_lock:
+        _hashers[upload_id] = (offset + written, hasher)
+    return written
+
+
+def current_digest(upload_folder, upload_id, offset):
+    """Return the hex SHA-256 of the first `offset` bytes received so far."""
+    return _hasher_at(partial_path(upload_folder, upload_id), upload_id, offset).hexdigest()
+
+
+def finalize(upload_folder, upload_id, offset):
+    """
+    Seal a completed upload: drop any bytes past `offset` and return
+    (path, hex SHA-256). The caller moves the file into the blob store.
+    """
+    path = partial_path(upload_folder, upload_id)
+    hasher = _hasher_at(path, upload_id, offset)
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
+    forget(upload_id)
+    return path, hasher.hexdigest()
+
+
+def spool_stream(upload_folder, stream):
+    """
+    Single-request counterpart of append_chunk + finalize: copy `stream` into
+    a temp file while hashing. Returns (path, hex SHA-256, size).
+    """
+    tmp_path = os.path.join(partial_dir(upload_folder), f"{uuid.uuid4().hex}.part")
+    reader = HashingReader(stream)
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                block = reader.read(COPY_BUFFER_SIZE)
+                if not block:
+                    break
+                f.write(block)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, reader.hexdigest(), reader.bytes_read
+
+
+def file_digest(path):
+    """Hex SHA-256 of a file on disk, read in fixed-size blocks."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BUFFER_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class HashingReader:
+    """File-like wrapper that feeds everything read through it into a SHA-256."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hasher = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        block = self.stream.read(size)
+        self.hasher.update(block)
+        self.bytes_read += len(block)
+        return block
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+def discard(upload_folder, upload_id):
+    """Remove the temp file and cached state of an abandoned upload."""
+    path = partial_path(upload_folder, upload_id)
+    if os.path.exists(path):
+        os.remove(path)
+    forget(upload_id)
+
+
+def forget(upload_id):
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
@@ -0,0 +1,49 @@
+# app/services/http_cache.py
+from flask import request, Response
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified
+
+
+def not_modified_response(etag, last_modified=None):
+    """
+    Return a 304 response if the request's If-None-Match / If-Modified-Since
+    headers show the client already holds this version, otherwise None.
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = Response(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def requested_range(size, etag, last_modified=None):
+    """
+    Return the (start, stop) byte span the client asked for, or None when the
+    whole body should be sent (no Range header, or a stale If-Range).
+    Raises RequestedRangeNotSatisfiable for ranges outside the resource.
+    """
+    byte_range = request.range
+    if byte_range is None:
+        return None
+    if 'If-Range' in request.headers and not _if_range_matches(etag, last_modified):
+        return None
+    span = byte_range.range_for_length(size)
+    if span is None:
+        raise RequestedRangeNotSatisfiable(length=size)
+    return span
+
+
+def set_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Accept-Ranges'] = 'bytes'
+
+
+def _if_range_matches(etag, last_modified):
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None and last_modified is not None:
+        return last_modified.replace(microsecond=0) == if_range.date
+    return False
@@ -0,0 +1,101 @@
+# app/services/pagination.py
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import or_
+
+# Keyset pagination: pages are ordered newest first by (timestamp, id) and a
+# cursor holds the last row's (timestamp, id). Each page is an index range
+# scan that starts at the cursor, so page 1000 costs the same as page 1
+# (unlike OFFSET, which reads and discards every earlier row).
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class CursorError(ValueError):
+    """Raised for a malformed ?cursor= or ?limit=."""
+
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+
+
+def page_args():
+    """Parse ?cursor=&limit= into (after, limit); `after` is None for the first page."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit <= 0:
+        raise CursorError("limit must be > 0")
+    cursor = request.args.get('cursor')
+    return (decode_cursor(cursor) if cursor else None), min(limit, MAX_PAGE_SIZE)
+
+
+def _after(query, ts_col, id_col, after):
+    if after is None:
+        return query
+    timestamp, row_id = after
+    # `ts <= t` bounds the index range; the OR only breaks ties on equal timestamps.
+    return query.filter(ts_col <= timestamp, or_(ts_col < timestamp, id_col < row_id))
+
+
+def _cursor_after(rows, ts_col, limit):
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(getattr(last, ts_col.key), last.id)
+
+
+def keyset_rows(query, ts_col, id_col, after, limit):
+    """The rows of one page of `query` after the cursor, plus one more (which tells whether a next page exists)."""
+    return _after(query, ts_col, id_col, after).order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+
+def keyset_page(query, ts_col, id_col, after, limit):
+    """
+    One page of `query` ordered by (ts_col, id_col) descending, starting
+    after the cursor position. Returns (rows, next_cursor); next_cursor is
+    None on the last page.
+    """
+    return _cursor_after(keyset_rows(query, ts_col, id_col, after, limit), ts_col, limit)
+
+
+def keyset_items(query, ts_col, id_col, after, limit, serialize):
+    """
+    keyset_rows() as plain (timestamp, id, serialize(row)) tuples, for
+    fan_out(), whose per-shard sessions close before the rows are used.
+    """
+    return [(getattr(row, ts_col.key), row.id, serialize(row))
+            for row in keyset_rows(query, ts_col, id_col, after, limit)]
+
+
+def merge_pages(item_lists, limit):
+    """
+    One page out of several keyset_items() results with the same cursor
+    (the branches of an OR, or the shards of a fan-out). Returns (items,
+    next_cursor) with the serialized items.
+    """
+    merged = {}
+    for items in item_lists:
+        for timestamp, row_id, item in items:
+            merged[row_id] = (timestamp, row_id, item)
+    ordered = sorted(merged.values(), key=lambda entry: entry[:2], reverse=True)
+    next_cursor = encode_cursor(*ordered[limit - 1][:2]) if len(ordered) > limit else None
+    return [item for _, _, item in ordered[:limit]], next_cursor
+
+
+def with_next_cursor(response, next_cursor):
+    """Also expose the cursor as a header, for endpoints whose body is a bare list."""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
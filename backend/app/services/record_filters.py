@@ -0,0 +1,70 @@
+# app/services/record_filters.py
+import mimetypes
+from datetime import datetime
+from ..models import Record
+
+# Server-side filters for a patient's record listing. Each filter has a
+# composite index that starts with patient_id and ends with uploaded_at, so
+# the filtered listing is still one index range scan in keyset order:
+#
+#   ?from=&to=    ix_record_patient_uploaded
+#   ?type=        ix_record_patient_type_uploaded
+#   ?uploader=    ix_record_patient_uploader_uploaded
+#   ?prefix=      ix_record_filename (stored names start with "<patient>_")
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def content_type_for(filename):
+    return mimetypes.guess_type(filename)[0] or DEFAULT_CONTENT_TYPE
+
+
+def parse_filters(args):
+    """
+    Read ?from=&to=&type=&prefix=&uploader= into a dict of the filters
+    present. `type` is a MIME type or a file extension ("pdf", ".docx").
+    Raises ValueError.
+    """
+    filters = {}
+    try:
+        if args.get('from'):
+            filters['from'] = datetime.fromisoformat(args['from'])
+        if args.get('to'):
+            filters['to'] = datetime.fromisoformat(args['to'])
+    except ValueError:
+        raise ValueError("from and to must be ISO dates or datetimes")
+    if 'from' in filters and 'to' in filters and filters['from'] >= filters['to']:
+        raise ValueError("from must be before to")
+    if args.get('type'):
+        kind = args['type'].lower()
+        if '/' not in kind:
+            guessed = mimetypes.guess_type(f"file.{kind.lstrip('.')}")[0]
+            if not guessed:
+                raise ValueError(f"Unknown file type '{args['type']}'")
+            kind = guessed
+        filters['type'] = kind
+    if args.get('prefix'):
+        filters['prefix'] = args['prefix']
+    if args.get('uploader'):
+        filters['uploader'] = args['uploader']
+    return filters
+
+
+def prefix_bounds(prefix):
+    """[low, high) string bounds matching every value starting with `prefix`; an index range unlike LIKE."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def apply_filters(query, patient_email, filters):
+    """Narrow a Record query for one patient by the parsed filters."""
+    if 'from' in filters:
+        query = query.filter(Record.uploaded_at >= filters['from'])
+    if 'to' in filters:
+        query = query.filter(Record.uploaded_at < filters['to'])
+    if 'type' in filters:
+        query = query.filter(Record.content_type == filters['type'])
+    if 'uploader' in filters:
+        query = query.filter(Record.uploaded_by == filters['uploader'])
+    if 'prefix' in filters:
+        low, high = prefix_bounds(f"{patient_email}_{filters['prefix']}")
+        query = query.filter(Record.filename >= low, Record.filename < high)
+    return query
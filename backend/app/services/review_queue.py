@@ -0,0 +1,107 @@
+# app/services/review_queue.py
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text, update
+from ..database import fan_out, get_shards
+from ..models import db, MedicalForm
+
+# Pending forms are a work queue. A form can be claimed once its
+# available_at has passed: new forms are available from submission, and a
+# claim pushes available_at to the end of the claimant's lease, so a lease
+# that is neither renewed nor completed simply expires and the form is
+# claimable again. No sweeper is needed.
+#
+# The claim is one UPDATE ... WHERE id IN (oldest N available) against the
+# partial index ix_medical_form_queue ((status, available_at) over pending
+# forms only; status leads so the planner prefers it to the status index):
+# an O(log n) seek, atomic under SQLite's write lock, and SKIP LOCKED on
+# databases with row locks, so concurrent doctors never get the same form.
+# On a sharded database each shard has its own queue; a claim visits the
+# shards in the order of their longest-waiting form (shard_order).
+QUEUE_CONDITION = "status = 'pending'"  # must match the index predicate literally
+DEFAULT_LEASE_SECONDS = 15 * 60
+MAX_LEASE_SECONDS = 4 * 60 * 60
+DEFAULT_CLAIM = 5
+MAX_CLAIM = 50
+
+
+class LeaseError(Exception):
+    """Raised when a doctor acts on a form whose lease another doctor holds."""
+
+
+def holds_lease(form, doctor_email, now=None):
+    now = now or datetime.utcnow()
+    return form.claimed_by == doctor_email and form.available_at is not None and form.available_at > now
+
+
+def leased_to_other(form, doctor_email, now=None):
+    now = now or datetime.utcnow()
+    return (form.status == 'pending' and form.claimed_by not in (None, doctor_email)
+            and form.available_at is not None and form.available_at > now)
+
+
+def claim(session, doctor_email, count=DEFAULT_CLAIM, lease_seconds=DEFAULT_LEASE_SECONDS, now=None):
+    """
+    Atomically lease up to `count` of the longest-available pending forms to
+    `doctor_email` for `lease_seconds`. Returns the claimed form ids (the
+    caller commits).
+    """
+    now = now or datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    available = (
+        select(MedicalForm.id)
+        .where(text(QUEUE_CONDITION), MedicalForm.available_at <= now)
+        .order_by(MedicalForm.available_at)
+        .limit(count)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(MedicalForm)
+        .where(MedicalForm.id.in_(available.scalar_subquery()))
+        .values(claimed_by=doctor_email, available_at=lease_until)
+        .execution_options(synchronize_session=False)
+    )
+    dialect = session.get_bind().dialect
+    if dialect.update_returning:
+        return list(session.execute(statement.returning(MedicalForm.id)).scalars())
+    session.execute(statement)
+    return list(session.execute(
+        select(MedicalForm.id).where(MedicalForm.claimed_by == doctor_email, MedicalForm.available_at == lease_until)
+    ).scalars())
+
+
+def shard_order(now=None):
+    """Indexes of the shards with claimable forms, the one whose oldest form has waited longest first."""
+    if get_shards() is None:
+        return [0]
+    now = now or datetime.utcnow()
+    heads = fan_out(lambda: db.session.execute(
+        select(func.min(MedicalForm.available_at)).where(text(QUEUE_CONDITION), MedicalForm.available_at <= now)
+    ).scalar())
+    return [shard for head, shard in sorted((head, shard) for shard, head in enumerate(heads) if head is not None)]
+
+
+def renew(form, doctor_email, lease_seconds=DEFAULT_LEASE_SECONDS, now=None):
+    """Extend the caller's lease on `form`; also re-claims it if the lease lapsed and nobody else took it."""
+    now = now or datetime.utcnow()
+    if form.status != 'pending' or leased_to_other(form, doctor_email, now):
+        raise LeaseError("Form is claimed by another doctor" if form.status == 'pending' else "Form is not pending")
+    form.claimed_by = doctor_email
+    form.available_at = now + timedelta(seconds=lease_seconds)
+
+
+def release(form, doctor_email, now=None):
+    """Give a claimed form back to the queue immediately."""
+    now = now or datetime.utcnow()
+    if not holds_lease(form, doctor_email, now):
+        raise LeaseError("You do not hold a lease on this form")
+    form.claimed_by = None
+    form.available_at = now
+
+
+def claim_args(data):
+    """Read {count, lease_seconds} from a claim request body. Raises ValueError."""
+    count = int(data.get('count', DEFAULT_CLAIM))
+    lease_seconds = int(data.get('lease_seconds', DEFAULT_LEASE_SECONDS))
+    if count <= 0 or lease_seconds <= 0:
+        raise ValueError("count and lease_seconds must be > 0")
+    return min(count, MAX_CLAIM), min(lease_seconds, MAX_LEASE_SECONDS)
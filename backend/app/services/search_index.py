@@ -0,0 +1,189 @@
+# app/services/search_index.py
+import hashlib
+import json
+import re
+from sqlalchemy import text
+from ..database import fan_out
+from ..models import db
+
+# Full-text search over record text and medical form contents, kept in an
+# SQLite FTS5 table in the main database (in each shard, when sharded) and
+# updated in the same transaction as the record / form it describes.
+# Records use their id as rowid and forms the negated id, so re-indexing or
+# removing a document is a rowid lookup.
+#
+# Every document carries an `owner` token (a hash of the patient's email) in
+# its own column; per-patient queries AND it into the MATCH expression, so
+# FTS5 intersects posting lists instead of filtering every hit afterwards.
+TABLE = 'search_index'
+MAX_INDEXED_BYTES = 2 * 1024 * 1024  # text beyond this is not indexed
+MAX_QUERY_TERMS = 16
+DEFAULT_RESULTS = 20
+MAX_RESULTS = 100
+SNIPPET_OPEN = '<mark>'
+SNIPPET_CLOSE = '</mark>'
+SNIPPET_TOKENS = 16
+KINDS = ('record', 'form')
+
+# bm25 column weights: owner (never ranked), title, body
+_RANK = f"bm25({TABLE}, 0.0, 5.0, 1.0)"
+_TERM = re.compile(r'\w+\*?')
+_INSERT = text(
+    f"INSERT INTO {TABLE} (rowid, owner, title, body, kind, doc_id, patient_id, created_at) "
+    "VALUES (:rowid, :owner, :title, :body, :kind, :doc_id, :patient_id, :created_at)"
+)
+
+
+def available(session):
+    """FTS5 needs SQLite; on other databases indexing is skipped and search is unavailable."""
+    return session.get_bind().dialect.name == 'sqlite'
+
+
+def create_table(conn):
+    conn.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "owner, title, body, kind UNINDEXED, doc_id UNINDEXED, patient_id UNINDEXED, created_at UNINDEXED, "
+        "tokenize='porter unicode61')"
+    )
+
+
+def owner_token(patient_id):
+    return 'p' + hashlib.sha1(patient_id.lower().encode('utf-8')).hexdigest()
+
+
+def read_text(text_path):
+    """The first MAX_INDEXED_BYTES of an extracted text file."""
+    if not text_path:
+        return ''
+    with open(text_path, 'rb') as f:
+        return f.read(MAX_INDEXED_BYTES).decode('utf-8', errors='ignore')
+
+
+def form_text(form_data):
+    """Flatten form_data into "field: value" lines, so both field names and values are searchable."""
+    lines = []
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix} {key}".strip(), item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(prefix, item)
+        elif value not in (None, ''):
+            lines.append(f"{prefix.replace('_', ' ')}: {value}")
+
+    walk('', form_data)
+    return '\n'.join(lines)
+
+
+def _put(session, rowid, kind, doc_id, patient_id, title, body, created_at):
+    session.execute(text(f"DELETE FROM {TABLE} WHERE rowid = :rowid"), {'rowid': rowid})
+    session.execute(
+        _INSERT,
+        {
+            'rowid': rowid, 'owner': owner_token(patient_id), 'title': title, 'body': body,
+            'kind': kind, 'doc_id': doc_id, 'patient_id': patient_id,
+            'created_at': created_at.isoformat() if created_at else None,
+        }
+    )
+
+
+def record_entry(record_id, patient_id, filename, uploaded_at, body):
+    return dict(rowid=record_id, kind='record', doc_id=record_id, patient_id=patient_id,
+                title=filename, body=body, created_at=uploaded_at)
+
+
+def form_entry(form_id, patient_email, form_type, form_data, submitted_at):
+    return dict(rowid=-form_id, kind='form', doc_id=form_id, patient_id=patient_email,
+                title=form_type.replace('_', ' '), body=form_text(form_data), created_at=submitted_at)
+
+
+def index_record(session, record, text_path=None):
+    """(Re-)index a flushed record: its filename, plus its extracted text when available."""
+    if available(session):
+        _put(session, **record_entry(record.id, record.patient_id, record.filename, record.uploaded_at,
+                                     read_text(text_path)))
+
+
+def index_form(session, form, form_data):
+    """(Re-)index a flushed MedicalForm; `form_data` is the decoded dict."""
+    if available(session):
+        _put(session, **form_entry(form.id, form.patient_email, form.form_type, form_data, form.submitted_at))
+
+
+def remove_record(session, record_id):
+    if available(session):
+        session.execute(text(f"DELETE FROM {TABLE} WHERE rowid = :rowid"), {'rowid': record_id})
+
+
+def index_entries(conn, entries):
+    """Bulk insert entries from record_entry / form_entry (backfill; rows must not exist yet)."""
+    conn.execute(
+        _INSERT,
+        [dict(e, owner=owner_token(e['patient_id']),
+              created_at=e['created_at'].isoformat() if e['created_at'] else None) for e in entries]
+    )
+
+
+def match_expression(query, patient_id=None):
+    """
+    Turn free text into an FTS5 MATCH expression: every word is a quoted
+    term (so FTS5 operators in user input are inert), terms are ANDed, and
+    a trailing * keeps prefix matching. Raises ValueError for an empty query.
+    """
+    terms = []
+    for term in _TERM.findall(query)[:MAX_QUERY_TERMS]:
+        prefix = term.endswith('*')
+        word = term.rstrip('*')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    expression = '{title body}: (' + ' '.join(terms) + ')'
+    if patient_id is not None:
+        expression = f'owner: "{owner_token(patient_id)}" AND {expression}'
+    return expression
+
+
+def search(session, query, patient_id=None, kind=None, limit=DEFAULT_RESULTS, offset=0):
+    """Best-ranked documents matching `query` with highlighted snippets. Raises ValueError for a bad query."""
+    sql = (
+        f"SELECT kind, doc_id, patient_id, title, created_at, "
+        f"snippet({TABLE}, 2, :open, :close, '…', :tokens) AS snippet, {_RANK} AS score "
+        f"FROM {TABLE} WHERE {TABLE} MATCH :match"
+    )
+    params = {
+        'match': match_expression(query, patient_id), 'open': SNIPPET_OPEN, 'close': SNIPPET_CLOSE,
+        'tokens': SNIPPET_TOKENS, 'limit': limit, 'offset': offset,
+    }
+    if kind is not None:
+        sql += " AND kind = :kind"
+        params['kind'] = kind
+    sql += " ORDER BY score LIMIT :limit OFFSET :offset"
+    return [
+        {
+            "type": row.kind,
+            "id": int(row.doc_id),
+            "patient_id": row.patient_id,
+            "title": row.title,
+            "created_at": row.created_at,
+            "snippet": row.snippet,
+            "score": round(-row.score, 4),  # bm25 is lower-is-better; report higher-is-better
+        }
+        for row in session.execute(text(sql), params)
+    ]
+
+
+def search_all(query, kind=None, limit=DEFAULT_RESULTS, offset=0):
+    """search() over every patient's documents; shards are searched in parallel and their hits merged by score."""
+    pages = fan_out(lambda: search(db.session, query, kind=kind, limit=offset + limit))
+    hits = sorted((hit for page in pages for hit in page), key=lambda hit: hit['score'], reverse=True)
+    return hits[offset:offset + limit]
+
+
+def decode_form_data(raw):
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
@@ -0,0 +1,258 @@
+# app/services/text_extraction.py
+import codecs
+import os
+import sys
+import threading
+import uuid
+from array import array
+
+# Extracted plain text is cached on disk keyed by the record's content hash,
+# so a record is parsed once no matter how often (or by whom) it is previewed.
+DERIVED_TEXT_CACHE_DIR = os.getenv('DERIVED_TEXT_CACHE_DIR', os.path.join('uploads', '.derived'))
+DERIVED_TEXT_CACHE_BYTES = int(os.getenv('DERIVED_TEXT_CACHE_BYTES', 512 * 1024 * 1024))
+
+COPY_BUFFER_SIZE = 64 * 1024
+INDEX_BUFFER_SIZE = 1024 * 1024
+
+# Line index sidecars are arrays of little-endian uint64 line-start offsets.
+LINE_OFFSET_SIZE = 8
+
+
+class ExtractionError(Exception):
+    """Raised when a file cannot be turned into text."""
+
+
+def _extract_txt(source_path, out):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    with open(source_path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BUFFER_SIZE)
+            if not block:
+                break
+            out.write(decoder.decode(block))
+    out.write(decoder.decode(b'', final=True))
+
+
+def _extract_pdf(source_path, out):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractionError("PDF preview requires the 'pypdf' package")
+    reader = PdfReader(source_path)
+    for number, page in enumerate(reader.pages):
+        if number:
+            out.write('\n\n')
+        out.write(page.extract_text() or '')
+
+
+def _extract_docx(source_path, out):
+    try:
+        import docx
+    except ImportError:
+        raise ExtractionError("DOCX preview requires the 'python-docx' package")
+    document = docx.Document(source_path)
+    for paragraph in document.paragraphs:
+        out.write(paragraph.text + '\n')
+    for table in document.tables:
+        for row in table.rows:
+            out.write('\t'.join(cell.text for cell in row.cells) + '\n')
+
+
+EXTRACTORS = {
+    'txt': _extract_txt,
+    'pdf': _extract_pdf,
+    'docx': _extract_docx,
+}
+
+
+def file_type(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+class DerivedTextCache:
+    """
+    Directory of UTF-8 text files named by content hash, kept under a byte
+    budget with least-recently-used eviction (file mtime is the LRU clock).
+    Writes go through a temp file and os.replace, so several workers can
+    share the directory.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, f"{digest}.txt")
+
+    def index_path_for(self, text_path):
+        return text_path[:-len('.txt')] + '.idx'
+
+    def line_index(self, text_path):
+        """
+        Return the line-offset sidecar of a cached text file, building it on
+        first use. Workers that build it at the same time each replace it
+        atomically with the same offsets. Another worker's evict() may still
+        delete the text or its index before they are read: read_page() and
+        read_lines() then raise FileNotFoundError, and the caller extracts
+        the text again (get_or_extract).
+        """
+        index_path = self.index_path_for(text_path)
+        try:
+            os.stat(index_path)
+        except FileNotFoundError:
+            build_line_index(text_path, index_path)
+        return index_path
+
+    def get(self, digest):
+        """Return the cached text path for `digest` (marking it recently used), or None."""
+        path = self.path_for(digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_extract(self, digest, filename, open_source):
+        """
+        Return the cached text path for `digest`, extracting it first on a miss.
+        `open_source` is a callable returning a local path to the original file.
+        """
+        path = self.get(digest)
+        if path:
+            return path
+
+        extractor = EXTRACTORS.get(file_type(filename))
+        if extractor is None:
+            raise ExtractionError(f"No text extractor for '{filename}'")
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(digest)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+                extractor(open_source(), out)
+            os.replace(tmp_path, path)
+        except ExtractionError:
+            raise
+        except Exception as e:
+            raise ExtractionError(f"Could not extract text from '{filename}': {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits its budget."""
+        with self._evict_lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                # A text file and its line index are evicted together.
+                size = stat.st_size
+                index_path = self.index_path_for(entry.path)
+                if os.path.exists(index_path):
+                    size += os.path.getsize(index_path)
+                entries.append((stat.st_mtime, size, entry.path))
+                total += size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                for victim in (path, self.index_path_for(path)):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+
+def read_page(text_path, offset, limit):
+    """
+    Read up to `limit` bytes of cached UTF-8 text starting at byte `offset`,
+    never splitting a multi-byte character. Returns (text, next_offset, total_bytes);
+    next_offset is None on the last page.
+    """
+    with open(text_path, 'rb') as f:
+        # Sized through the open file: an eviction after open() cannot change what is read.
+        total = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(limit)
+    end = len(data)
+    if offset + end < total:
+        # Back off to the start of an incomplete trailing character.
+        while end > 0 and (data[end - 1] & 0xC0) == 0x80:
+            end -= 1
+        if end > 0 and data[end - 1] >= 0xC0:
+            end -= 1
+        if end == 0:
+            end = len(data)
+    text = data[:end].decode('utf-8', errors='replace')
+    next_offset = offset + end
+    return text, (next_offset if next_offset < total else None), total
+
+
+def build_line_index(text_path, index_path):
+    """Write the byte offset of every line start in `text_path` to `index_path`."""
+    offsets = array('Q', [0])
+    position = 0
+    with open(text_path, 'rb') as f:
+        while True:
+            block = f.read(INDEX_BUFFER_SIZE)
+            if not block:
+                break
+            found = block.find(b'\n')
+            while found != -1:
+                offsets.append(position + found + 1)
+                found = block.find(b'\n', found + 1)
+            position += len(block)
+    if offsets[-1] == position:
+        offsets.pop()  # a trailing newline (or an empty file) does not start another line
+    if offsets.itemsize != LINE_OFFSET_SIZE:
+        raise RuntimeError("Platform has no 8-byte unsigned array type")
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+
+    tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as out:
+        offsets.tofile(out)
+    os.replace(tmp_path, index_path)
+
+
+def read_lines(text_path, index_path, start_line, count):
+    """
+    Read `count` lines starting at `start_line` (0-based) by looking up their
+    byte span in the line index: two 8-byte reads plus one read of the text,
+    whatever the file size or position. Returns (text, next_line, total_lines);
+    next_line is None once the end is reached.
+    """
+    # Both files are opened first, so an eviction in between raises here rather than mid-read.
+    with open(text_path, 'rb') as f, open(index_path, 'rb') as idx:
+        total_lines = os.fstat(idx.fileno()).st_size // LINE_OFFSET_SIZE
+        if start_line >= total_lines:
+            return '', None, total_lines
+        end_line = min(start_line + count, total_lines)
+
+        idx.seek(start_line * LINE_OFFSET_SIZE)
+        begin = int.from_bytes(idx.read(LINE_OFFSET_SIZE), 'little')
+        if end_line < total_lines:
+            idx.seek(end_line * LINE_OFFSET_SIZE)
+            end = int.from_bytes(idx.read(LINE_OFFSET_SIZE), 'little')
+        else:
+            end = os.fstat(f.fileno()).st_size
+
+        f.seek(begin)
+        text = f.read(end - begin).decode('utf-8', errors='replace')
+    return text, (end_line if end_line < total_lines else None), total_lines
+
+
+derived_text_cache = DerivedTextCache(DERIVED_TEXT_CACHE_DIR, DERIVED_TEXT_CACHE_BYTES)
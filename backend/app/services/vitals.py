@@ -0,0 +1,237 @@
+# app/services/vitals.py
+import json
+import math
+import re
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from ..models import db, VitalReading
+
+# Vitals forms are free-form JSON; each submission is also stored as one typed
+# VitalReading row. Trend queries load a patient's readings as a time array
+# plus an (n, metrics) float array (NaN = not measured) and do all the
+# bucketing, averaging and range checks with vectorized NumPy.
+METRICS = ('systolic', 'diastolic', 'heart_rate', 'temperature', 'spo2')
+
+# Adult reference ranges; readings outside them are flagged
+NORMAL_RANGES = {
+    'systolic': (90, 140),
+    'diastolic': (60, 90),
+    'heart_rate': (60, 100),
+    'temperature': (36.1, 37.8),
+    'spo2': (95, 100),
+}
+
+# form_data keys (lower-cased, punctuation stripped) accepted for each metric
+ALIASES = {
+    'systolic': 'systolic', 'bpsystolic': 'systolic', 'systolicbp': 'systolic',
+    'diastolic': 'diastolic', 'bpdiastolic': 'diastolic', 'diastolicbp': 'diastolic',
+    'heartrate': 'heart_rate', 'pulse': 'heart_rate', 'hr': 'heart_rate', 'bpm': 'heart_rate',
+    'temperature': 'temperature', 'temp': 'temperature', 'bodytemperature': 'temperature',
+    'spo2': 'spo2', 'oxygensaturation': 'spo2', 'o2sat': 'spo2', 'o2saturation': 'spo2',
+}
+BLOOD_PRESSURE_KEYS = ('bloodpressure', 'bp')
+TIMESTAMP_KEYS = ('recordedat', 'measuredat', 'datemeasured', 'takenat', 'date')
+
+BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+MAX_POINTS = 500  # bucket='auto' picks the smallest whole-hour bucket giving at most this many points
+DEFAULT_WINDOW = 7  # rolling average width, in buckets
+MAX_WINDOW = 365
+MAX_FLAGS = 100
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def _key(name):
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    match = _NUMBER.search(str(value))  # "72 bpm", "98.6F"
+    return float(match.group()) if match else None
+
+
+def parse_utc(value):
+    """An ISO date / datetime as naive UTC, the way readings are stored; an offset is converted, not dropped."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def extract_reading(form_data, submitted_at):
+    """
+    Typed values from a vitals form_data dict, or None when it holds no
+    recognised vital. Blood pressure may be "120/80" or {systolic, diastolic};
+    temperatures above 50 are taken as Fahrenheit.
+    """
+    if not isinstance(form_data, dict):
+        return None
+    values = {}
+    recorded_at = submitted_at
+    for name, value in form_data.items():
+        key = _key(name)
+        if key in ALIASES:
+            values[ALIASES[key]] = _number(value)
+        elif key in BLOOD_PRESSURE_KEYS:
+            if isinstance(value, dict):
+                parts = [value.get('systolic'), value.get('diastolic')]
+            else:
+                parts = (str(value).split('/') + [None])[:2]
+            values.setdefault('systolic', _number(parts[0]) if parts[0] is not None else None)
+            values.setdefault('diastolic', _number(parts[1]) if parts[1] is not None else None)
+        elif key in TIMESTAMP_KEYS and value:
+            try:
+                recorded_at = parse_utc(str(value))
+            except ValueError:
+                pass
+    if values.get('temperature') is not None and values['temperature'] > 50:
+        values['temperature'] = round((values['temperature'] - 32) * 5 / 9, 2)
+    values = {metric: value for metric, value in values.items() if value is not None}
+    if not values:
+        return None
+    return dict(recorded_at=recorded_at, **values)
+
+
+def reading_for_form(form, form_data):
+    """A VitalReading for a vitals MedicalForm, or None."""
+    if form.form_type != 'vitals':
+        return None
+    reading = extract_reading(form_data, form.submitted_at)
+    if reading is None:
+        return None
+    return VitalReading(patient_email=form.patient_email, form_id=form.id, **reading)
+
+
+def load_readings(patient_email, start=None, end=None):
+    """(times as datetime64[us], values as float64 (n, len(METRICS)) with NaN gaps), oldest first."""
+    # Timestamps skip SQLAlchemy's per-row datetime parsing: NumPy converts the
+    # whole column at once, from ISO strings (SQLite) or datetimes alike.
+    columns = [type_coerce(VitalReading.recorded_at, String)] + [getattr(VitalReading, metric) for metric in METRICS]
+    statement = select(*columns).where(VitalReading.patient_email == patient_email)
+    if start is not None:
+        statement = statement.where(VitalReading.recorded_at >= start)
+    if end is not None:
+        statement = statement.where(VitalReading.recorded_at < end)
+    statement = statement.order_by(VitalReading.recorded_at)
+    rows = db.session.connection(bind_arguments={'clause': statement}).execute(statement).all()
+    if not rows:
+        return np.empty(0, dtype='datetime64[us]'), np.empty((0, len(METRICS)))
+    columns = list(zip(*rows))
+    times = np.array(columns[0], dtype='datetime64[us]')
+    values = np.array(columns[1:], dtype=np.float64).T  # None -> NaN
+    return times, values
+
+
+def bucket_seconds_for(bucket, start, end):
+    if bucket in BUCKETS:
+        return BUCKETS[bucket]
+    span = max((end - start).total_seconds(), 1)
+    return max(1, math.ceil(span / MAX_POINTS / 3600)) * 3600
+
+
+def trend(times, values, bucket_seconds, window=DEFAULT_WINDOW):
+    """
+    Downsample readings into fixed buckets (aligned to the epoch) and
+    compute, per bucket and metric: mean / min / max / count, a rolling
+    mean over the last `window` buckets (weighted by readings, gaps count
+    as empty buckets) and the number of out-of-range readings. Also returns
+    the newest MAX_FLAGS individual out-of-range readings.
+    """
+    if len(times) == 0:
+        return {"buckets": [], "series": {metric: {} for metric in METRICS}, "flags": [], "readings": 0}
+
+    seconds = times.astype('datetime64[s]').astype(np.int64)
+    ids = seconds // bucket_seconds
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])  # times are sorted
+    bucket_ids = ids[starts]
+
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    counts = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    mins = np.fmin.reduceat(values, starts, axis=0)
+    maxs = np.fmax.reduceat(values, starts, axis=0)
+
+    low = np.array([NORMAL_RANGES[metric][0] for metric in METRICS])
+    high = np.array([NORMAL_RANGES[metric][1] for metric in METRICS])
+    with np.errstate(invalid='ignore'):
+        out_of_range = present & ((values < low) | (values > high))
+    out_counts = np.add.reduceat(out_of_range.astype(np.int64), starts, axis=0)
+
+    # Rolling window by time: bucket j covers ids (bucket_ids[j] - window, bucket_ids[j]].
+    zero = np.zeros((1, len(METRICS)))
+    sum_prefix = np.vstack([zero, np.cumsum(sums, axis=0)])
+    count_prefix = np.vstack([zero, np.cumsum(counts, axis=0)])
+    left = np.searchsorted(bucket_ids, bucket_ids - window + 1, side='left')
+    right = np.arange(1, len(bucket_ids) + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        rolling = (sum_prefix[right] - sum_prefix[left]) / (count_prefix[right] - count_prefix[left])
+
+    series = {}
+    for i, metric in enumerate(METRICS):
+        series[metric] = {
+            "mean": _json_list(means[:, i]),
+            "min": _json_list(mins[:, i]),
+            "max": _json_list(maxs[:, i]),
+            "count": counts[:, i].tolist(),
+            "rolling_mean": _json_list(rolling[:, i]),
+            "out_of_range": out_counts[:, i].tolist(),
+        }
+
+    rows, cols = np.nonzero(out_of_range)
+    flags = [
+        {
+            "recorded_at": str(times[row]),
+            "metric": METRICS[col],
+            "value": float(values[row, col]),
+            "normal_range": list(NORMAL_RANGES[METRICS[col]]),
+        }
+        for row, col in zip(rows[::-1][:MAX_FLAGS], cols[::-1][:MAX_FLAGS])
+    ]
+    bucket_times = (bucket_ids * bucket_seconds).astype('datetime64[s]')
+    return {
+        "buckets": [str(t) for t in bucket_times],
+        "series": series,
+        "flags": flags,
+        "readings": int(len(times)),
+    }
+
+
+def _json_list(array):
+    rounded = np.round(array, 2)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def parse_trend_args(args, now=None):
+    """Read ?start=&end=&bucket=&window= (ISO dates / datetimes). Raises ValueError."""
+    now = now or datetime.utcnow()
+    end = parse_utc(args['end']) if args.get('end') else now
+    start = parse_utc(args['start']) if args.get('start') else None
+    if start is not None and start >= end:
+        raise ValueError("start must be before end")
+    bucket = args.get('bucket', 'auto')
+    if bucket != 'auto' and bucket not in BUCKETS:
+        raise ValueError("bucket must be 'auto', 'hour', 'day' or 'week'")
+    window = int(args.get('window', DEFAULT_WINDOW))
+    if window <= 0:
+        raise ValueError("window must be > 0")
+    return start, end, bucket, min(window, MAX_WINDOW)
+
+
+def readings_from_forms(rows):
+    """VitalReading column dicts for (id, patient_email, form_data JSON, submitted_at) form rows; used by the backfill."""
+    readings = []
+    for form_id, patient_email, form_data, submitted_at in rows:
+        try:
+            reading = extract_reading(json.loads(form_data), submitted_at)
+        except ValueError:
+            continue
+        if reading is not None:
+            # Every row carries every column, so the backfill can bulk insert them.
+            readings.append(dict(dict.fromkeys(METRICS), patient_email=patient_email, form_id=form_id, **reading))
+    return readings
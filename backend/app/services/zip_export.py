@@ -0,0 +1,156 @@
+# app/services/zip_export.py
+import json
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Blobs fetched ahead of the one currently being written into the archive
+EXPORT_PREFETCH = int(os.getenv('EXPORT_PREFETCH', 4))
+COPY_BUFFER_SIZE = 64 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(EXPORT_PREFETCH, 1), thread_name_prefix='zip-export')
+        return _executor
+
+
+class ExportEntry:
+    """
+    One archive member. `fetch` returns a readable binary file object and
+    runs on the prefetch pool; `data` is used instead for small in-memory
+    members such as JSON dumps.
+    """
+
+    def __init__(self, arcname, fetch=None, data=None, modified=None, compress=False):
+        self.arcname = arcname
+        self.fetch = fetch
+        self.data = data
+        self.modified = modified or datetime.utcnow()
+        self.compress = compress
+
+    def zipinfo(self):
+        info = zipfile.ZipInfo(self.arcname, date_time=self.modified.timetuple()[:6])
+        # Scans and PDFs are already compressed; deflate only text such as the JSON dumps.
+        info.compress_type = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        return info
+
+
+class _StreamBuffer:
+    """Write-only sink for ZipFile; the generator drains it after every write burst."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _flush(sink):
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def _fetch(entry):
+    if entry.fetch is None:
+        return None
+    return entry.fetch()
+
+
+def stream_zip(entries, prefetch=EXPORT_PREFETCH):
+    """
+    Yield a ZIP archive of `entries` as it is built. The archive is written
+    to a non-seekable sink (ZipFile then uses data descriptors), so nothing
+    is buffered beyond the current block, and up to `prefetch` blob fetches
+    run ahead of the writer.
+    """
+    sink = _StreamBuffer()
+    pending = deque()
+    remaining = iter(entries)
+
+    def fill():
+        while len(pending) < max(prefetch, 1):
+            entry = next(remaining, None)
+            if entry is None:
+                return
+            pending.append((entry, executor().submit(_fetch, entry)))
+
+    try:
+        with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+            fill()
+            while pending:
+                entry, future = pending.popleft()
+                fill()
+                if entry.data is not None:
+                    archive.writestr(entry.zipinfo(), entry.data)
+                else:
+                    source = future.result()
+                    try:
+                        with archive.open(entry.zipinfo(), 'w', force_zip64=True) as member:
+                            while True:
+                                block = source.read(COPY_BUFFER_SIZE)
+                                if not block:
+                                    break
+                                member.write(block)
+                                yield from _flush(sink)
+                    finally:
+                        source.close()
+                yield from _flush(sink)
+        yield from _flush(sink)
+    finally:
+        # Client went away: close whatever was fetched ahead.
+        for _, future in pending:
+            if not future.cancel():
+                try:
+                    source = future.result()
+                    if source is not None:
+                        source.close()
+                except Exception:
+                    pass
+
+
+def medical_forms_entry(forms):
+    return ExportEntry("medical_forms.json", compress=True, data=json.dumps([
+        {
+            "id": f.id,
+            "form_type": f.form_type,
+            "form_data": json.loads(f.form_data),
+            "submitted_at": f.submitted_at.isoformat(),
+            "doctor_email": f.doctor_email,
+            "status": f.status
+        } for f in forms
+    ], indent=2))
+
+
+def prescriptions_entry(prescriptions):
+    return ExportEntry("prescriptions.json", compress=True, data=json.dumps([
+        {
+            "id": p.id,
+            "doctor_email": p.doctor_email,
+            "medication_name": p.medication_name,
+            "dosage": p.dosage,
+            "frequency": p.frequency,
+            "duration": p.duration,
+            "instructions": p.instructions,
+            "created_at": p.created_at.isoformat(),
+            "status": p.status
+        } for p in prescriptions
+    ], indent=2))
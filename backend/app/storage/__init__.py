@@ -0,0 +1,64 @@
+# app/storage/__init__.py
+import os
+from flask import current_app
+from .base import StorageBackend, BlobInfo, BlobNotFound
+from .local import LocalStorageBackend
+from .memory import InMemoryStorageBackend
+from .azure import AzureBlobStorageBackend
+from .cache import CachingStorageBackend
+
+BACKENDS = ('local', 'azure', 'memory')
+
+
+def configure_storage(app):
+    """Fill in storage defaults from the environment; existing app.config values win."""
+    app.config.setdefault('STORAGE_BACKEND', os.getenv('STORAGE_BACKEND', 'local'))
+    app.config.setdefault('LOCAL_STORAGE_ROOT', os.getenv('LOCAL_STORAGE_ROOT', 'uploads'))
+    app.config.setdefault('AZURE_STORAGE_CONNECTION_STRING', os.getenv('AZURE_STORAGE_CONNECTION_STRING'))
+    app.config.setdefault('AZURE_STORAGE_CONTAINER', os.getenv('AZURE_STORAGE_CONTAINER', 'patient-records'))
+    app.config.setdefault('AZURE_DOWNLOAD_CHUNK_SIZE', int(os.getenv('AZURE_DOWNLOAD_CHUNK_SIZE', 4 * 1024 * 1024)))
+    app.config.setdefault('AZURE_DOWNLOAD_READ_AHEAD', int(os.getenv('AZURE_DOWNLOAD_READ_AHEAD', 2)))
+    app.config.setdefault('AZURE_UPLOAD_CONCURRENCY', int(os.getenv('AZURE_UPLOAD_CONCURRENCY', 4)))
+    # Read-through disk cache in front of remote backends; STORAGE_CACHE_BYTES=0 disables it
+    app.config.setdefault('STORAGE_CACHE_DIR', os.getenv('STORAGE_CACHE_DIR', os.path.join('uploads', '.blob-cache')))
+    app.config.setdefault('STORAGE_CACHE_BYTES', int(os.getenv('STORAGE_CACHE_BYTES', 1024 * 1024 * 1024)))
+    app.config.setdefault('STORAGE_CACHE_TTL', int(os.getenv('STORAGE_CACHE_TTL', 300)))
+
+
+def create_storage_backend(config):
+    kind = config.get('STORAGE_BACKEND', 'local')
+    if kind == 'local':
+        return LocalStorageBackend(config.get('LOCAL_STORAGE_ROOT', 'uploads'))
+    if kind == 'memory':
+        return InMemoryStorageBackend()
+    if kind == 'azure':
+        backend = AzureBlobStorageBackend(
+            config.get('AZURE_STORAGE_CONNECTION_STRING'),
+            config.get('AZURE_STORAGE_CONTAINER', 'patient-records'),
+            chunk_size=config.get('AZURE_DOWNLOAD_CHUNK_SIZE', 4 * 1024 * 1024),
+            read_ahead=config.get('AZURE_DOWNLOAD_READ_AHEAD', 2),
+            upload_concurrency=config.get('AZURE_UPLOAD_CONCURRENCY', 4)
+        )
+        if config.get('STORAGE_CACHE_BYTES', 0) > 0:
+            backend = CachingStorageBackend(
+                backend,
+                config['STORAGE_CACHE_DIR'],
+                config['STORAGE_CACHE_BYTES'],
+                ttl=config.get('STORAGE_CACHE_TTL', 300)
+            )
+        return backend
+    raise ValueError(f"Unknown STORAGE_BACKEND '{kind}'. Expected one of: {', '.join(BACKENDS)}")
+
+
+def init_storage(app):
+    configure_storage(app)
+    app.extensions['storage'] = create_storage_backend(app.config)
+    return app.extensions['storage']
+
+
+def get_storage():
+    """The storage backend of the current app, created on first use."""
+    app = current_app._get_current_object()
+    if 'storage' not in app.extensions:
+        init_storage(app)
+    return app.extensions['storage']
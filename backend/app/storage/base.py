@@ -0,0 +1,117 @@
+# app/storage/base.py
+import os
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class BlobNotFound(Exception):
+    """Raised when a key does not exist in the storage backend."""
+
+
+class BlobInfo:
+    """Metadata returned by stat() and list()."""
+
+    def __init__(self, key, size, etag=None, last_modified=None):
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return f"<BlobInfo {self.key} {self.size}B>"
+
+
+class StorageBackend:
+    """
+    Byte store behind the storage blueprint. Keys are '/'-separated names;
+    implementations must stream in both directions so memory use does not
+    grow with blob size.
+    """
+
+    name = 'base'
+
+    def put(self, key, stream, length=None):
+        """Store everything read from `stream` under `key`, replacing any existing blob."""
+        raise NotImplementedError
+
+    def get(self, key, offset=0, length=None):
+        """Yield the bytes of `key` (or of the span offset..offset+length) in chunks."""
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Return a BlobInfo for `key`, or raise BlobNotFound."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove `key`; deleting a missing key is not an error."""
+        raise NotImplementedError
+
+    def list(self, prefix=''):
+        """Yield a BlobInfo for every key starting with `prefix`."""
+        raise NotImplementedError
+
+    # Helpers with generic implementations; backends override them when they
+    # can do better (a rename on disk, a server-side copy, ...).
+
+    def exists(self, key):
+        try:
+            self.stat(key)
+            return True
+        except BlobNotFound:
+            return False
+
+    def put_file(self, key, path):
+        """Store the local file at `path` under `key`. The file is consumed (removed)."""
+        with open(path, 'rb') as f:
+            self.put(key, f, length=os.path.getsize(path))
+        os.remove(path)
+
+    def download_to(self, key, fileobj):
+        for chunk in self.get(key):
+            fileobj.write(chunk)
+
+    def move(self, key, new_key):
+        self.put(new_key, _ChunkReader(self.get(key)))
+        self.delete(key)
+
+    def local_path(self, key, fill=True):
+        """
+        Path of `key` on the local filesystem when the backend has one, else
+        None. With fill=False a caching backend only returns a copy it
+        already holds instead of downloading the blob for it.
+        """
+        return None
+
+
+class _ChunkReader:
+    """Adapts an iterator of byte chunks to the read() interface put() expects."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.pending += chunk
+        if size < 0:
+            data, self.pending = self.pending, b''
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
+def read_file(f, offset=0, length=None):
+    """Yield the span offset..offset+length of an open file in chunks, closing it at the end."""
+    with f:
+        f.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            block = f.read(COPY_BUFFER_SIZE if remaining is None else min(COPY_BUFFER_SIZE, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
@@ -0,0 +1,290 @@
+# app/storage/cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from .base import StorageBackend, BlobInfo, BlobNotFound, read_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction is then only serialized within a process
+    fcntl = None
+
+POINTER_SUFFIX = '.json'
+DATA_SUFFIX = '.data'
+TMP_SUFFIX = '.tmp'
+LOCK_NAME = '.evict.lock'
+
+# Content-addressed keys end in their SHA-256; their bytes never change.
+_OBJECT_KEY_RE = re.compile(r'(?:^|/)([0-9a-f]{64})$')
+
+
+class CacheStats:
+    """Per-process counters of a CachingStorageBackend."""
+
+    FIELDS = ('hits', 'misses', 'revalidations', 'stale', 'bypassed', 'evictions', 'bytes_filled')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else None
+        return counts
+
+
+class CachingStorageBackend(StorageBackend):
+    """
+    Read-through cache on local disk in front of a remote backend (Azure).
+
+    Each cached key has a small JSON pointer (<keyhash>.json) naming an
+    immutable data file (<keyhash>.<version>.data). Fills write the data file
+    under a temp name and then atomically replace the pointer, so several
+    worker processes can share one directory without locks on the read path.
+    Entries are trusted for `ttl` seconds and then revalidated against the
+    remote ETag; content-addressed keys are verified against their SHA-256
+    on fill and never go stale. The directory is kept under `max_bytes` by
+    evicting the least recently used data files.
+    """
+
+    def __init__(self, backend, directory, max_bytes, ttl=300, max_entry_bytes=None):
+        self.backend = backend
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self.name = f"{backend.name}+cache"
+        self.stats = CacheStats()
+        self._evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Cache layout
+
+    def _slot(self, key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _pointer_path(self, key):
+        return os.path.join(self.directory, self._slot(key) + POINTER_SUFFIX)
+
+    def _read_pointer(self, key):
+        try:
+            with open(self._pointer_path(key), encoding='utf-8') as f:
+                pointer = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return pointer if pointer.get('key') == key else None
+
+    def _write_pointer(self, key, pointer):
+        path = self._pointer_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, key):
+        try:
+            os.remove(self._pointer_path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _info(pointer):
+        last_modified = pointer.get('last_modified')
+        return BlobInfo(
+            pointer['key'],
+            pointer['size'],
+            etag=pointer.get('etag'),
+            last_modified=datetime.fromisoformat(last_modified) if last_modified else None
+        )
+
+    def _is_immutable(self, key):
+        return _OBJECT_KEY_RE.search(key) is not None
+
+    # Lookup and fill
+
+    def _fresh_pointer(self, key):
+        """Return a pointer that may be served without asking the remote, revalidating stale ones."""
+        pointer = self._read_pointer(key)
+        if pointer is None:
+            return None
+        if self._is_immutable(key) or time.time() - pointer['validated_at'] < self.ttl:
+            return pointer
+
+        self.stats.incr('revalidations')
+        info = self.backend.stat(key)  # BlobNotFound propagates: the blob is gone
+        if info.etag != pointer.get('etag') or info.size != pointer['size']:
+            self.stats.incr('stale')
+            self.invalidate(key)
+            return None
+        pointer['validated_at'] = time.time()
+        self._write_pointer(key, pointer)
+        return pointer
+
+    def _cached_file(self, key):
+        """Path of a servable cached copy of `key` (touched for LRU), or None."""
+        pointer = self._fresh_pointer(key)
+        if pointer is None:
+            return None
+        path = os.path.join(self.directory, pointer['file'])
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None  # evicted by another worker
+        return path
+
+    def _fill(self, key):
+        """Download `key` into the cache and return its data path, or None if it is too large to cache."""
+        info = self.backend.stat(key)
+        if info.size > self.max_entry_bytes:
+            self.stats.incr('bypassed')
+            return None
+
+        expected = _OBJECT_KEY_RE.search(key)
+        slot = self._slot(key)
+        name = f"{slot}.{uuid.uuid4().hex[:16]}{DATA_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}{TMP_SUFFIX}"
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in self.backend.get(key):
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if expected and hasher.hexdigest() != expected.group(1):
+                raise IOError(f"Cached copy of {key} does not match its content hash")
+            if size != info.size:
+                raise IOError(f"Cached copy of {key} is {size} bytes, expected {info.size}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._write_pointer(key, {
+            'key': key,
+            'file': name,
+            'size': info.size,
+            'etag': info.etag,
+            'last_modified': info.last_modified.isoformat() if info.last_modified else None,
+            'sha256': hasher.hexdigest(),
+            'validated_at': time.time()
+        })
+        self.stats.incr('bytes_filled', size)
+        self.evict(keep=path)
+        return path
+
+    def cached_path(self, key, fill=True):
+        """
+        Local path of `key`, filling the cache on a miss unless `fill` is
+        false. None when the blob is not cached and is not filled, or bypasses
+        the cache.
+        """
+        path = self._cached_file(key)
+        if path:
+            self.stats.incr('hits')
+            return path
+        self.stats.incr('misses')
+        return self._fill(key) if fill else None
+
+    def evict(self, keep=None):
+        """Delete least recently used data files until the cache fits its budget."""
+        with self._evict_lock, _DirectoryLock(os.path.join(self.directory, LOCK_NAME)):
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(DATA_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)  # readers holding it open keep their copy (POSIX)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.stats.incr('evictions')
+
+    # StorageBackend
+
+    def put(self, key, stream, length=None):
+        self.invalidate(key)
+        return self.backend.put(key, stream, length)
+
+    def put_file(self, key, path):
+        self.invalidate(key)
+        self.backend.put_file(key, path)
+
+    def get(self, key, offset=0, length=None):
+        # A miss on a byte range reads just the range; filling would download the whole blob first.
+        path = self.cached_path(key, fill=offset == 0 and length is None)
+        try:
+            f = open(path, 'rb') if path else None
+        except FileNotFoundError:
+            f = None  # evicted by another worker in between
+        if f is None:
+            return self.backend.get(key, offset, length)
+        return read_file(f, offset, length)
+
+    def stat(self, key):
+        pointer = self._fresh_pointer(key)
+        if pointer is not None:
+            return self._info(pointer)
+        return self.backend.stat(key)
+
+    def delete(self, key):
+        self.invalidate(key)
+        self.backend.delete(key)
+
+    def move(self, key, new_key):
+        self.invalidate(key)
+        self.invalidate(new_key)
+        self.backend.move(key, new_key)
+
+    def list(self, prefix=''):
+        return self.backend.list(prefix)
+
+    def local_path(self, key, fill=True):
+        try:
+            return self.cached_path(key, fill)
+        except BlobNotFound:
+            return None
+
+
+class _DirectoryLock:
+    """Exclusive flock on a file in the cache directory, so one worker evicts at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.handle = open(self.path, 'a')
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
@@ -0,0 +1,97 @@
+# app/storage/local.py
+import os
+import uuid
+from datetime import datetime, timezone
+from .base import StorageBackend, BlobInfo, BlobNotFound, COPY_BUFFER_SIZE, read_file
+
+TMP_SUFFIX = '.tmp'
+
+
+class LocalStorageBackend(StorageBackend):
+    """Blobs as files under a root directory; writes are temp file + atomic rename."""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, *key.split('/')))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def put(self, key, stream, length=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    block = stream.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.stat(key)
+
+    def put_file(self, key, path):
+        destination = self._path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+
+    def get(self, key, offset=0, length=None):
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+        return read_file(f, offset, length)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+        return BlobInfo(
+            key,
+            st.st_size,
+            etag=f"{st.st_mtime_ns:x}-{st.st_size:x}",
+            last_modified=datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+        )
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, key, new_key):
+        destination = self._path(new_key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            os.replace(self._path(key), destination)
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def list(self, prefix=''):
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if name.endswith(TMP_SUFFIX):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    try:
+                        yield self.stat(key)
+                    except BlobNotFound:
+                        continue
+
+    def local_path(self, key, fill=True):
+        path = self._path(key)
+        return path if os.path.exists(path) else None
@@ -0,0 +1,65 @@
+# app/storage/memory.py
+import hashlib
+import threading
+from datetime import datetime, timezone
+from .base import StorageBackend, BlobInfo, BlobNotFound, COPY_BUFFER_SIZE
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """Process-local dict of blobs, for tests and benchmarks. Not shared between workers."""
+
+    name = 'memory'
+
+    def __init__(self, chunk_size=COPY_BUFFER_SIZE):
+        self.chunk_size = chunk_size
+        self._blobs = {}  # key -> (bytes, BlobInfo)
+        self._lock = threading.Lock()
+
+    def put(self, key, stream, length=None):
+        parts = []
+        while True:
+            block = stream.read(self.chunk_size)
+            if not block:
+                break
+            parts.append(block)
+        data = b''.join(parts)
+        info = BlobInfo(
+            key,
+            len(data),
+            etag=hashlib.md5(data).hexdigest(),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0)
+        )
+        with self._lock:
+            self._blobs[key] = (data, info)
+        return info
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._blobs.get(key)
+        if entry is None:
+            raise BlobNotFound(key)
+        return entry
+
+    def get(self, key, offset=0, length=None):
+        data, _ = self._entry(key)
+        end = len(data) if length is None else min(len(data), offset + length)
+        return (data[i:min(i + self.chunk_size, end)] for i in range(offset, end, self.chunk_size))
+
+    def stat(self, key):
+        return self._entry(key)[1]
+
+    def delete(self, key):
+        with self._lock:
+            self._blobs.pop(key, None)
+
+    def move(self, key, new_key):
+        with self._lock:
+            if key not in self._blobs:
+                raise BlobNotFound(key)
+            data, info = self._blobs.pop(key)
+            self._blobs[new_key] = (data, BlobInfo(new_key, info.size, info.etag, info.last_modified))
+
+    def list(self, prefix=''):
+        with self._lock:
+            infos = [info for key, (_, info) in self._blobs.items() if key.startswith(prefix)]
+        return iter(infos)
@@ -0,0 +1,86 @@
+# backend/benchmarks/bench_access_log_writer.py
+"""
+AccessLog write cost per mode of the batched writer, on a throwaway SQLite
+database:
+
+  * request-side latency of recording one access (what a download pays),
+    for sync (insert + commit per event), at_most_once and durable;
+  * end-to-end write throughput as the batch size grows.
+
+    python -m backend.benchmarks.bench_access_log_writer
+    python -m backend.benchmarks.bench_access_log_writer --events 50000 --threads 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.app.models import AccessLog
+from backend.app.services.access_log_writer import AccessLogWriter
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_app(workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['ACCESS_LOG_MODE'] = 'sync'
+    from backend.app import create_app
+    return create_app()
+
+
+def drive(writer, events, threads):
+    """Record `events` accesses from `threads` threads; return per-call latencies and total seconds to durable rows."""
+    def one(i):
+        started = time.perf_counter()
+        writer.record(1 + i % 1000, f"doctor{i % 50}@example.com", patient_id=f"patient{i % 1000}@example.com")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(events)))
+    writer.close()  # drain what is still queued
+    return latencies, time.perf_counter() - started
+
+
+def count_rows(app):
+    with app.app_context():
+        return AccessLog.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--sync-events', type=int, default=2000, help='fewer events for sync mode, which is slow')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-sizes', default='1,10,100,1000')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        journal = os.path.join(workdir, 'journal')
+
+        print(f"{args.threads} threads")
+        print(f"{'mode':>13} | {'events':>6} | {'p50 us':>8} | {'p99 us':>8} | {'events/s':>9}")
+        for mode in ('sync', 'at_most_once', 'durable'):
+            events = args.sync_events if mode == 'sync' else args.events
+            before = count_rows(app)
+            writer = AccessLogWriter(app, mode=mode, journal_dir=journal)
+            latencies, elapsed = drive(writer, events, args.threads)
+            assert count_rows(app) - before == events
+            print(f"{mode:>13} | {events:>6} | {percentile(latencies, 50) * 1e6:>8.1f} | "
+                  f"{percentile(latencies, 99) * 1e6:>8.1f} | {events / elapsed:>9.0f}")
+
+        print(f"\n{'batch size':>10} | {'batches':>7} | {'events/s':>9}")
+        for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+            # A long interval so batches are cut by size, not by time.
+            writer = AccessLogWriter(app, mode='at_most_once', batch_size=batch_size, flush_interval=60)
+            _, elapsed = drive(writer, args.events, args.threads)
+            print(f"{batch_size:>10} | {writer.stats['batches']:>7} | {args.events / elapsed:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
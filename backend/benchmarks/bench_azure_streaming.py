@@ -0,0 +1,115 @@
+# backend/benchmarks/bench_azure_streaming.py
+"""
+Peak memory of serving a blob download: the old readall() + BytesIO path
+against the chunked stream_chunks() generator used by storage_routes.py.
+
+Runs against an in-process fake of the Azure container client, so no
+storage account is needed:
+
+    python -m backend.benchmarks.bench_azure_streaming
+"""
+import argparse
+import time
+import tracemalloc
+from io import BytesIO
+
+from backend.app.services.blob_streaming import stream_chunks
+
+MB = 1024 * 1024
+
+
+class FakeStreamDownloader:
+    """Mimics StorageStreamDownloader: chunks() fetches one chunk per call."""
+
+    def __init__(self, size, chunk_size):
+        self.size = size
+        self.chunk_size = chunk_size
+
+    def chunks(self):
+        remaining = self.size
+        while remaining:
+            n = min(self.chunk_size, remaining)
+            remaining -= n
+            yield bytes(n)  # a fresh allocation, like a network read
+
+    def readall(self):
+        return b''.join(self.chunks())
+
+
+class FakeBlobClient:
+    def __init__(self, size, chunk_size):
+        self.size = size
+        self.chunk_size = chunk_size
+
+    def download_blob(self, offset=None, length=None):
+        size = length if length is not None else self.size - (offset or 0)
+        return FakeStreamDownloader(size, self.chunk_size)
+
+
+class FakeContainerClient:
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.sizes = {}
+
+    def add(self, name, size):
+        self.sizes[name] = size
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self.sizes[name], self.chunk_size)
+
+
+def drain(body):
+    """Consume a response body the way the WSGI server would."""
+    sent = 0
+    for block in body:
+        sent += len(block)
+    return sent
+
+
+def buffered_download(blob_client):
+    data = blob_client.download_blob().readall()
+    buf = BytesIO(data)
+    del data
+    return drain(iter(lambda: buf.read(64 * 1024), b''))
+
+
+def streamed_download(blob_client, read_ahead):
+    return drain(stream_chunks(blob_client.download_blob(), read_ahead))
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    sent = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sent, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-mb', default='8,32,128,256', help='comma separated blob sizes in MB')
+    parser.add_argument('--chunk-mb', type=float, default=4)
+    parser.add_argument('--read-ahead', type=int, default=2)
+    args = parser.parse_args()
+
+    chunk_size = int(args.chunk_mb * MB)
+    container = FakeContainerClient(chunk_size)
+    sizes = [int(s) for s in args.sizes_mb.split(',')]
+
+    print(f"chunk size {args.chunk_mb} MB, read-ahead {args.read_ahead}")
+    print(f"{'blob MB':>8} | {'buffered peak MB':>16} | {'streamed peak MB':>16} | {'buffered s':>10} | {'streamed s':>10}")
+    for size_mb in sizes:
+        name = f"bench/{size_mb}mb.pdf"
+        container.add(name, size_mb * MB)
+        blob_client = container.get_blob_client(name)
+
+        sent_a, peak_a, t_a = measure(lambda: buffered_download(blob_client))
+        sent_b, peak_b, t_b = measure(lambda: streamed_download(blob_client, args.read_ahead))
+        assert sent_a == sent_b == size_mb * MB
+        print(f"{size_mb:>8} | {peak_a / MB:>16.1f} | {peak_b / MB:>16.1f} | {t_a:>10.3f} | {t_b:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
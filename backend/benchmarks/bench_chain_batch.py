@@ -0,0 +1,122 @@
+# backend/benchmarks/bench_chain_batch.py
+"""
+Batched blockchain access logging: the outbox worker drains --events
+queued access events into a freshly deployed AccessLogger, packing up to
+N events per transaction (CHAIN_OUTBOX_TX_EVENTS; 1 is one logAccess per
+event, more is logAccessBatch). For every N reports events/s, gas per
+event and the transactions it took, which can be more than events / N
+when a batch's gas estimate is over --gas-limit and gets split. The last
+row is anchoring mode (CHAIN_OUTBOX_MODE=anchor): all --events events in
+one epoch, of which only the Merkle root goes on-chain.
+
+Needs the Hardhat artifact with logAccessBatch and anchorRoot (`npx
+hardhat compile`) and a node: `npx hardhat node`, or --provider tester
+for an in-process eth-tester chain (pip install "eth-tester[py-evm]").
+
+    python -m backend.benchmarks.bench_chain_batch
+    python -m backend.benchmarks.bench_chain_batch --events 2000 --sizes 1 10 100 500 --gas-limit 30000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from eth_account import Account
+from web3 import Web3
+
+ARTIFACT = os.path.join(os.path.dirname(__file__), '../../artifacts/contracts/AccessLogger.sol/AccessLogger.json')
+
+
+def connect(provider):
+    if provider == 'tester':
+        from web3 import EthereumTesterProvider
+        return Web3(EthereumTesterProvider())
+    return Web3(Web3.HTTPProvider(provider))
+
+
+def deploy(w3, artifact):
+    """Deploy AccessLogger and fund a fresh signing account from the node's first unlocked one."""
+    funder = w3.eth.accounts[0]
+    factory = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    address = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': funder})).contractAddress
+    account = Account.create()
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
+        {'from': funder, 'to': account.address, 'value': w3.to_wei(1000, 'ether')}
+    ))
+    return address, account.key
+
+
+def build_app(workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['ACCESS_LOG_MODE'] = 'sync'
+    os.environ['CHAIN_OUTBOX_WORKER'] = 'off'
+    from backend.app import create_app
+    return create_app()
+
+
+def enqueue(app, events, size):
+    from backend.app.models import db
+    from backend.app.services import chain_outbox
+
+    with app.app_context():
+        chain_outbox.insert_entries(db.session, [
+            chain_outbox.entry(f"doctor{i % 50}@example.com", f"batch{size}/record{i}.pdf", 'download',
+                               patient_id=f"patient{i % 1000}@example.com")
+            for i in range(events)
+        ])
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', default='http://127.0.0.1:8545')
+    parser.add_argument('--artifact', default=ARTIFACT)
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 500], help='events per transaction')
+    parser.add_argument('--gas-limit', type=int, default=None, help='gas per transaction (CHAIN_OUTBOX_TX_GAS_LIMIT)')
+    args = parser.parse_args()
+
+    from backend.app.blockchain import AccessLoggerClient
+    from backend.app.services import chain_outbox
+
+    with open(args.artifact, 'r') as f:
+        artifact = json.load(f)
+    names = {item.get('name') for item in artifact['abi']}
+    if not {'logAccessBatch', 'anchorRoot'} <= names:
+        parser.error(f"{args.artifact} has no logAccessBatch / anchorRoot; run `npx hardhat compile`")
+    gas_limit = args.gas_limit or chain_outbox.CHAIN_OUTBOX_TX_GAS_LIMIT
+
+    w3 = connect(args.provider)
+    address, key = deploy(w3, artifact)
+    client = AccessLoggerClient(w3, address, key)
+    contract = w3.eth.contract(address=address, abi=client.contract.abi)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        print(f"{args.events} access events per run, provider {args.provider}, gas limit {gas_limit} per tx")
+        print(f"{'batch':>6} | {'events/s':>8} | {'gas/event':>9} | {'txs':>5} | {'on chain':>8}")
+        for size in args.sizes + ['anchor']:
+            enqueue(app, args.events, size)
+            first_block = w3.eth.block_number + 1
+            if size == 'anchor':
+                worker = chain_outbox.OutboxWorker(app, client, receipt_timeout=120, mode='anchor',
+                                                   epoch_events=args.events)
+            else:
+                worker = chain_outbox.OutboxWorker(app, client, batch_size=max(size, 500), receipt_timeout=120,
+                                                   tx_events=size, tx_gas_limit=gas_limit)
+            started = time.perf_counter()
+            while worker.drain():
+                pass
+            elapsed = time.perf_counter() - started
+            if size == 'anchor':
+                on_chain = sum(e.args.leafCount for e in contract.events.RootAnchored().get_logs(from_block=first_block))
+            else:
+                on_chain = len(contract.events.AccessLogged().get_logs(from_block=first_block))
+            stats = worker.stats
+            print(f"{size:>6} | {stats['sent'] / elapsed:>8.0f} | {stats['gas_used'] / max(stats['sent'], 1):>9.1f} | "
+                  f"{stats['transactions']:>5} | {on_chain:>8}")
+
+
+if __name__ == '__main__':
+    main()
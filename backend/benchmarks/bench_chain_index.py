@@ -0,0 +1,144 @@
+# backend/benchmarks/bench_chain_index.py
+"""
+Access history from the chain: --events AccessLogged events over
+--records records and 50 accessors are logged to a freshly deployed
+AccessLogger (logAccessBatch, 100 per transaction), then app/services/
+chain_index.EventIndexer copies them into a scratch SQLite chain_event
+table. Reports indexing throughput, then latency per query for
+
+  * scan:   eth_getLogs over every block since deployment, decoded and
+            filtered in Python, as reading history off the node costs
+  * index:  one keyset page (limit 50) from chain_event, as GET
+            /api/blockchain/events serves it
+
+by record, by accessor and by time range (the last tenth of the events).
+
+Needs the Hardhat artifact with logAccessBatch (`npx hardhat compile`) and
+a node: `npx hardhat node`, or --provider tester for an in-process
+eth-tester chain (pip install "eth-tester[py-evm]").
+
+    python -m backend.benchmarks.bench_chain_index
+    python -m backend.benchmarks.bench_chain_index --events 20000 --records 2000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from web3 import Web3
+
+ARTIFACT = os.path.join(os.path.dirname(__file__), '../../artifacts/contracts/AccessLogger.sol/AccessLogger.json')
+TX_EVENTS = 100
+PAGE = 50
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def connect(provider):
+    if provider == 'tester':
+        from web3 import EthereumTesterProvider
+        return Web3(EthereumTesterProvider())
+    return Web3(Web3.HTTPProvider(provider))
+
+
+def deploy(w3, artifact):
+    """Deploy AccessLogger from the node's first unlocked account; returns (contract, deployment block)."""
+    factory = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': w3.eth.accounts[0]}))
+    return w3.eth.contract(address=receipt.contractAddress, abi=artifact['abi']), receipt.blockNumber
+
+
+def log_events(w3, contract, events, records):
+    sender = w3.eth.accounts[0]
+    for first in range(0, events, TX_EVENTS):
+        batch = range(first, min(first + TX_EVENTS, events))
+        tx_hash = contract.functions.logAccessBatch(
+            [f"doctor{i % 50}@example.com" for i in batch],
+            [f"record{i % records}.pdf" for i in batch],
+            ['download'] * len(batch)
+        ).transact({'from': sender, 'gas': 15_000_000})
+        w3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+def build_app(workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CHAIN_OUTBOX_WORKER'] = 'off'
+    os.environ['CHAIN_INDEXER'] = 'off'
+    from backend.app import create_app
+    return create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', default='http://127.0.0.1:8545')
+    parser.add_argument('--artifact', default=ARTIFACT)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=100, help='index queries per filter')
+    parser.add_argument('--scans', type=int, default=5, help='eth_getLogs scans per filter')
+    args = parser.parse_args()
+
+    from backend.app.models import ChainEvent
+    from backend.app.services import chain_index, pagination
+
+    with open(args.artifact, 'r') as f:
+        artifact = json.load(f)
+    if 'logAccessBatch' not in {item.get('name') for item in artifact['abi']}:
+        parser.error(f"{args.artifact} has no logAccessBatch; run `npx hardhat compile`")
+
+    w3 = connect(args.provider)
+    contract, deployed = deploy(w3, artifact)
+    log_events(w3, contract, args.events, args.records)
+    event = contract.events.AccessLogged()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        indexer = chain_index.EventIndexer(app, contract, start_block=deployed)
+        started = time.perf_counter()
+        indexer.sync()
+        elapsed = time.perf_counter() - started
+        print(f"indexed {indexer.stats['events']} events in {indexer.stats['blocks']} blocks "
+              f"({indexer.stats['ranges']} eth_getLogs ranges) in {elapsed:.2f}s, "
+              f"{indexer.stats['events'] / elapsed:.0f} events/s; provider {args.provider}")
+
+        with app.app_context():
+            since = ChainEvent.query.order_by(ChainEvent.id.desc()).offset(args.events // 10).first().timestamp
+        filters = {
+            'record': lambda: {'record': f"record{random.randrange(args.records)}.pdf"},
+            'accessor': lambda: {'accessor': f"doctor{random.randrange(50)}@example.com"},
+            'time range': lambda: {'from': since},
+        }
+        matches = {
+            'record': lambda e, f: e.args.recordName == f['record'],
+            'accessor': lambda e, f: e.args.userEmail == f['accessor'],
+            'time range': lambda e, f: e.args.timestamp >= f['from'].timestamp(),
+        }
+
+        print(f"{'filter':>10} | {'scan p50 ms':>11} | {'index p50 ms':>12} | {'index p99 ms':>12} | {'rows':>5}")
+        for name, make in filters.items():
+            scans = []
+            for _ in range(args.scans):
+                wanted = make()
+                started = time.perf_counter()
+                _ = [e for e in event.get_logs(from_block=deployed) if matches[name](e, wanted)]
+                scans.append(time.perf_counter() - started)
+            latencies, rows = [], 0
+            with app.app_context():
+                for _ in range(args.queries):
+                    wanted = make()
+                    started = time.perf_counter()
+                    page, _ = pagination.keyset_page(chain_index.events_query(wanted), ChainEvent.timestamp,
+                                                     ChainEvent.id, None, PAGE)
+                    latencies.append(time.perf_counter() - started)
+                    rows += len(page)
+            print(f"{name:>10} | {percentile(scans, 50) * 1000:>11.1f} | {percentile(latencies, 50) * 1000:>12.2f} | "
+                  f"{percentile(latencies, 99) * 1000:>12.2f} | {rows // args.queries:>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# backend/benchmarks/bench_chain_outbox.py
+"""
+Blockchain access logging, on the request path and off it, against a
+freshly deployed AccessLogger (the Hardhat artifact):
+
+  * inline:  sign, send and wait for the receipt inside the request, as
+             blockchain_service.log_access(wait=True) does
+  * outbox:  insert one chain_outbox row and commit (what requests do now)
+  * drain:   OutboxWorker throughput sending those rows, and a check that
+             every row was mined exactly once
+
+--provider is a node URL (start one with `npx hardhat node`) or "tester"
+for an in-process eth-tester chain (pip install "eth-tester[py-evm]").
+
+    python -m backend.benchmarks.bench_chain_outbox --provider tester
+    python -m backend.benchmarks.bench_chain_outbox --provider http://127.0.0.1:8545 --events 500
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from eth_account import Account
+from web3 import Web3
+
+ARTIFACT = os.path.join(os.path.dirname(__file__), '../../artifacts/contracts/AccessLogger.sol/AccessLogger.json')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def connect(provider):
+    if provider == 'tester':
+        from web3 import EthereumTesterProvider
+        return Web3(EthereumTesterProvider())
+    return Web3(Web3.HTTPProvider(provider))
+
+
+def deploy(w3):
+    """Deploy AccessLogger and fund a fresh signing account from the node's first unlocked one."""
+    with open(ARTIFACT, 'r') as f:
+        artifact = json.load(f)
+    funder = w3.eth.accounts[0]
+    factory = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    address = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': funder})).contractAddress
+    account = Account.create()
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
+        {'from': funder, 'to': account.address, 'value': w3.to_wei(100, 'ether')}
+    ))
+    return address, account.key
+
+
+def build_app(workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['ACCESS_LOG_MODE'] = 'sync'
+    os.environ['CHAIN_OUTBOX_WORKER'] = 'off'
+    from backend.app import create_app
+    return create_app()
+
+
+def inline(client, events):
+    latencies = []
+    for i in range(events):
+        started = time.perf_counter()
+        entry = (f"doctor{i % 50}@example.com", f"record{i}.pdf", 'download')
+        tx_hash, raw_tx = client.sign([entry], client.next_nonce())
+        client.broadcast(raw_tx)
+        client.w3.eth.wait_for_transaction_receipt(tx_hash)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def enqueue(app, events):
+    from backend.app.models import db
+    from backend.app.services import chain_outbox
+
+    latencies = []
+    with app.app_context():
+        for i in range(events):
+            started = time.perf_counter()
+            chain_outbox.enqueue(db.session, f"doctor{i % 50}@example.com", f"record{i}.pdf", 'download',
+                                 patient_id=f"patient{i % 1000}@example.com")
+            db.session.commit()
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', default='tester')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=50, help='outbox rows per worker batch')
+    args = parser.parse_args()
+
+    from backend.app.blockchain import AccessLoggerClient
+    from backend.app.services import chain_outbox
+
+    w3 = connect(args.provider)
+    address, key = deploy(w3)
+    client = AccessLoggerClient(w3, address, key)
+    contract = w3.eth.contract(address=address, abi=client.contract.abi)
+    first_block = w3.eth.block_number + 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        print(f"{args.events} access events, provider {args.provider}")
+        print(f"{'path':>7} | {'p50 ms':>8} | {'p99 ms':>8} | {'events/s':>8}")
+        for name, latencies in (('inline', inline(client, args.events)), ('outbox', enqueue(app, args.events))):
+            print(f"{name:>7} | {percentile(latencies, 50) * 1000:>8.2f} | {percentile(latencies, 99) * 1000:>8.2f} | "
+                  f"{len(latencies) / sum(latencies):>8.0f}")
+
+        worker = chain_outbox.OutboxWorker(app, client, batch_size=args.batch, receipt_timeout=60)
+        started = time.perf_counter()
+        while worker.drain():
+            pass
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            counts = chain_outbox.counts()
+        logged = contract.events.AccessLogged().get_logs(from_block=first_block)
+        outbox_events = sum(1 for event in logged if event.args.recordName.startswith('record')) - args.events
+        print(f"{'drain':>7} | {'':>8} | {'':>8} | {worker.stats['sent'] / elapsed:>8.0f}   "
+              f"sent {counts['sent']}, pending {counts['pending']}, failed {counts['failed']}, "
+              f"on chain {outbox_events}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# backend/benchmarks/bench_nonce_pipeline.py
+"""
+Transaction submission with --threads concurrent senders, --txs logAccess
+transactions in all, against a freshly deployed AccessLogger:
+
+  * serial:    get_transaction_count, sign, send and wait for the receipt
+               per transaction, as blockchain_service used to; concurrent
+               senders read the same count and collide
+  * pipeline:  app/nonce_manager.TransactionPipeline with nonces allocated
+               locally, receipts tracked on a background thread, over a
+               pool of 1 and of --accounts signing accounts
+
+Reports transactions mined per second, submit latency and failed sends.
+
+--provider is a node URL (start one with `npx hardhat node`) or "tester"
+for an in-process eth-tester chain (pip install "eth-tester[py-evm]"),
+which refuses out-of-order nonces, so use --threads 1 with it.
+
+    python -m backend.benchmarks.bench_nonce_pipeline
+    python -m backend.benchmarks.bench_nonce_pipeline --txs 2000 --threads 8 --accounts 1 4 8
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from eth_account import Account
+from web3 import Web3
+
+ARTIFACT = os.path.join(os.path.dirname(__file__), '../../artifacts/contracts/AccessLogger.sol/AccessLogger.json')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def connect(provider):
+    if provider == 'tester':
+        from web3 import EthereumTesterProvider
+        return Web3(EthereumTesterProvider())
+    return Web3(Web3.HTTPProvider(provider))
+
+
+def deploy(w3, accounts):
+    """Deploy AccessLogger and fund `accounts` fresh signing accounts from the node's first unlocked one."""
+    with open(ARTIFACT, 'r') as f:
+        artifact = json.load(f)
+    funder = w3.eth.accounts[0]
+    factory = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    address = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({'from': funder})).contractAddress
+    keys = []
+    for _ in range(accounts):
+        account = Account.create()
+        w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction(
+            {'from': funder, 'to': account.address, 'value': w3.to_wei(100, 'ether')}
+        ))
+        keys.append(account.key)
+    return w3.eth.contract(address=address, abi=artifact['abi']), keys
+
+
+def run_threads(threads, txs, send):
+    """Call send(i) for i in range(txs) over `threads` threads; returns (latencies, failures, elapsed)."""
+    latencies, failures = [], []
+    counter = iter(range(txs))
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                send(i)
+            except Exception as e:
+                failures.append(e)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return latencies, failures, started
+
+
+def serial(w3, contract, key, args):
+    account = w3.eth.account.from_key(key)
+
+    def send(i):
+        call = contract.functions.logAccess(f"doctor{i % 50}@example.com", f"record{i}.pdf", 'download')
+        tx = call.build_transaction({'from': account.address,
+                                     'nonce': w3.eth.get_transaction_count(account.address)})
+        tx_hash = w3.eth.send_raw_transaction(account.sign_transaction(tx).raw_transaction)
+        w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    latencies, failures, started = run_threads(args.threads, args.txs, send)
+    return latencies, failures, time.perf_counter() - started, {}
+
+
+def pipeline(w3, contract, keys, args):
+    from backend.app.nonce_manager import AccountPool, TransactionPipeline
+
+    pipe = TransactionPipeline(w3, AccountPool(w3, keys), poll_interval=0.05)
+    submitted = []
+
+    def send(i):
+        submitted.append(pipe.submit(contract.functions.logAccess(
+            f"doctor{i % 50}@example.com", f"record{i}.pdf", 'download')))
+
+    latencies, failures, started = run_threads(args.threads, args.txs, send)
+    for pending in submitted:
+        try:
+            pending.wait(timeout=120)
+        except Exception as e:
+            failures.append(e)
+    elapsed = time.perf_counter() - started
+    pipe.close(timeout=5)
+    return latencies, failures, elapsed, pipe.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--provider', default='http://127.0.0.1:8545')
+    parser.add_argument('--txs', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--accounts', type=int, nargs='+', default=[1, 4], help='pool sizes for the pipeline')
+    args = parser.parse_args()
+
+    w3 = connect(args.provider)
+    contract, keys = deploy(w3, max(args.accounts))
+    print(f"{args.txs} logAccess transactions, {args.threads} sender threads, provider {args.provider}")
+    print(f"{'mode':>12} | {'mined/s':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'failed':>6} | {'resyncs':>7}")
+    runs = [('serial', lambda: serial(w3, contract, keys[0], args))]
+    runs += [(f"pipeline x{n}", lambda n=n: pipeline(w3, contract, keys[:n], args)) for n in args.accounts]
+    for name, run in runs:
+        latencies, failures, elapsed, stats = run()
+        mined = args.txs - len(failures)
+        print(f"{name:>12} | {mined / elapsed:>7.0f} | {percentile(latencies, 50) * 1000:>7.2f} | "
+              f"{percentile(latencies, 99) * 1000:>7.2f} | {len(failures):>6} | {stats.get('resynced', 0):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# backend/benchmarks/bench_query_indexes.py
+"""
+EXPLAIN QUERY PLAN and latency of the hot queries before and after the
+v002_query_indexes migration, on a throwaway SQLite database seeded with
+--rows rows (default 1M) spread over records, access logs, medical forms
+and prescriptions:
+
+    python -m backend.benchmarks.bench_query_indexes
+    python -m backend.benchmarks.bench_query_indexes --rows 200000 --repeat 50
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, or_, select
+
+from backend.app.migrations import v002_query_indexes
+from backend.app.models import AccessLog, MedicalForm, Prescription, Record, db
+
+PATIENTS = 20000
+DOCTORS = 200
+START = datetime(2020, 1, 1)
+
+
+def patient(i):
+    return f"patient{i}@example.com"
+
+
+def doctor(i):
+    return f"doctor{i}@example.com"
+
+
+def seed(engine, rows, rng):
+    db.metadata.create_all(engine, tables=[t.__table__ for t in (Record, AccessLog, MedicalForm, Prescription)])
+    with engine.begin() as conn:
+        # Start from the pre-migration state: primary keys only.
+        for _, name in v002_query_indexes.INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    n_records = rows * 20 // 100
+    n_logs = rows * 50 // 100
+    n_forms = rows * 15 // 100
+    n_prescriptions = rows - n_records - n_logs - n_forms
+
+    def when(i, n):
+        return START + timedelta(minutes=int(i * 2_000_000 / max(n, 1)))
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO record (id, patient_id, filename, blob_url, uploaded_at, content_hash) VALUES (?, ?, ?, ?, ?, ?)",
+            ((i, patient(i % PATIENTS), f"{patient(i % PATIENTS)}_scan{i}.pdf", f"sha256:{i:064x}",
+              when(i, n_records), f"{i:064x}") for i in range(1, n_records + 1))
+        )
+        cur.executemany(
+            "INSERT INTO access_log (record_id, accessed_by, access_time) VALUES (?, ?, ?)",
+            ((rng.randint(1, n_records), doctor(rng.randrange(DOCTORS)), when(i, n_logs)) for i in range(n_logs))
+        )
+        cur.executemany(
+            "INSERT INTO medical_form (patient_email, form_type, form_data, submitted_at, doctor_email, status) "
+            "VALUES (?, 'vitals', '{}', ?, ?, ?)",
+            ((patient(rng.randrange(PATIENTS)), when(i, n_forms),
+              *((None, 'pending') if rng.random() < 0.02 else (doctor(rng.randrange(DOCTORS)), 'reviewed')))
+             for i in range(n_forms))
+        )
+        cur.executemany(
+            "INSERT INTO prescription (patient_email, doctor_email, medication_name, dosage, frequency, duration, "
+            "created_at, status) VALUES (?, ?, 'Metformin', '500mg', 'twice daily', '30 days', ?, 'active')",
+            ((patient(rng.randrange(PATIENTS)), doctor(rng.randrange(DOCTORS)), when(i, n_prescriptions))
+             for i in range(n_prescriptions))
+        )
+        raw.commit()
+        cur.execute("ANALYZE")
+        raw.commit()
+    finally:
+        raw.close()
+    return n_records
+
+
+def queries(n_records):
+    """(name, callable(rng) -> statement) for each access path the routes use."""
+    def record_ids(p):
+        return select(Record.id).where(Record.patient_id == p)
+
+    return [
+        ("records by patient (/list)", lambda rng: select(Record).where(
+            Record.patient_id == patient(rng.randrange(PATIENTS)), Record.deleted_at.is_(None)
+        ).order_by(Record.uploaded_at)),
+        ("record by filename (download)", lambda rng: select(Record).where(
+            Record.filename == f"{patient(0)}_scan{rng.randint(1, n_records)}.pdf", Record.deleted_at.is_(None)
+        ).order_by(Record.id.desc()).limit(1)),
+        ("access logs of patient", lambda rng: select(AccessLog).where(
+            AccessLog.record_id.in_(record_ids(patient(rng.randrange(PATIENTS))))
+        )),
+        ("doctor forms (pending | mine)", lambda rng: select(MedicalForm).where(or_(
+            MedicalForm.status == 'pending', MedicalForm.doctor_email == doctor(rng.randrange(DOCTORS))
+        )).order_by(MedicalForm.submitted_at.desc())),
+        ("patient forms", lambda rng: select(MedicalForm).where(
+            MedicalForm.patient_email == patient(rng.randrange(PATIENTS))
+        ).order_by(MedicalForm.submitted_at.desc())),
+        ("prescriptions by patient", lambda rng: select(Prescription).where(
+            Prescription.patient_email == patient(rng.randrange(PATIENTS))
+        ).order_by(Prescription.created_at.desc())),
+        ("prescriptions by doctor", lambda rng: select(Prescription).where(
+            Prescription.doctor_email == doctor(rng.randrange(DOCTORS))
+        ).order_by(Prescription.created_at.desc())),
+    ]
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return [row[-1] for row in rows]
+
+
+def measure(conn, make, repeat, seed):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(repeat):
+        statement = make(rng)
+        started = time.perf_counter()
+        conn.execute(statement).fetchall()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+
+
+def run(engine, label, plan_queries, repeat):
+    print(f"\n== {label}")
+    results = {}
+    with engine.connect() as conn:
+        for name, make in plan_queries:
+            plan = explain(conn, make(random.Random(0)))
+            p50, p99 = measure(conn, make, repeat, seed=1)
+            results[name] = (p50, p99)
+            print(f"{name:<32} p50 {p50 * 1000:>9.2f} ms   p99 {p99 * 1000:>9.2f} ms")
+            for step in plan:
+                print(f"{'':<34}{step}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        started = time.perf_counter()
+        n_records = seed(engine, args.rows, random.Random(args.seed))
+        print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        plan_queries = queries(n_records)
+        before = run(engine, "before (primary keys only)", plan_queries, args.repeat)
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            v002_query_indexes.upgrade(conn)
+            conn.exec_driver_sql("ANALYZE")
+        print(f"\napplied {v002_query_indexes.DESCRIPTION} in {time.perf_counter() - started:.1f}s")
+        after = run(engine, "after v002_query_indexes", plan_queries, args.repeat)
+
+        print(f"\n{'query':<32} {'p50 before':>11} {'p50 after':>10} {'speedup':>8}")
+        for name, _ in plan_queries:
+            b, a = before[name][0], after[name][0]
+            print(f"{name:<32} {b * 1000:>9.2f}ms {a * 1000:>8.2f}ms {b / a if a else float('inf'):>7.0f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# backend/benchmarks/bench_review_queue.py
+"""
+Many doctors working through the pending medical forms at once, on a
+throwaway SQLite database with --history reviewed forms and --pending
+pending ones. Each simulated doctor is a thread with its own connection:
+
+  * scan:   the old flow. List pending forms (newest first, the pending
+            branch of the old doctor GET /forms), then review the first one. Doctors see the same forms, so
+            most attempts find the form already taken (a collision); the old
+            review_form would have silently reviewed it a second time.
+  * queue:  review_queue.claim() a batch under a lease, review each form.
+
+Reports forms reviewed per second, claim/list latency, collisions, and
+forms handed to two doctors at once (must be 0 for the queue).
+
+    python -m backend.benchmarks.bench_review_queue
+    python -m backend.benchmarks.bench_review_queue --doctors 64 --pending 20000 --batch 5
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.orm import Session
+
+from backend.app.models import MedicalForm, db
+from backend.app.services import review_queue
+
+START = datetime(2020, 1, 1)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def make_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={'timeout': 60}, pool_size=128, max_overflow=0)
+
+    @event.listens_for(engine, 'connect')
+    def _wal(dbapi_connection, _):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+    return engine
+
+
+def seed(path, history, pending):
+    engine = make_engine(path)
+    db.metadata.create_all(engine, tables=[MedicalForm.__table__])
+    rows = []
+    for i in range(history + pending):
+        at = START + timedelta(seconds=i * 30)
+        is_pending = i >= history
+        rows.append(dict(
+            patient_email=f"patient{i % 20000}@example.com", form_type='symptoms', form_data='{}',
+            submitted_at=at, available_at=at, status='pending' if is_pending else 'reviewed',
+            doctor_email=None if is_pending else f"doctor{i % 200}@example.com",
+        ))
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 50000):
+            conn.execute(MedicalForm.__table__.insert(), rows[i:i + 50000])
+    engine.dispose()
+
+
+def scan_worker(engine, doctor, stats, lock):
+    latencies, reviewed, collisions = [], [], 0
+    with Session(engine) as session:
+        while True:
+            started = time.perf_counter()
+            forms = session.execute(
+                select(MedicalForm.id).where(MedicalForm.status == 'pending')
+                .order_by(MedicalForm.submitted_at.desc()).limit(50)
+            ).scalars().all()
+            latencies.append(time.perf_counter() - started)
+            if not forms:
+                break
+            result = session.execute(
+                update(MedicalForm).where(MedicalForm.id == forms[0], MedicalForm.status == 'pending')
+                .values(status='reviewed', doctor_email=doctor)
+            )
+            session.commit()
+            if result.rowcount:
+                reviewed.append(forms[0])
+            else:
+                collisions += 1
+    with lock:
+        stats['latencies'].extend(latencies)
+        stats['reviewed'].extend(reviewed)
+        stats['collisions'] += collisions
+
+
+def queue_worker(engine, doctor, stats, lock, batch):
+    latencies, reviewed, claimed = [], [], []
+    with Session(engine) as session:
+        while True:
+            started = time.perf_counter()
+            ids = review_queue.claim(session, doctor, batch)
+            session.commit()
+            latencies.append(time.perf_counter() - started)
+            if not ids:
+                break
+            claimed.extend(ids)
+            for form_id in ids:
+                session.execute(
+                    update(MedicalForm).where(MedicalForm.id == form_id, MedicalForm.claimed_by == doctor)
+                    .values(status='reviewed', doctor_email=doctor)
+                )
+                session.commit()
+                reviewed.append(form_id)
+    with lock:
+        stats['latencies'].extend(latencies)
+        stats['reviewed'].extend(reviewed)
+        stats['claimed'].extend(claimed)
+
+
+def run(path, doctors, worker, *extra):
+    engine = make_engine(path)
+    stats = {'latencies': [], 'reviewed': [], 'claimed': [], 'collisions': 0}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(engine, f"doctor{d}@example.com", stats, lock, *extra))
+               for d in range(doctors)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=500_000, help='already reviewed forms')
+    parser.add_argument('--pending', type=int, default=5000)
+    parser.add_argument('--doctors', type=int, default=16)
+    parser.add_argument('--batch', type=int, default=10, help='forms per claim')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seeded = os.path.join(workdir, 'seed.db')
+        seed(seeded, args.history, args.pending)
+        print(f"{args.history} reviewed + {args.pending} pending forms, {args.doctors} doctors")
+        print(f"{'flow':>6} | {'forms/s':>8} | {'p50 ms':>7} | {'p99 ms':>7} | {'collisions':>10} | {'double claims':>13}")
+        for name, worker, extra in (('scan', scan_worker, ()), ('queue', queue_worker, (args.batch,))):
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copy(seeded, path)
+            stats, elapsed = run(path, args.doctors, worker, *extra)
+            assert len(stats['reviewed']) == args.pending, (name, len(stats['reviewed']))
+            doubles = sum(1 for n in Counter(stats['claimed']).values() if n > 1)
+            print(f"{name:>6} | {len(stats['reviewed']) / elapsed:>8.0f} | "
+                  f"{percentile(stats['latencies'], 50) * 1000:>7.2f} | {percentile(stats['latencies'], 99) * 1000:>7.2f} | "
+                  f"{stats['collisions']:>10} | {doubles:>13}")
+
+
+if __name__ == '__main__':
+    main()
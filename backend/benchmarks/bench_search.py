@@ -0,0 +1,121 @@
+# backend/benchmarks/bench_search.py
+"""
+Latency of the FTS5 search index on a throwaway SQLite database seeded with
+--docs documents (default 100k) of synthetic text (Zipf-distributed words,
+clinical terms among them) spread over --patients patients:
+
+  * per-patient queries (what a patient, or a doctor with ?patient=, runs);
+  * queries across every patient (doctors without ?patient=);
+  * for comparison, the same per-patient term found with a LIKE scan.
+
+    python -m backend.benchmarks.bench_search
+    python -m backend.benchmarks.bench_search --docs 20000 --words 400
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from backend.app.services import search_index
+
+VOCABULARY = (
+    "patient presents with chronic mild acute pain fever cough fatigue nausea headache dizziness "
+    "hypertension diabetes asthma arthritis migraine anemia infection allergy rash insomnia anxiety "
+    "metformin lisinopril atorvastatin amlodipine omeprazole albuterol ibuprofen amoxicillin insulin "
+    "daily twice weekly dose tablet mg prescribed discontinued follow up review blood pressure heart "
+    "rate glucose cholesterol scan xray mri ultrasound normal abnormal stable improved worsening"
+).split()
+QUERIES = ["metformin", "blood pressure", "chronic fatigue", "amoxicillin allergy", "insul*", "mri abnormal"]
+START = datetime(2020, 1, 1)
+
+
+def patient(i):
+    return f"patient{i}@example.com"
+
+
+def zipf_vocabulary(size=30000):
+    """Filler words plus the clinical terms at mid ranks, with Zipf (1/rank) cumulative weights."""
+    words = [f"term{i}" for i in range(size)]
+    for n, word in enumerate(VOCABULARY):
+        words.insert(50 + n * 40, word)
+    cumulative, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        cumulative.append(total)
+    return words, cumulative
+
+
+def seed(engine, docs, patients, words, rng):
+    vocabulary, cumulative = zipf_vocabulary()
+    with engine.begin() as conn:
+        search_index.create_table(conn)
+        batch = []
+        for i in range(1, docs + 1):
+            body = ' '.join(rng.choices(vocabulary, cum_weights=cumulative, k=words))
+            when = START + timedelta(minutes=i)
+            if i % 4:
+                batch.append(search_index.record_entry(i, patient(i % patients), f"scan{i}.pdf", when, body))
+            else:
+                batch.append(search_index.form_entry(i, patient(i % patients), 'symptoms', {'notes': body}, when))
+            if len(batch) == 5000:
+                search_index.index_entries(conn, batch)
+                batch = []
+        if batch:
+            search_index.index_entries(conn, batch)
+        conn.exec_driver_sql(f"INSERT INTO {search_index.TABLE}({search_index.TABLE}) VALUES ('optimize')")
+
+
+def measure(fn, repeat, seed):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rng)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        started = time.perf_counter()
+        seed(engine, args.docs, args.patients, args.words, random.Random(42))
+        elapsed = time.perf_counter() - started
+        print(f"indexed {args.docs} documents ({args.words} words each) in {elapsed:.1f}s "
+              f"({args.docs / elapsed:.0f} docs/s)")
+
+        with Session(engine) as session:
+            cases = [
+                ("per patient, 1 term", lambda rng: search_index.search(
+                    session, QUERIES[0], patient_id=patient(rng.randrange(args.patients)))),
+                ("per patient, mixed", lambda rng: search_index.search(
+                    session, rng.choice(QUERIES), patient_id=patient(rng.randrange(args.patients)))),
+                ("all patients, top 20", lambda rng: search_index.search(session, rng.choice(QUERIES))),
+                ("per patient, LIKE scan", lambda rng: session.execute(text(
+                    f"SELECT rowid FROM {search_index.TABLE} WHERE patient_id = :p AND body LIKE '%metformin%'"
+                ), {'p': patient(rng.randrange(args.patients))}).all()),
+            ]
+            print(f"\n{'query':<24} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, fn in cases:
+                repeat = args.repeat if 'LIKE' not in name else max(args.repeat // 20, 3)
+                p50, p99 = measure(fn, repeat, seed=1)
+                print(f"{name:<24} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
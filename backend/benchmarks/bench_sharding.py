@@ -0,0 +1,106 @@
+# backend/benchmarks/bench_sharding.py
+"""
+Write throughput of the app's ORM path with patient data on 1 database
+(no sharding) or spread over 2 and 4 SQLite shard files
+(SQLALCHEMY_SHARD_URIS, see app/database.py). --writers processes, as
+gunicorn workers would be, each submit a medical form plus a record for a
+random patient per transaction, for --seconds.
+
+A single SQLite file takes one writer at a time; shards are separate files,
+so writers for patients on different shards commit concurrently. The gain
+is bounded by the CPU count and the disk (fsync) as well as by the lock.
+
+Reports transactions/s, commit latency and the speed-up over 1 database.
+
+    python -m backend.benchmarks.bench_sharding
+    python -m backend.benchmarks.bench_sharding --writers 8 --seconds 20 --shards 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+PATIENTS = 10_000
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def build_app(workdir, shards, migrate=False):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['ACCESS_LOG_MODE'] = 'sync'
+    os.environ['DB_PROFILE'] = 'production'
+    if shards > 1:
+        os.environ['SQLALCHEMY_SHARD_URIS'] = ','.join(
+            f"sqlite:///{os.path.join(workdir, f'shard{i}.db')}" for i in range(shards))
+    else:
+        os.environ.pop('SQLALCHEMY_SHARD_URIS', None)
+    from backend.app import create_app
+    return create_app(migrate=migrate)
+
+
+def writer(workdir, shards, seed, deadline, results):
+    from backend.app.database import shard_scope
+    from backend.app.models import MedicalForm, Record, db
+
+    app = build_app(workdir, shards)
+    rng = random.Random(seed)
+    latencies = []
+    with app.app_context():
+        while time.time() < deadline:
+            patient = f"patient{rng.randrange(PATIENTS)}@example.com"
+            now = datetime.utcnow()
+            started = time.perf_counter()
+            with shard_scope(patient):
+                db.session.add(MedicalForm(patient_email=patient, form_type='symptoms', submitted_at=now,
+                                           available_at=now, form_data=json.dumps({'symptoms': 'cough'})))
+                db.session.add(Record(patient_id=patient, filename=f"{patient}_{seed}_{len(latencies)}.pdf",
+                                      blob_url='uploads/x.pdf', uploaded_at=now, uploaded_by=patient))
+                db.session.commit()
+            latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+def run(workdir, shards, args):
+    build_app(workdir, shards, migrate=True)  # create the schema on every database once
+    results = multiprocessing.Queue()
+    deadline = time.time() + args.seconds
+    procs = [multiprocessing.Process(target=writer, args=(workdir, shards, seed, deadline, results))
+             for seed in range(args.writers)]
+    for p in procs:
+        p.start()
+    latencies = []
+    for _ in procs:
+        latencies.extend(results.get())
+    for p in procs:
+        p.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"{args.writers} writer processes, {args.seconds:g}s each, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} | {'txn/s':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'speed-up':>8}")
+    baseline = None
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as workdir:
+            latencies = run(workdir, shards, args)
+        rate = len(latencies) / args.seconds
+        baseline = baseline or rate
+        print(f"{shards:>6} | {rate:>7.0f} | {percentile(latencies, 50) * 1000:>7.2f} | "
+              f"{percentile(latencies, 99) * 1000:>7.2f} | {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
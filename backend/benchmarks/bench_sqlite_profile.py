@@ -0,0 +1,160 @@
+# backend/benchmarks/bench_sqlite_profile.py
+"""
+Concurrent readers and writers on one SQLite file, as several gunicorn
+workers would hit it. A throwaway database with --records records is copied
+for each profile; --readers processes page through a patient's records (the
+/list query) and --writers processes insert access-log rows, for --seconds:
+
+  * default:         stock SQLAlchemy / SQLite (rollback journal)
+  * production:      DB_PROFILE=production PRAGMAs and pool (app/database.py)
+  * production+read: the same, readers on a read-only engine
+                     (SQLALCHEMY_READ_DATABASE_URI=sqlite:///file:...?mode=ro&uri=true)
+
+Reports reads/s, writes/s, read latency, and "database is locked" errors.
+
+    python -m backend.benchmarks.bench_sqlite_profile
+    python -m backend.benchmarks.bench_sqlite_profile --readers 8 --writers 4 --seconds 20
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+
+from backend.app import database
+from backend.app.models import AccessLog, Record, db
+
+START = datetime(2020, 1, 1)
+PATIENTS = 500
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def profile_config(profile):
+    config = {name: default for name, (default, _) in database.SETTINGS.items()}
+    config['DB_PROFILE'] = profile
+    return config
+
+
+def make_engine(url, config, read_only=False):
+    engine = create_engine(url, **database.engine_options(config, url))
+    database.install_pragmas(engine, config, read_only)
+    return engine
+
+
+def seed(path, records):
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine, tables=[Record.__table__, AccessLog.__table__])
+    rows = [dict(
+        patient_id=f"patient{i % PATIENTS}@example.com", filename=f"patient{i % PATIENTS}@example.com_{i}.pdf",
+        blob_url=f"uploads/{i}.pdf", uploaded_at=START + timedelta(seconds=i), content_type='application/pdf',
+    ) for i in range(records)]
+    with engine.begin() as conn:
+        for i in range(0, len(rows), 50000):
+            conn.execute(Record.__table__.insert(), rows[i:i + 50000])
+    engine.dispose()
+
+
+def reader(url, config, read_only, deadline, results):
+    engine = make_engine(url, config, read_only)
+    reads, locked, latencies, n = 0, 0, [], 0
+    while time.time() < deadline:
+        n += 1
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(Record.id, Record.filename, Record.uploaded_at)
+                    .where(Record.patient_id == f"patient{n % PATIENTS}@example.com", Record.deleted_at.is_(None))
+                    .order_by(Record.uploaded_at.desc(), Record.id.desc()).limit(50)
+                ).all()
+            reads += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    results.put(('read', reads, locked, latencies))
+
+
+def writer(url, config, deadline, results):
+    engine = make_engine(url, config)
+    writes, locked, n = 0, 0, 0
+    while time.time() < deadline:
+        n += 1
+        try:
+            with engine.begin() as conn:
+                conn.execute(AccessLog.__table__.insert(), dict(
+                    record_id=n % 1000 + 1, accessed_by='doctor@example.com', access_time=datetime.utcnow(),
+                    patient_id=f"patient{n % PATIENTS}@example.com",
+                ))
+            writes += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    results.put(('write', writes, locked, []))
+
+
+def run(path, profile, split_reads, args):
+    config = profile_config(profile)
+    url = f"sqlite:///{path}"
+    read_url = f"sqlite:///file:{path}?mode=ro&uri=true" if split_reads else url
+    if profile == 'production':
+        # journal_mode=WAL is persistent; set it once, as the app's first connection would.
+        make_engine(url, config).connect().close()
+    results = multiprocessing.Queue()
+    deadline = time.time() + args.seconds
+    procs = [multiprocessing.Process(target=reader, args=(read_url, config, split_reads, deadline, results))
+             for _ in range(args.readers)]
+    procs += [multiprocessing.Process(target=writer, args=(url, config, deadline, results))
+              for _ in range(args.writers)]
+    for p in procs:
+        p.start()
+    totals = {'read': 0, 'write': 0, 'locked': 0, 'latencies': []}
+    for _ in procs:
+        kind, done, locked, latencies = results.get()
+        totals[kind] += done
+        totals['locked'] += locked
+        totals['latencies'].extend(latencies)
+    for p in procs:
+        p.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=200_000)
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seeded = os.path.join(workdir, 'seed.db')
+        seed(seeded, args.records)
+        print(f"{args.records} records, {args.readers} readers, {args.writers} writers, {args.seconds:g}s each")
+        print(f"{'profile':>15} | {'reads/s':>8} | {'writes/s':>8} | {'read p50 ms':>11} | {'read p99 ms':>11} | {'locked':>6}")
+        for name, profile, split_reads in (('default', 'default', False),
+                                           ('production', 'production', False),
+                                           ('production+read', 'production', True)):
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copy(seeded, path)
+            totals = run(path, profile, split_reads, args)
+            print(f"{name:>15} | {totals['read'] / args.seconds:>8.0f} | {totals['write'] / args.seconds:>8.0f} | "
+                  f"{percentile(totals['latencies'], 50) * 1000:>11.2f} | "
+                  f"{percentile(totals['latencies'], 99) * 1000:>11.2f} | {totals['locked']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# backend/benchmarks/bench_storage_backends.py
+"""
+Throughput and latency of the storage blueprint against each StorageBackend.
+The same app, routes and requests are run once per backend, so the numbers
+differ only by where the bytes live:
+
+    python -m backend.benchmarks.bench_storage_backends
+    python -m backend.benchmarks.bench_storage_backends --backends local,memory,azure
+
+The azure backend needs AZURE_STORAGE_CONNECTION_STRING (Azurite works).
+Each run uses a throwaway SQLite database and working directory.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+MB = 1024 * 1024
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_app(backend, workdir):
+    os.environ['STORAGE_BACKEND'] = backend
+    os.environ['LOCAL_STORAGE_ROOT'] = os.path.join(workdir, 'uploads')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from backend.app import create_app
+    app = create_app()
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={
+        'email': 'bench@example.com', 'password': 'bench', 'role': 'patient'
+    })
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return app, headers
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def run_phase(app, requests, concurrency):
+    """Run every request callable (given a test client) and return per-request latencies."""
+    def run(request):
+        return timed(lambda: request(app.test_client()))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(run, requests))
+    return latencies, time.perf_counter() - started
+
+
+def report(backend, phase, latencies, wall, payload):
+    print(f"{backend:>7} | {phase:>8} | {len(latencies):>5} | {payload * len(latencies) / MB / wall:>9.1f} | "
+          f"{statistics.median(latencies) * 1000:>8.2f} | {percentile(latencies, 99) * 1000:>8.2f}")
+
+
+def bench_backend(backend, args, workdir):
+    app, headers = build_app(backend, workdir)
+    payloads = [os.urandom(args.size_kb * 1024) for _ in range(args.files)]
+
+    def upload(i):
+        def request(client):
+            response = client.post('/api/storage/upload', headers=headers, content_type='multipart/form-data',
+                                   data={'file': (BytesIO(payloads[i]), f"bench_{i}.pdf")})
+            assert response.status_code == 200, response.get_json()
+        return request
+
+    def download(i, ranged):
+        def request(client):
+            extra = {'Range': 'bytes=0-65535'} if ranged else {}
+            response = client.get(f"/api/storage/download/bench@example.com_bench_{i}.pdf",
+                                  headers={**headers, **extra})
+            assert response.status_code == (206 if ranged else 200), response.status_code
+            response.get_data()
+        return request
+
+    latencies, wall = run_phase(app, [upload(i) for i in range(args.files)], args.concurrency)
+    report(backend, 'upload', latencies, wall, args.size_kb * 1024)
+
+    reads = [download(i % args.files, False) for i in range(args.downloads)]
+    latencies, wall = run_phase(app, reads, args.concurrency)
+    report(backend, 'download', latencies, wall, args.size_kb * 1024)
+
+    reads = [download(i % args.files, True) for i in range(args.downloads)]
+    latencies, wall = run_phase(app, reads, args.concurrency)
+    report(backend, 'range', latencies, wall, min(args.size_kb * 1024, 65536))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='local,memory', help='comma separated: local, memory, azure')
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--size-kb', type=int, default=1024)
+    parser.add_argument('--downloads', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    if 'azure' in backends and not os.getenv('AZURE_STORAGE_CONNECTION_STRING'):
+        print("Skipping azure: AZURE_STORAGE_CONNECTION_STRING is not set", file=sys.stderr)
+        backends.remove('azure')
+
+    print(f"{args.files} files x {args.size_kb} KB, {args.downloads} downloads, concurrency {args.concurrency}")
+    print(f"{'backend':>7} | {'phase':>8} | {'reqs':>5} | {'MB/s':>9} | {'p50 ms':>8} | {'p99 ms':>8}")
+    cwd = os.getcwd()
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The blueprint stages uploads under ./uploads, so each run gets its own directory.
+            os.chdir(workdir)
+            try:
+                bench_backend(backend, args, workdir)
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# backend/benchmarks/bench_storage_cache.py
+"""
+Read latency of the Azure backend with and without the read-through disk
+cache (CachingStorageBackend), on a skewed workload where a small hot set
+of records is opened again and again, as on ward rounds.
+
+By default the container is a local stand-in that adds a fixed round-trip
+latency and a bandwidth cap to every request; set
+AZURE_STORAGE_CONNECTION_STRING (e.g. to Azurite) and pass --azurite to
+use a real container instead:
+
+    python -m backend.benchmarks.bench_storage_cache
+    python -m backend.benchmarks.bench_storage_cache --latency-ms 40 --reads 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+from types import SimpleNamespace
+
+from backend.app.storage import AzureBlobStorageBackend, CachingStorageBackend
+
+KB = 1024
+MB = 1024 * 1024
+
+
+class ResourceMissing(Exception):
+    pass
+
+
+class StandInDownloader:
+    def __init__(self, data, chunk_size, network):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.network = network
+
+    def chunks(self):
+        for i in range(0, len(self.data), self.chunk_size):
+            chunk = self.data[i:i + self.chunk_size]
+            self.network.transfer(len(chunk))
+            yield chunk
+
+
+class StandInNetwork:
+    def __init__(self, latency, bandwidth):
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def round_trip(self):
+        time.sleep(self.latency)
+
+    def transfer(self, size):
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+
+class StandInBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    def _blob(self):
+        self.container.network.round_trip()
+        if self.name not in self.container.blobs:
+            raise ResourceMissing(self.name)
+        return self.container.blobs[self.name]
+
+    def upload_blob(self, stream, length=None, overwrite=False, max_concurrency=1):
+        data = stream.read()
+        etag = f"0x{random.getrandbits(48):012X}"
+        self.container.blobs[self.name] = (data, etag, datetime.now(timezone.utc))
+
+    def get_blob_properties(self):
+        data, etag, modified = self._blob()
+        return SimpleNamespace(size=len(data), etag=f'"{etag}"', last_modified=modified)
+
+    def download_blob(self, offset=None, length=None, max_concurrency=1):
+        data = self._blob()[0]
+        if offset is not None:
+            data = data[offset:offset + length if length is not None else None]
+        return StandInDownloader(data, self.container.chunk_size, self.container.network)
+
+
+class StandInContainer:
+    """Just enough of ContainerClient for AzureBlobStorageBackend, with simulated network cost."""
+
+    def __init__(self, latency, bandwidth, chunk_size=4 * MB):
+        self.blobs = {}
+        self.network = StandInNetwork(latency, bandwidth)
+        self.chunk_size = chunk_size
+
+    def get_blob_client(self, name):
+        return StandInBlobClient(self, name)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def read_once(storage, key):
+    """What a download does: stat for validators, then stream the body."""
+    storage.stat(key)
+    path = storage.local_path(key)
+    if path:
+        with open(path, 'rb') as f:
+            while f.read(64 * KB):
+                pass
+        return
+    for _ in storage.get(key):
+        pass
+
+
+def workload(keys, reads, hot_fraction, hot_share, seed):
+    rng = random.Random(seed)
+    hot = keys[:max(1, int(len(keys) * hot_fraction))]
+    return [rng.choice(hot) if rng.random() < hot_share else rng.choice(keys) for _ in range(reads)]
+
+
+def run(storage, keys):
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        read_once(storage, key)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blobs', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=512)
+    parser.add_argument('--reads', type=int, default=1000)
+    parser.add_argument('--hot-fraction', type=float, default=0.1, help='share of blobs in the hot set')
+    parser.add_argument('--hot-share', type=float, default=0.8, help='share of reads that hit the hot set')
+    parser.add_argument('--latency-ms', type=float, default=20, help='stand-in round-trip latency')
+    parser.add_argument('--bandwidth-mb', type=float, default=100, help='stand-in bandwidth in MB/s (0 = unlimited)')
+    parser.add_argument('--cache-mb', type=int, default=64)
+    parser.add_argument('--ttl', type=int, default=300)
+    parser.add_argument('--azurite', action='store_true', help='use AZURE_STORAGE_CONNECTION_STRING instead of the stand-in')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.azurite:
+        remote = AzureBlobStorageBackend(os.environ['AZURE_STORAGE_CONNECTION_STRING'], 'bench-storage-cache')
+        label = 'azurite'
+    else:
+        container = StandInContainer(args.latency_ms / 1000, args.bandwidth_mb * MB)
+        remote = AzureBlobStorageBackend(None, 'bench', container_client=container)
+        label = f"stand-in {args.latency_ms:g} ms, {args.bandwidth_mb:g} MB/s"
+
+    keys = [f"bench/record_{i}.pdf" for i in range(args.blobs)]
+    for key in keys:
+        remote.put(key, BytesIO(os.urandom(args.size_kb * KB)))
+    reads = workload(keys, args.reads, args.hot_fraction, args.hot_share, args.seed)
+
+    print(f"{label}: {args.blobs} blobs x {args.size_kb} KB, {args.reads} reads, "
+          f"{args.hot_share:.0%} on {args.hot_fraction:.0%} of blobs, cache {args.cache_mb} MB")
+    print(f"{'mode':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'total s':>8} | {'hit ratio':>9}")
+
+    latencies = run(remote, reads)
+    print(f"{'direct':>8} | {percentile(latencies, 50) * 1000:>8.2f} | {percentile(latencies, 99) * 1000:>8.2f} | "
+          f"{sum(latencies):>8.2f} | {'-':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cached = CachingStorageBackend(remote, directory, args.cache_mb * MB, ttl=args.ttl)
+        latencies = run(cached, reads)
+        stats = cached.stats.snapshot()
+        print(f"{'cached':>8} | {percentile(latencies, 50) * 1000:>8.2f} | {percentile(latencies, 99) * 1000:>8.2f} | "
+              f"{sum(latencies):>8.2f} | {stats['hit_ratio']:>9.2%}")
+        print(f"cache counters: {stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# backend/benchmarks/bench_vitals_trend.py
+"""
+Daily vitals trend for one patient with years of readings, two ways, on a
+throwaway SQLite database:
+
+  * forms:  read the patient's vitals MedicalForm rows, json.loads each
+            form_data and aggregate per day in Python (what a client of
+            GET /forms has to do today);
+  * typed:  read VitalReading columns and run vitals.trend() (NumPy).
+
+    python -m backend.benchmarks.bench_vitals_trend
+    python -m backend.benchmarks.bench_vitals_trend --years 10 --per-day 24
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from backend.app.models import MedicalForm, VitalReading, db
+from backend.app.services import vitals
+
+PATIENT = 'patient0@example.com'
+
+
+def build_app(workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['ACCESS_LOG_MODE'] = 'sync'
+    from backend.app import create_app
+    return create_app()
+
+
+def seed(app, readings, rng):
+    start = datetime(2015, 1, 1)
+    step = timedelta(days=1) * (1 / max(readings / 365, 1e-9))
+    forms, typed = [], []
+    for i in range(readings):
+        at = start + step * i
+        data = {
+            'blood_pressure': f"{rng.gauss(122, 12):.0f}/{rng.gauss(80, 8):.0f}",
+            'heart_rate': round(rng.gauss(75, 12)),
+            'temperature': round(rng.gauss(36.9, 0.4), 1),
+            'spo2': round(min(100, rng.gauss(97, 2))),
+        }
+        forms.append(dict(patient_email=PATIENT, form_type='vitals', form_data=json.dumps(data),
+                          submitted_at=at, status='reviewed'))
+    with app.app_context():
+        db.session.execute(MedicalForm.__table__.insert(), forms)
+        rows = db.session.execute(
+            db.select(MedicalForm.id, MedicalForm.patient_email, MedicalForm.form_data, MedicalForm.submitted_at)
+        ).all()
+        typed = vitals.readings_from_forms(rows)
+        db.session.execute(VitalReading.__table__.insert(), typed)
+        db.session.commit()
+
+
+def trend_from_forms():
+    """The pre-VitalReading path: parse every form and bucket per day in Python."""
+    forms = MedicalForm.query.filter_by(patient_email=PATIENT, form_type='vitals').order_by(MedicalForm.submitted_at).all()
+    buckets = defaultdict(lambda: defaultdict(list))
+    for form in forms:
+        reading = vitals.extract_reading(json.loads(form.form_data), form.submitted_at)
+        day = reading['recorded_at'].date()
+        for metric in vitals.METRICS:
+            if reading.get(metric) is not None:
+                buckets[day][metric].append(reading[metric])
+    return {day: {m: sum(v) / len(v) for m, v in metrics.items()} for day, metrics in buckets.items()}
+
+
+def trend_typed():
+    times, values = vitals.load_readings(PATIENT)
+    return vitals.trend(times, values, vitals.BUCKETS['day'])
+
+
+def measure(app, fn, repeat):
+    latencies = []
+    with app.app_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - started)
+            db.session.remove()
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--per-day', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    readings = args.years * 365 * args.per_day
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(workdir)
+        seed(app, readings, random.Random(42))
+        print(f"{readings} readings over {args.years} years, daily buckets")
+
+        forms = measure(app, trend_from_forms, args.repeat)
+        typed = measure(app, trend_typed, args.repeat)
+        with app.app_context():
+            load = measure(app, lambda: vitals.load_readings(PATIENT), args.repeat)
+            times, values = vitals.load_readings(PATIENT)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            vitals.trend(times, values, vitals.BUCKETS['day'])
+        compute = (time.perf_counter() - started) / args.repeat
+
+        print(f"{'path':<28} {'p50 ms':>9}")
+        print(f"{'forms + json.loads':<28} {forms * 1000:>9.1f}")
+        print(f"{'vital_reading + numpy':<28} {typed * 1000:>9.1f}")
+        print(f"{'  of which load':<28} {load * 1000:>9.1f}")
+        print(f"{'  of which trend()':<28} {compute * 1000:>9.1f}")
+        print(f"speedup {forms / typed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,16 @@ contract AccessLogger {
         uint256 timestamp
     );
 
+    event RootAnchored(
+        address indexed anchorer,
+        bytes32 indexed root,
+        uint256 leafCount,
+        uint256 timestamp
+    );
+
+    // anchorer => Merkle root of an epoch of access events => when it was anchored
+    mapping(address => mapping(bytes32 => uint256)) public anchoredAt;
+
     function logAccess(
         string memory userEmail,
         string memory recordName,
@@ -24,4 +34,58 @@ contract AccessLogger {
             block.timestamp
         );
     }
+
+    // One AccessLogged event per entry, in one transaction, so a batch pays
+    // the transaction's base cost once instead of once per access.
+    function logAccessBatch(
+        string[] calldata userEmails,
+        string[] calldata recordNames,
+        string[] calldata actions
+    ) external {
+        uint256 count = userEmails.length;
+        require(
+            recordNames.length == count && actions.length == count,
+            "AccessLogger: array lengths differ"
+        );
+        for (uint256 i = 0; i < count; i++) {
+            emit AccessLogged(
+                msg.sender,
+                userEmails[i],
+                recordNames[i],
+                actions[i],
+                block.timestamp
+            );
+        }
+    }
+
+    // Commit the Merkle root of an epoch of access events kept off-chain.
+    // Anchoring a root again is a no-op, so a re-sent epoch does not revert.
+    function anchorRoot(bytes32 root, uint256 leafCount) external {
+        if (anchoredAt[msg.sender][root] != 0) {
+            return;
+        }
+        anchoredAt[msg.sender][root] = block.timestamp;
+        emit RootAnchored(msg.sender, root, leafCount, block.timestamp);
+    }
+
+    // True if `leaf` is in the tree of a root `anchorer` anchored. Pairs are
+    // hashed in sorted order, so the proof is just the sibling hashes.
+    function verifyInclusion(
+        address anchorer,
+        bytes32 root,
+        bytes32 leaf,
+        bytes32[] calldata proof
+    ) external view returns (bool) {
+        if (anchoredAt[anchorer][root] == 0) {
+            return false;
+        }
+        bytes32 node = leaf;
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            node = node < sibling
+                ? keccak256(abi.encodePacked(node, sibling))
+                : keccak256(abi.encodePacked(sibling, node));
+        }
+        return node == root;
+    }
 }
\ No newline at end of file
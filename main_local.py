@@ -4,7 +4,7 @@ from flask import Flask
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from backend.app.routes.auth import auth_bp
-from backend.app.routes.storage_routes_local import storage_bp
+from backend.app.routes.storage_routes import storage_bp
 
 # Load .env at the top
 env_path = os.path.join(os.path.dirname(__file__), '.env')